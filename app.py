@@ -7,11 +7,22 @@ import shutil
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 import json
-import time
-from utils.video_processor import extract_audio, get_video_info, embed_subtitles
-from utils.subtitle_generator import (
-    generate_subtitles, srt_to_dict, dict_to_srt, 
-    detect_subtitle_language, translate_subtitles
+from utils.subtitle_generator import write_srt, detect_subtitle_language, translate_subtitles
+from utils.job_queue import JobQueue, STATUS_FAILED
+from utils.pipeline import process_upload, render_video, UPLOAD_STAGES, RENDER_STAGES, OUTPUT_MODES
+from utils.model_registry import warm_up_models
+from utils.session_store import SessionStore
+from utils.session_reaper import SessionReaper
+from utils.video_processor import render_preview_clip, parse_time_code
+from utils.webvtt import write_webvtt, cue_css
+from utils.stream_ingest import ingest_upload
+from utils.chunked_upload import ChunkedUpload
+from utils.media_delivery import send_media
+from utils.cue_track import CueTrack
+from utils.segmenter import resegment, load_word_index, WORD_INDEX_FILENAME, MAX_CHARS as SEGMENT_MAX_CHARS
+from utils.subtitle_formats import (
+    FORMATS as SUBTITLE_FORMATS, detect_format, open_text, iter_subtitles, read_subtitles,
+    save_subtitles as save_subtitle_file
 )
 
 # Set up logging
@@ -26,6 +37,7 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
 UPLOAD_FOLDER = os.path.join(tempfile.gettempdir(), 'video_subtitler')
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'mkv', 'webm'}
 MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500 MB
+PREVIEW_MAX_SECONDS = 15  # Longest window rendered by /preview_clip
 
 # Create upload directory if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -33,11 +45,163 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
 
+# Preload Whisper models listed in WHISPER_WARMUP_MODELS (e.g. "base") so the
+# first upload does not pay the model load time
+warm_up_models()
+
+# Bounded pool for uploads and renders (JOB_WORKERS jobs at a time per process)
+job_queue = JobQueue()
+
+# Session state and subtitles live on the server; the cookie only holds the session ID
+session_store = SessionStore(os.path.join(UPLOAD_FOLDER, 'sessions.sqlite3'))
+
+# Delete idle session folders in the background, skipping sessions with active jobs
+session_reaper = SessionReaper(
+    UPLOAD_FOLDER,
+    is_busy=lambda session_id: bool(job_queue.active_jobs(owner=session_id)),
+    on_expire=session_store.delete
+)
+session_reaper.start()
+
 # Import utilities are already included above
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def current_state():
+    """Return the server-side state of the current session"""
+    return session_store.get(session.get('session_id'))
+
+def style_from_form(form):
+    """
+    Read the subtitle styling options posted by the edit page
+    
+    Returns:
+        dict: Keyword arguments accepted by embed_subtitles
+    """
+    font_size = form.get('font_size', '24')
+    font_color = form.get('font_color', 'white')
+    bg_color = form.get('bg_color', 'black')
+    position = form.get('position', 'bottom')
+    subtitle_width = form.get('subtitle_width', '80')
+    
+    # Get custom position if specified
+    custom_pos_x = form.get('custom_pos_x', '50')
+    custom_pos_y = form.get('custom_pos_y', '90')
+    
+    # Handle custom positioning
+    custom_position = False
+    if position == 'custom' and custom_pos_x and custom_pos_y:
+        try:
+            # Convert to integers for validation
+            pos_x = int(custom_pos_x)
+            pos_y = int(custom_pos_y)
+            
+            # If valid, set custom_position to True
+            if 0 <= pos_x <= 100 and 0 <= pos_y <= 100:
+                custom_position = True
+                app.logger.info(f"Using custom subtitle position: x={pos_x}%, y={pos_y}%")
+        except ValueError:
+            app.logger.warning("Invalid custom position values, falling back to default position")
+    
+    app.logger.info(f"Subtitle styling: size={font_size}, color={font_color}, bg={bg_color}, position={position}")
+    app.logger.info(f"Custom position: {custom_position}, x={custom_pos_x}, y={custom_pos_y}, width={subtitle_width}")
+    
+    return {
+        'font_size': int(font_size),
+        'font_color': font_color,
+        'bg_color': bg_color,
+        'position': position,
+        'custom_position': custom_position,
+        'custom_pos_x': int(custom_pos_x) if custom_position else 50,
+        'custom_pos_y': int(custom_pos_y) if custom_position else 90,
+        'subtitle_width': int(subtitle_width),
+        'font': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+    }
+
+def sync_subtitles_file(session_id):
+    """
+    Write the session's SRT file if it is older than the stored subtitles
+
+    Edits only reach the journal in the session store; the SRT file is
+    rebuilt here, when rendering or downloading actually needs it.
+
+    Returns:
+        str: Path to the up-to-date SRT file, or None if there is none
+    """
+    state = session_store.get(session_id)
+    subtitles_path = state.get('subtitles_path')
+    if not subtitles_path:
+        return None
+
+    revision = session_store.get_revision(session_id)
+    if state.get('srt_revision') == revision and os.path.exists(subtitles_path):
+        return subtitles_path
+
+    subtitles, revision = session_store.compact(session_id)
+    if subtitles is None:
+        return subtitles_path
+
+    # Inserted cues keep their IDs in the store; the file is numbered in order
+    write_srt(subtitles, subtitles_path)
+    session_store.update(session_id, srt_revision=revision)
+    return subtitles_path
+
+def run_upload_job(job, session_id, video_path, session_folder, **kwargs):
+    """Run the upload pipeline and store its output in the session store"""
+    result = process_upload(job, video_path, session_folder, **kwargs)
+    revision = session_store.set_subtitles(session_id, result['subtitles'])
+    session_store.update(
+        session_id,
+        audio_path=result['audio_path'],
+        subtitles_path=result['subtitles_path'],
+        video_info=result['video_info'],
+        srt_revision=revision
+    )
+    return result
+
+def run_render_job(job, session_id, video_path, subtitles_path, output_path, style, output_mode='burn'):
+    """Render the output video and store its location in the session store"""
+    result = render_video(job, video_path, subtitles_path, output_path, style, output_mode=output_mode)
+    session_store.update(
+        session_id,
+        output_path=result['output_path'],
+        output_filename=result['output_filename']
+    )
+    return result
+
+def new_upload_session():
+    """Create a session ID and folder for a new upload and make it the current session"""
+    session_id = str(uuid.uuid4())
+    session['session_id'] = session_id
+    
+    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+    os.makedirs(session_folder, exist_ok=True)
+    session_reaper.touch(session_id)
+    return session_id, session_folder
+
+def start_upload_job(session_id, filename, video_path, session_folder, audio=None):
+    """Record the saved upload and queue its processing job"""
+    session_store.update(session_id, video_filename=filename, video_path=video_path)
+    
+    # Run extraction, transcription and translation in the background so
+    # the request returns immediately; the client follows the job page
+    flash('Using Whisper for transcription. This may take a few minutes.', 'info')
+    job = job_queue.submit(
+        'upload',
+        run_upload_job,
+        session_id,
+        video_path,
+        session_folder,
+        whisper_model="base",
+        target_language='pt-br',
+        audio=audio,
+        owner=session_id,
+        stages=UPLOAD_STAGES
+    )
+    session_store.update(session_id, upload_job_id=job.id)
+    return job
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -55,90 +219,138 @@ def upload_file():
         return redirect(request.url)
     
     if file and allowed_file(file.filename):
-        # Create a unique session ID and folder for this upload
-        session_id = str(uuid.uuid4())
-        session['session_id'] = session_id
-        
-        session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
-        os.makedirs(session_folder, exist_ok=True)
+        filename = secure_filename(file.filename)
+        session_id, session_folder = new_upload_session()
         
         # Save the uploaded file
-        filename = secure_filename(file.filename)
         video_path = os.path.join(session_folder, filename)
         file.save(video_path)
         
-        session['video_filename'] = filename
-        session['video_path'] = video_path
-        
-        try:
-            # Extract audio from the video
-            audio_path = os.path.join(session_folder, 'audio.wav')
-            extract_audio(video_path, audio_path)
-            
-            # Generate subtitles using Whisper for better accuracy
-            subtitles_path = os.path.join(session_folder, 'subtitles.srt')
-            
-            app.logger.info("Using Whisper base model for transcription")
-            flash('Using Whisper for transcription. This may take a few minutes.', 'info')
-            
-            generate_subtitles(
-                audio_path, 
-                subtitles_path, 
-                use_whisper=True,
-                whisper_model="base"
-            )
-            
-            # Save paths to session
-            session['audio_path'] = audio_path
-            session['subtitles_path'] = subtitles_path
-            
-            # Get video info
-            video_info = get_video_info(video_path)
-            session['video_info'] = video_info
-            
-            # Read SRT file and convert to JSON for editing
-            subtitles_dict = srt_to_dict(subtitles_path)
-            
-            # Detect the language of the subtitles
-            language_code = detect_subtitle_language(subtitles_dict)
-            app.logger.info(f"Detected subtitle language: {language_code}")
-            
-            # Always translate to Brazilian Portuguese (pt-br) regardless of the source language
-            # This is a key requirement for this application
-            app.logger.info(f"Translating subtitles from {language_code} to pt-br (Brazilian Portuguese)")
-            flash(f'Translating detected {language_code} speech to Brazilian Portuguese...', 'info')
-            subtitles_dict = translate_subtitles(subtitles_dict, target_language='pt-br')
-            
-            # Save the translated subtitles back to the SRT file
-            dict_to_srt(subtitles_dict, subtitles_path)
-            
-            flash('Subtitles automatically translated to Brazilian Portuguese.', 'success')
-            
-            session['subtitles'] = subtitles_dict
-            
-            return redirect(url_for('edit_subtitles'))
-        
-        except Exception as e:
-            app.logger.error(f"Error processing video: {str(e)}")
-            flash(f'Error processing video: {str(e)}', 'danger')
-            return redirect(url_for('index'))
+        job = start_upload_job(session_id, filename, video_path, session_folder)
+        return redirect(url_for('job_page', job_id=job.id))
     else:
         flash(f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/upload_stream', methods=['POST'])
+def upload_stream():
+    """
+    Receive the raw file as the request body and decode its audio while it arrives
+    """
+    filename = secure_filename(request.args.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        error = f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+        return json.dumps({'success': False, 'error': error}), 400
+    
+    if request.content_length and request.content_length > app.config['MAX_CONTENT_LENGTH']:
+        return json.dumps({'success': False, 'error': 'File too large'}), 413
+    
+    # Load the model while the upload is still arriving
+    warm_up_models(["base"], background=True)
+    
+    session_id, session_folder = new_upload_session()
+    video_path = os.path.join(session_folder, filename)
+    try:
+        audio = ingest_upload(request.stream, video_path, content_length=request.content_length)
+    except Exception as e:
+        app.logger.error(f"Error receiving upload: {str(e)}")
+        shutil.rmtree(session_folder, ignore_errors=True)
+        session_reaper.forget(session_id)
+        return json.dumps({'success': False, 'error': 'Upload failed'}), 400
+    
+    job = start_upload_job(session_id, filename, video_path, session_folder, audio=audio)
+    return json.dumps({'success': True, 'redirect': url_for('job_page', job_id=job.id)})
+
+@app.route('/uploads', methods=['POST'])
+def start_chunked_upload():
+    """
+    Start a resumable upload; the client then sends numbered chunks in parallel
+    """
+    data = request.get_json(silent=True) or {}
+    filename = secure_filename(data.get('filename', ''))
+    if not filename or not allowed_file(filename):
+        error = f'Invalid file type. Allowed types: {", ".join(ALLOWED_EXTENSIONS)}'
+        return json.dumps({'success': False, 'error': error}), 400
+    
+    try:
+        size = int(data.get('size', 0))
+    except (TypeError, ValueError):
+        size = 0
+    if size <= 0:
+        return json.dumps({'success': False, 'error': 'Invalid file size'}), 400
+    if size > app.config['MAX_CONTENT_LENGTH']:
+        return json.dumps({'success': False, 'error': 'File too large'}), 413
+    
+    # Load the model while the chunks are arriving
+    warm_up_models(["base"], background=True)
+    
+    session_id, session_folder = new_upload_session()
+    upload = ChunkedUpload.create(session_folder, filename, size, sha256=data.get('sha256'))
+    
+    return json.dumps({'success': True, **upload.status()})
+
+def current_upload(upload_id):
+    """Return the chunked upload with this ID in the current session, or None"""
+    if 'session_id' not in session:
+        return None
+    session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session['session_id'])
+    return ChunkedUpload.open(session_folder, upload_id)
+
+def upload_redirect():
+    """Job page URL of the current session's upload job, if it has started"""
+    job_id = current_state().get('upload_job_id')
+    return url_for('job_page', job_id=job_id) if job_id else None
+
+@app.route('/uploads/<upload_id>', methods=['GET'])
+def chunked_upload_status(upload_id):
+    upload = current_upload(upload_id)
+    if upload is None:
+        return json.dumps({'success': False, 'error': 'Upload not found'}), 404
+    
+    return json.dumps({'success': True, **upload.status(), 'redirect': upload_redirect()})
+
+@app.route('/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def upload_chunk(upload_id, index):
+    upload = current_upload(upload_id)
+    if upload is None:
+        return json.dumps({'success': False, 'error': 'Upload not found'}), 404
+    if upload.is_finalized:
+        # Retried chunk of an upload that is already complete
+        return json.dumps({'success': True, 'complete': True, 'redirect': upload_redirect()})
+    
+    try:
+        complete = upload.write_chunk(index, request.stream, checksum=request.headers.get('X-Chunk-SHA256'))
+        video_path = upload.finalize() if complete else None
+    except ValueError as e:
+        app.logger.warning(f"Rejected chunk {index} of upload {upload_id}: {str(e)}")
+        return json.dumps({'success': False, 'error': str(e)}), 400
+    except FileNotFoundError:
+        # Another request finalized the upload (moving the .part file away)
+        # while this duplicate chunk was being written
+        if not upload.is_finalized:
+            raise
+        return json.dumps({'success': True, 'complete': True, 'redirect': upload_redirect()})
+    
+    if video_path:
+        start_upload_job(session['session_id'], upload.filename, video_path, upload.folder)
+    
+    return json.dumps({'success': True, 'complete': complete, 'redirect': upload_redirect()})
+
 @app.route('/edit', methods=['GET'])
 def edit_subtitles():
-    if 'session_id' not in session or 'subtitles' not in session:
+    subtitles = session_store.get_subtitles(session.get('session_id'))
+    if subtitles is None:
         flash('No video processing session found', 'warning')
         return redirect(url_for('index'))
     
-    video_info = session.get('video_info', {})
-    video_filename = session.get('video_filename', '')
-    subtitles = session.get('subtitles', [])
+    state = current_state()
+    video_info = state.get('video_info', {})
+    video_filename = state.get('video_filename', '')
     
     return render_template('edit.html', 
                           video_info=video_info,
                           video_filename=video_filename,
+                          session_id=session.get('session_id'),
                           subtitles=subtitles)
 
 @app.route('/save_subtitles', methods=['POST'])
@@ -148,27 +360,45 @@ def save_subtitles():
     
     try:
         subtitles_data = request.json
-        session['subtitles'] = subtitles_data
         
-        # Write updated subtitles back to SRT file
-        subtitles_path = session.get('subtitles_path')
-        if subtitles_path:
-            dict_to_srt(subtitles_data, subtitles_path)
-            return json.dumps({'success': True})
-        else:
-            return json.dumps({'success': False, 'error': 'Subtitles path not found'}), 400
+        # The SRT file is rewritten lazily by sync_subtitles_file
+        revision = session_store.set_subtitles(session['session_id'], subtitles_data)
+        return json.dumps({'success': True, 'revision': revision})
     
     except Exception as e:
         app.logger.error(f"Error saving subtitles: {str(e)}")
         return json.dumps({'success': False, 'error': str(e)}), 500
 
+@app.route('/patch_subtitles', methods=['POST'])
+def patch_subtitles():
+    """Save only the cues that were changed, inserted or deleted"""
+    if 'session_id' not in session:
+        return json.dumps({'success': False, 'error': 'Session expired'}), 400
+    
+    try:
+        patch = request.json or {}
+        result = session_store.patch_subtitles(
+            session['session_id'],
+            changed=patch.get('changed', []),
+            inserted=patch.get('inserted', []),
+            deleted=patch.get('deleted', [])
+        )
+        if result is None:
+            return json.dumps({'success': False, 'error': 'Session expired'}), 400
+        
+        return json.dumps({'success': True, **result})
+    
+    except Exception as e:
+        app.logger.error(f"Error patching subtitles: {str(e)}")
+        return json.dumps({'success': False, 'error': str(e)}), 500
+
 @app.route('/detect_language', methods=['POST'])
 def detect_subtitle_language_route():
-    if 'session_id' not in session or 'subtitles' not in session:
+    subtitles = session_store.get_subtitles(session.get('session_id'))
+    if subtitles is None:
         return json.dumps({'success': False, 'error': 'Session expired'}), 400
     
     try:
-        subtitles = session.get('subtitles', [])
         language_code = detect_subtitle_language(subtitles)
         
         # Map common language codes to names
@@ -202,26 +432,26 @@ def detect_subtitle_language_route():
 
 @app.route('/translate_subtitles', methods=['POST'])
 def translate_subtitles_route():
-    if 'session_id' not in session or 'subtitles' not in session:
+    subtitles = session_store.get_subtitles(session.get('session_id'))
+    if subtitles is None:
         return json.dumps({'success': False, 'error': 'Session expired'}), 400
     
     try:
         # Always translate to Brazilian Portuguese regardless of what was requested
         # This is a key requirement for this application
         target_language = 'pt-br'
-        subtitles = session.get('subtitles', [])
         
         app.logger.info("Translating to Brazilian Portuguese (using 'pt-br' code, will be handled as 'pt' internally)")
         
         # Translate the subtitles - the translate_subtitles function will handle pt-br internally
         translated_subtitles = translate_subtitles(subtitles, target_language)
         
-        # Update session and SRT file
-        session['subtitles'] = translated_subtitles
-        subtitles_path = session.get('subtitles_path')
+        # Split translations that outgrew the line length at the session's word timings
+        words_path = os.path.join(app.config['UPLOAD_FOLDER'], session['session_id'], WORD_INDEX_FILENAME)
+        translated_subtitles = resegment(translated_subtitles, load_word_index(words_path))
         
-        if subtitles_path:
-            dict_to_srt(translated_subtitles, subtitles_path)
+        # Update session store; the SRT file is rewritten when it is needed
+        session_store.set_subtitles(session['session_id'], translated_subtitles)
             
         return json.dumps({
             'success': True,
@@ -232,108 +462,239 @@ def translate_subtitles_route():
         app.logger.error(f"Error translating subtitles: {str(e)}")
         return json.dumps({'success': False, 'error': str(e)}), 500
 
+@app.route('/retime_subtitles', methods=['POST'])
+def retime_subtitles():
+    """
+    Apply a timing operation to every cue: shift, stretch, clamp, overlap
+    repair, gap filling or re-splitting long cues
+    """
+    session_id = session.get('session_id')
+    subtitles = session_store.get_subtitles(session_id)
+    if subtitles is None:
+        return json.dumps({'success': False, 'error': 'Session expired'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    operation = data.get('operation')
+    try:
+        track = CueTrack.from_dicts(subtitles)
+        if operation == 'shift':
+            track.shift(int(round(float(data.get('seconds', 0)) * 1000)),
+                        first=data.get('first'), last=data.get('last'))
+            track.clamp(0)
+        elif operation == 'scale':
+            track.scale(float(data.get('factor', 1)))
+        elif operation == 'clamp':
+            duration = current_state().get('video_info', {}).get('duration')
+            track.clamp(0, int(float(duration) * 1000) if duration else None)
+        elif operation == 'fix_overlaps':
+            track.fix_overlaps(int(data.get('min_gap_ms', 0)))
+        elif operation == 'fill_gaps':
+            track.fill_gaps(int(data.get('max_gap_ms', 500)), int(data.get('min_gap_ms', 0)))
+        elif operation == 'resegment':
+            # Split long cues at the word timings saved during transcription
+            words_path = os.path.join(app.config['UPLOAD_FOLDER'], session_id, WORD_INDEX_FILENAME)
+            limits = {'max_chars': int(data.get('max_chars', SEGMENT_MAX_CHARS))}
+            if data.get('max_cps'):
+                limits['max_cps'] = float(data['max_cps'])
+            if limits['max_chars'] < 10:
+                raise ValueError('Subtitles need at least 10 characters')
+            resegmented = resegment(subtitles, load_word_index(words_path), **limits)
+            session_store.set_subtitles(session_id, resegmented)
+            return json.dumps({'success': True, 'subtitles': resegmented})
+        else:
+            return json.dumps({'success': False, 'error': f'Unknown operation: {operation}'}), 400
+        
+        retimed = track.to_dicts()
+        session_store.set_subtitles(session_id, retimed)
+        return json.dumps({'success': True, 'subtitles': retimed})
+    
+    except (TypeError, ValueError) as e:
+        app.logger.error(f"Error retiming subtitles: {str(e)}")
+        return json.dumps({'success': False, 'error': str(e)}), 400
+
 @app.route('/generate_video', methods=['POST'])
 def generate_video():
-    if 'session_id' not in session or 'video_path' not in session or 'subtitles_path' not in session:
+    state = current_state()
+    if 'video_path' not in state or 'subtitles_path' not in state:
         flash('Session data missing', 'danger')
         return redirect(url_for('index'))
     
     try:
         session_id = session['session_id']
-        video_path = session['video_path']
-        subtitles_path = session['subtitles_path']
+        video_path = state['video_path']
+        subtitles_path = sync_subtitles_file(session_id)
         
         # Get subtitle styling options from form
-        font_size = request.form.get('font_size', '24')
-        font_color = request.form.get('font_color', 'white')
-        bg_color = request.form.get('bg_color', 'black')
-        position = request.form.get('position', 'bottom')
-        subtitle_width = request.form.get('subtitle_width', '80')
+        style = style_from_form(request.form)
         
-        # Get custom position if specified
-        custom_pos_x = request.form.get('custom_pos_x', '50')
-        custom_pos_y = request.form.get('custom_pos_y', '90')
+        # Burn subtitles into the picture, or add them as a track without re-encoding
+        output_mode = request.form.get('output_mode', 'burn')
+        if output_mode not in OUTPUT_MODES:
+            output_mode = 'burn'
         
-        # Handle custom positioning
-        custom_position = False
-        if position == 'custom' and custom_pos_x and custom_pos_y:
-            try:
-                # Convert to integers for validation
-                pos_x = int(custom_pos_x)
-                pos_y = int(custom_pos_y)
-                
-                # If valid, set custom_position to True
-                if 0 <= pos_x <= 100 and 0 <= pos_y <= 100:
-                    custom_position = True
-                    app.logger.info(f"Using custom subtitle position: x={pos_x}%, y={pos_y}%")
-            except ValueError:
-                app.logger.warning("Invalid custom position values, falling back to default position")
+        # Remembered so the preview page can style subtitle overlays the same way
+        session_store.update(session_id, style=style, output_mode=output_mode)
         
         # Create output path
         session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
         output_filename = f"subtitled_{os.path.basename(video_path)}"
         output_path = os.path.join(session_folder, output_filename)
         
-        # Add custom position and width options to embed_subtitles call
-        app.logger.info(f"Generating video with subtitles from {video_path} to {output_path}")
-        app.logger.info(f"Subtitle styling: size={font_size}, color={font_color}, bg={bg_color}, position={position}")
-        app.logger.info(f"Custom position: {custom_position}, x={custom_pos_x}, y={custom_pos_y}, width={subtitle_width}")
-        
-        try:
-            embed_subtitles(
-                video_path, 
-                subtitles_path, 
-                output_path, 
-                font_size=int(font_size),
-                font_color=font_color,
-                bg_color=bg_color,
-                position=position,
-                custom_position=custom_position,
-                custom_pos_x=int(custom_pos_x) if custom_position else 50,
-                custom_pos_y=int(custom_pos_y) if custom_position else 90,
-                subtitle_width=int(subtitle_width),
-                font='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
-            )
-            app.logger.info(f"Successfully generated video with subtitles: {output_path}")
-        except Exception as e:
-            app.logger.error(f"Error in embed_subtitles: {str(e)}")
-            app.logger.error(f"Video path exists: {os.path.exists(video_path)}")
-            app.logger.error(f"Subtitles path exists: {os.path.exists(subtitles_path)}")
-            app.logger.error(f"Output directory exists: {os.path.exists(os.path.dirname(output_path))}")
-            raise
-        
-        session['output_path'] = output_path
-        session['output_filename'] = output_filename
+        # Render in the background; the job page redirects to the preview when done
+        job = job_queue.submit(
+            'render',
+            run_render_job,
+            session_id,
+            video_path,
+            subtitles_path,
+            output_path,
+            style,
+            output_mode=output_mode,
+            owner=session_id,
+            stages=RENDER_STAGES
+        )
+        session_store.update(session_id, render_job_id=job.id)
         
-        # Redirect to the preview page instead of download page
-        return redirect(url_for('preview_video'))
+        return redirect(url_for('job_page', job_id=job.id))
     
     except Exception as e:
         app.logger.error(f"Error generating video: {str(e)}")
         flash(f'Error generating video: {str(e)}', 'danger')
         return redirect(url_for('edit_subtitles'))
 
+def get_owned_job(job_id):
+    """Return the job if it belongs to the current session, otherwise None"""
+    job = job_queue.get(job_id)
+    if job is None or job.owner != session.get('session_id'):
+        return None
+    return job
+
+@app.route('/preview_clip', methods=['POST'])
+def preview_clip():
+    """Render a short low-resolution clip around a cue with the posted style"""
+    state = current_state()
+    if 'video_path' not in state:
+        return json.dumps({'success': False, 'error': 'Session expired'}), 400
+    
+    try:
+        # Times may be seconds or SRT time codes
+        def read_time(name):
+            value = request.form.get(name, '0')
+            return parse_time_code(value) if ':' in value else float(value)
+        
+        start = max(0.0, read_time('start'))
+        end = read_time('end')
+        duration = state.get('video_info', {}).get('duration')
+        if duration:
+            end = min(end, float(duration))
+        end = min(end, start + PREVIEW_MAX_SECONDS)
+        if end <= start:
+            return json.dumps({'success': False, 'error': 'Invalid time range'}), 400
+        
+        session_id = session['session_id']
+        subtitles_path = sync_subtitles_file(session_id)
+        session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
+        
+        # Render to a temporary name so a concurrent request never serves a partial clip
+        filename = 'preview_clip.mp4'
+        temp_path = os.path.join(session_folder, f"preview_clip.{uuid.uuid4().hex}.mp4")
+        try:
+            render_preview_clip(state['video_path'], subtitles_path, temp_path, start, end,
+                                **style_from_form(request.form))
+            os.replace(temp_path, os.path.join(session_folder, filename))
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        return json.dumps({
+            'success': True,
+            'url': url_for('serve_video', session_id=session_id, filename=filename, v=uuid.uuid4().hex[:8]),
+            'start': start,
+            'end': end
+        })
+    
+    except Exception as e:
+        app.logger.error(f"Error rendering preview clip: {str(e)}")
+        return json.dumps({'success': False, 'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>')
+def job_page(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        flash('Processing job not found', 'warning')
+        return redirect(url_for('index'))
+    
+    return render_template('processing.html', job=job.to_dict())
+
+@app.route('/jobs/<job_id>/status')
+def job_status(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        return json.dumps({'success': False, 'error': 'Job not found'}), 404
+    
+    return json.dumps({'success': True, 'job': job.to_dict()})
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    job = get_owned_job(job_id)
+    if job is None:
+        flash('Processing job not found', 'warning')
+        return redirect(url_for('index'))
+    
+    if not job.is_finished():
+        return redirect(url_for('job_page', job_id=job_id))
+    
+    if job.status == STATUS_FAILED:
+        if job.kind == 'render':
+            flash(f'Error generating video: {job.error}', 'danger')
+            return redirect(url_for('edit_subtitles'))
+        flash(f'Error processing video: {job.error}', 'danger')
+        return redirect(url_for('index'))
+    
+    # The job already stored its output in the session store
+    if job.kind == 'upload':
+        flash('Subtitles automatically translated to Brazilian Portuguese.', 'success')
+        return redirect(url_for('edit_subtitles'))
+    
+    # Redirect to the preview page instead of download page
+    return redirect(url_for('preview_video'))
+
 @app.route('/preview')
 def preview_video():
-    if 'output_filename' not in session:
+    state = current_state()
+    
+    # A progressive render in progress is previewed from its HLS playlist
+    render_job = get_owned_job(state['render_job_id']) if state.get('render_job_id') else None
+    playlist = None
+    if render_job is not None and not render_job.is_finished():
+        playlist = render_job.details.get('playlist')
+    
+    if 'output_filename' not in state and not playlist:
         flash('No processed video found', 'warning')
         return redirect(url_for('index'))
     
     # Get the required information for the preview page
-    output_filename = session.get('output_filename')
+    output_filename = state.get('output_filename')
     session_id = session.get('session_id')
     
+    # Soft subtitle tracks are not shown by browsers, so those outputs are
+    # previewed as the source video with a WebVTT overlay
     return render_template('preview.html', 
                           filename=output_filename,
-                          session_id=session_id)
+                          session_id=session_id,
+                          overlay=state.get('output_mode', 'burn') not in ('burn', 'progressive'),
+                          video_filename=state.get('video_filename'),
+                          playlist=playlist,
+                          render_job=render_job.to_dict() if playlist else None)
 
 @app.route('/download_page')
 def download_page():
-    if 'output_filename' not in session:
+    state = current_state()
+    if 'output_filename' not in state:
         flash('No processed video found', 'warning')
         return redirect(url_for('index'))
     
-    output_filename = session['output_filename']
+    output_filename = state['output_filename']
     return render_template('index.html', download_ready=True, filename=output_filename)
 
 @app.route('/download/<filename>')
@@ -343,15 +704,89 @@ def download_file(filename):
         return redirect(url_for('index'))
     
     session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session['session_id'])
-    return send_from_directory(session_folder, filename, as_attachment=True)
+    return send_media(session_folder, filename, as_attachment=True)
+
+@app.route('/download_subtitles')
+def download_subtitles():
+    if 'session_id' not in session:
+        flash('No video processing session found', 'warning')
+        return redirect(url_for('index'))
+    
+    subtitles_path = sync_subtitles_file(session['session_id'])
+    if not subtitles_path or not os.path.exists(subtitles_path):
+        flash('No subtitles found', 'warning')
+        return redirect(url_for('index'))
+    
+    fmt = request.args.get('format', 'srt').lower()
+    if fmt not in SUBTITLE_FORMATS:
+        flash(f'Unknown subtitle format: {fmt}', 'danger')
+        return redirect(url_for('edit_subtitles'))
+    
+    extension, mimetype = SUBTITLE_FORMATS[fmt]
+    session_folder = os.path.dirname(subtitles_path)
+    filename = os.path.basename(subtitles_path)
+    if fmt != 'srt':
+        # Converted cue by cue from the synced SRT file; WebVTT positions and
+        # the ASS style follow the last render's options
+        filename = f"subtitles-export{extension}"
+        save_subtitle_file(read_subtitles(subtitles_path, 'srt'), os.path.join(session_folder, filename),
+                           fmt, current_state().get('style', {}))
+    
+    return send_media(session_folder, filename, mimetype=mimetype, as_attachment=True,
+                      download_name=f"subtitles{extension}")
 
-@app.route('/video/<session_id>/<filename>')
+@app.route('/import_subtitles', methods=['POST'])
+def import_subtitles():
+    """Replace the cue list with a subtitle file uploaded by the user (SRT, WebVTT, ASS or JSON)"""
+    session_id = session.get('session_id')
+    if session_store.get_subtitles(session_id) is None:
+        return json.dumps({'success': False, 'error': 'Session expired'}), 400
+    
+    upload = request.files.get('subtitles_file')
+    if not upload or not upload.filename:
+        return json.dumps({'success': False, 'error': 'No file selected'}), 400
+    
+    try:
+        first_line = upload.stream.readline(1024).decode('utf-8-sig', errors='replace')
+        upload.stream.seek(0)
+        fmt = request.form.get('format') or detect_format(upload.filename, first_line)
+        subtitles = list(iter_subtitles(open_text(upload.stream), fmt))
+    except (UnicodeError, ValueError) as e:
+        app.logger.error(f"Error importing subtitles: {str(e)}")
+        return json.dumps({'success': False, 'error': str(e)}), 400
+    
+    if not subtitles:
+        return json.dumps({'success': False, 'error': 'No subtitles found in the file'}), 400
+    
+    session_store.set_subtitles(session_id, subtitles)
+    app.logger.info(f"Imported {len(subtitles)} cues from {upload.filename} ({fmt})")
+    return json.dumps({'success': True, 'format': fmt, 'subtitles': subtitles})
+
+@app.route('/video/<session_id>/<path:filename>')
 def serve_video(session_id, filename):
     if 'session_id' not in session or session['session_id'] != session_id:
         return "Unauthorized", 403
     
     session_folder = os.path.join(app.config['UPLOAD_FOLDER'], session_id)
-    return send_from_directory(session_folder, filename)
+    
+    # Subtitle overlays for the source video, generated from the cue list.
+    # Style options come from the query string (live editing) or from the
+    # last render.
+    if filename in ('subtitles.vtt', 'subtitles.css'):
+        style = style_from_form(request.args) if request.args.get('font_size') else current_state().get('style', {})
+        
+        if filename == 'subtitles.vtt':
+            subtitles = session_store.get_subtitles(session_id)
+            if subtitles is None:
+                return "Not found", 404
+            write_webvtt(subtitles, os.path.join(session_folder, filename), style)
+            return send_from_directory(session_folder, filename, mimetype='text/vtt', max_age=0)
+        
+        with open(os.path.join(session_folder, filename), 'w', encoding='utf-8') as f:
+            f.write(cue_css(**style))
+        return send_from_directory(session_folder, filename, mimetype='text/css', max_age=0)
+    
+    return send_media(session_folder, filename)
 
 @app.route('/clear_session', methods=['POST'])
 def clear_session():
@@ -362,21 +797,15 @@ def clear_session():
                 shutil.rmtree(session_folder)
             except Exception as e:
                 app.logger.error(f"Error removing session folder: {str(e)}")
+        session_store.delete(session['session_id'])
+        session_reaper.forget(session['session_id'])
     
     session.clear()
     flash('Session cleared', 'info')
     return redirect(url_for('index'))
 
-# Clean up old session folders periodically (files older than 1 hour)
+# Keep sessions alive while they are in use; expiry is handled by session_reaper
 @app.before_request
-def cleanup_old_sessions():
-    try:
-        current_time = time.time()
-        for folder_name in os.listdir(UPLOAD_FOLDER):
-            folder_path = os.path.join(UPLOAD_FOLDER, folder_name)
-            if os.path.isdir(folder_path):
-                folder_modified_time = os.path.getmtime(folder_path)
-                if current_time - folder_modified_time > 3600:  # 1 hour
-                    shutil.rmtree(folder_path)
-    except Exception as e:
-        app.logger.error(f"Error during cleanup: {str(e)}")
+def touch_session():
+    if 'session_id' in session:
+        session_reaper.touch(session['session_id'])
@@ -0,0 +1,129 @@
+"""
+Compare CueTrack with the list-of-dicts cue representation
+
+Usage:
+    python -m benchmarks.bench_cues --cues 100000
+
+Builds a synthetic subtitle list, then measures memory and the time to
+parse it, shift every cue, repair overlaps, fill short gaps and convert
+back to the editor's JSON, once with plain dictionaries and time code
+strings and once with CueTrack.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processor import parse_time_code, format_time_code
+from utils.cue_track import CueTrack
+
+LINES = [
+    "Exemplo de legenda em português",
+    "Este é um teste de legenda",
+    "Obrigado",
+    "Vamos lá",
+    "O que aconteceu aqui?"
+]
+
+
+def make_subtitles(count, seed=1):
+    rng = random.Random(seed)
+    subtitles = []
+    start = 0.0
+    for index in range(1, count + 1):
+        start += rng.uniform(0.5, 3.0)
+        # Some cues run into the next one, as Whisper output often does
+        end = start + rng.uniform(0.8, 3.5)
+        subtitles.append({
+            'index': index,
+            'start': format_time_code(start),
+            'end': format_time_code(end),
+            'text': rng.choice(LINES) if rng.random() < 0.7 else f"Linha número {index}"
+        })
+    return subtitles
+
+
+def dicts_pipeline(subtitles, shift_seconds, min_gap, max_gap):
+    cues = [dict(cue, start=parse_time_code(cue['start']), end=parse_time_code(cue['end'])) for cue in subtitles]
+    for cue in cues:
+        cue['start'] = max(0.0, cue['start'] + shift_seconds)
+        cue['end'] = max(0.0, cue['end'] + shift_seconds)
+    cues.sort(key=lambda cue: cue['start'])
+    for cue, following in zip(cues, cues[1:]):
+        cue['end'] = max(cue['start'], min(cue['end'], following['start'] - min_gap))
+    for cue, following in zip(cues, cues[1:]):
+        gap = following['start'] - cue['end']
+        if min_gap < gap <= max_gap:
+            cue['end'] = following['start'] - min_gap
+    return json.dumps([dict(cue, start=format_time_code(cue['start']), end=format_time_code(cue['end']))
+                       for cue in cues])
+
+
+def track_pipeline(subtitles, shift_seconds, min_gap, max_gap):
+    track = CueTrack.from_dicts(subtitles)
+    track.shift(int(round(shift_seconds * 1000))).clamp(0)
+    track.fix_overlaps(int(min_gap * 1000))
+    track.fill_gaps(int(max_gap * 1000), int(min_gap * 1000))
+    return track.to_json()
+
+
+def timed(label, func, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {best * 1000:>9.1f} ms")
+    return result, best
+
+
+def measure_memory(build):
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return obj, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cues', type=int, default=100000, help='Number of cues')
+    parser.add_argument('--shift', type=float, default=-1.25, help='Shift applied to every cue, in seconds')
+    args = parser.parse_args()
+
+    print(f"cues={args.cues}")
+    subtitles = make_subtitles(args.cues)
+    serialized = json.dumps(subtitles)
+
+    # Memory each representation keeps, both built from the same JSON so the
+    # track is charged for its own text strings (the parsed dicts are freed)
+    _, dict_bytes = measure_memory(lambda: json.loads(serialized))
+    measured_track, track_bytes = measure_memory(lambda: CueTrack.from_dicts(json.loads(serialized)))
+    print(f"{'memory, list of dicts':<34} {dict_bytes / 1e6:>9.1f} MB")
+    print(f"{'memory, CueTrack':<34} {track_bytes / 1e6:>9.1f} MB  ({dict_bytes / track_bytes:.1f}x smaller, "
+          f"nbytes() {measured_track.nbytes() / 1e6:.1f} MB)")
+    del measured_track
+
+    loaded = json.loads(serialized)
+
+    timed("parse time codes, dicts", lambda: [(parse_time_code(c['start']), parse_time_code(c['end'])) for c in loaded])
+    timed("parse time codes, CueTrack", CueTrack.from_dicts, loaded)
+
+    track = CueTrack.from_dicts(loaded)
+    timed("shift + fix overlaps + fill gaps", lambda: track.copy().shift(int(round(args.shift * 1000))).clamp(0).fix_overlaps(40).fill_gaps(500, 40))
+
+    dict_json, dict_time = timed("full pipeline, dicts", dicts_pipeline, loaded, args.shift, 0.04, 0.5)
+    track_json, track_time = timed("full pipeline, CueTrack", track_pipeline, loaded, args.shift, 0.04, 0.5)
+    print(f"{'speedup':<34} {dict_time / track_time:>9.1f}x")
+
+    same = json.loads(dict_json) == json.loads(track_json)
+    print(f"{'outputs identical':<34} {'yes' if same else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Compare single-process and segment-parallel subtitle burn-in
+
+Usage:
+    python -m benchmarks.bench_render --workers 4
+    python -m benchmarks.bench_render --input test_files/test_video.mp4 --synthetic-seconds 0
+
+Renders every input with embed_subtitles and with render_parallel, reports
+wall time and speedup, and checks that both outputs have the same video
+frame timestamps (within --tolerance-ms). The encoded pixels are not
+compared: every segment has its own rate control and keyframe placement. Besides the files in test_files/, a synthetic long input
+(test pattern and tone) is generated with cues every few seconds.
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processor import embed_subtitles, get_video_info, format_time_code
+from utils.parallel_render import render_parallel, DEFAULT_MAX_WORKERS
+
+
+def make_synthetic_video(path, seconds, size):
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30',
+        '-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100',
+        '-t', str(seconds),
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60',
+        '-c:a', 'aac', '-shortest',
+        path
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def make_subtitles(path, duration, cue_seconds=3.0):
+    with open(path, 'w', encoding='utf-8') as f:
+        index = 1
+        start = 0.0
+        while start < duration:
+            end = min(start + cue_seconds - 0.5, duration)
+            f.write(f"{index}\n{format_time_code(start)} --> {format_time_code(end)}\n"
+                    f"Synthetic subtitle number {index}\n\n")
+            index += 1
+            start += cue_seconds
+
+
+def frame_times(path):
+    """Presentation timestamps of every video packet, in display order"""
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time', '-of', 'csv=p=0', path
+    ]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return sorted(float(line) for line in output.split() if line not in ('', 'N/A'))
+
+
+def compare_frames(single_path, parallel_path, tolerance_ms):
+    single = frame_times(single_path)
+    parallel = frame_times(parallel_path)
+    if len(single) != len(parallel):
+        return f"MISMATCH ({len(single)} vs {len(parallel)} frames)"
+
+    drift = max((abs(a - b) for a, b in zip(single, parallel)), default=0.0) * 1000
+    if drift > tolerance_ms:
+        return f"MISMATCH ({len(single)} frames, timestamps off by up to {drift:.1f}ms)"
+    return f"ok ({len(single)} frames, max drift {drift:.1f}ms)"
+
+
+def bench(label, video_path, subtitles_path, work_dir, workers, tolerance_ms):
+    duration = get_video_info(video_path)['duration']
+
+    single_path = os.path.join(work_dir, 'single.mp4')
+    start = time.perf_counter()
+    embed_subtitles(video_path, subtitles_path, single_path)
+    single = time.perf_counter() - start
+
+    parallel_path = os.path.join(work_dir, 'parallel.mp4')
+    start = time.perf_counter()
+    render_parallel(video_path, subtitles_path, parallel_path, max_workers=workers)
+    parallel = time.perf_counter() - start
+
+    match = compare_frames(single_path, parallel_path, tolerance_ms)
+
+    print(f"{label:<36} {duration:>8.1f}s  single {single:>7.1f}s  parallel {parallel:>7.1f}s  "
+          f"speedup {single / parallel:.2f}x  frames {match}")
+
+    os.remove(single_path)
+    os.remove(parallel_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', action='append', help='Video file (repeatable; defaults to test_files/*.mp4)')
+    parser.add_argument('--synthetic-seconds', type=float, default=600, help='Length of the synthetic input (0 to skip)')
+    parser.add_argument('--synthetic-size', default='1280x720', help='Resolution of the synthetic input')
+    parser.add_argument('--workers', type=int, default=max(2, DEFAULT_MAX_WORKERS), help='Concurrent encoders')
+    parser.add_argument('--tolerance-ms', type=float, default=1.0,
+                        help='Largest accepted difference between matching frame timestamps')
+    args = parser.parse_args()
+
+    inputs = args.input or sorted(glob.glob('test_files/*.mp4'))
+    work_dir = tempfile.mkdtemp(prefix='bench_render_')
+    print(f"workers={args.workers}, cpus={os.cpu_count()}")
+
+    try:
+        for video_path in inputs:
+            subtitles_path = os.path.join(work_dir, 'subtitles.srt')
+            make_subtitles(subtitles_path, get_video_info(video_path)['duration'])
+            bench(os.path.basename(video_path), video_path, subtitles_path, work_dir, args.workers,
+                  args.tolerance_ms)
+
+        if args.synthetic_seconds > 0:
+            video_path = os.path.join(work_dir, 'synthetic.mp4')
+            subtitles_path = os.path.join(work_dir, 'synthetic.srt')
+            make_synthetic_video(video_path, args.synthetic_seconds, args.synthetic_size)
+            make_subtitles(subtitles_path, args.synthetic_seconds)
+            bench(f"synthetic {args.synthetic_size}", video_path, subtitles_path, work_dir, args.workers,
+                  args.tolerance_ms)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
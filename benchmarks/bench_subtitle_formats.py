@@ -0,0 +1,110 @@
+"""
+Benchmark the streaming subtitle readers and writers on large files
+
+Usage:
+    python -m benchmarks.bench_subtitle_formats --cues 200000 --crlf
+
+Writes a multi-megabyte SRT file, then measures the time and peak memory
+of the old whole-file parser (read, split on blank lines) against the
+streaming reader, and of converting the file to every supported format
+and reading each conversion back.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.subtitle_formats import FORMATS, iter_cues, read_subtitles, save_subtitles, format_timestamp
+
+WORDS = "o que aconteceu aqui vamos lá obrigado este é um teste de legenda em português".split()
+
+
+def write_srt_file(path, count, crlf=False, seed=1):
+    rng = random.Random(seed)
+    newline = '\r\n' if crlf else '\n'
+    start = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        # Editors on Windows often add a BOM
+        f.write('\ufeff')
+        for index in range(1, count + 1):
+            start += rng.randint(500, 3000)
+            end = start + rng.randint(800, 3500)
+            lines = [' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6)))
+                     for _ in range(rng.randint(1, 2))]
+            f.write(newline.join([str(index), f"{format_timestamp(start)} --> {format_timestamp(end)}", *lines]))
+            f.write(newline * 2)
+
+
+def legacy_parse(path):
+    """The former srt_to_dict parser, without the long-line split"""
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read().strip()
+    subtitles = []
+    for block in content.split('\n\n'):
+        lines = block.split('\n')
+        if len(lines) >= 3:
+            try:
+                index = int(lines[0])
+            except ValueError:
+                continue
+            start, end = lines[1].split(' --> ')
+            subtitles.append({'index': index, 'start': start, 'end': end, 'text': ' '.join(lines[2:])})
+    return subtitles
+
+
+def count_streamed(path, fmt):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return sum(1 for _ in iter_cues(f, fmt))
+
+
+def measure(label, func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{label:<36} {elapsed * 1000:>9.1f} ms  peak {peak / 1e6:>8.2f} MB")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cues', type=int, default=200000, help='Number of cues in the generated file')
+    parser.add_argument('--crlf', action='store_true', help='Write the file with Windows line endings')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        source = os.path.join(folder, 'source.srt')
+        write_srt_file(source, args.cues, args.crlf)
+        print(f"cues={args.cues} size={os.path.getsize(source) / 1e6:.1f} MB "
+              f"line endings={'CRLF' if args.crlf else 'LF'}")
+
+        legacy = measure("parse, whole file + split", legacy_parse, source)
+        streamed = measure("parse, streaming (count only)", count_streamed, source, 'srt')
+        loaded = measure("parse, streaming into a list", lambda: list(read_subtitles(source, 'srt')))
+        print(f"{'cues found, whole file / streaming':<36} {len(legacy)} / {streamed}")
+
+        for fmt, (extension, _) in FORMATS.items():
+            target = os.path.join(folder, f"converted{extension}")
+            measure(f"convert SRT to {fmt}", lambda: save_subtitles(read_subtitles(source, 'srt'), target, fmt))
+            count = measure(f"read {fmt} ({os.path.getsize(target) / 1e6:.1f} MB)", count_streamed, target, fmt)
+
+            if fmt == 'ass':
+                # ASS keeps centiseconds, so only the cue count is compared
+                same = count == len(loaded)
+            else:
+                same = list(read_subtitles(target, fmt)) == loaded
+            print(f"{'  round trip identical':<36} {'yes' if same else 'NO'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare the real-time factor (RTF) of single-call and parallel chunked transcription
+
+Usage:
+    python -m benchmarks.bench_transcription --input test_files/test_pt_with_audio.mp4 --repeat 60
+
+RTF is processing time divided by audio duration; lower is faster. Long inputs
+are synthesized by repeating the decoded audio of the input file.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processor import extract_audio_array
+from utils.subtitle_generator import transcribe_audio
+from utils.parallel_transcriber import SAMPLE_RATE, DEFAULT_MAX_WORKERS, DEFAULT_CHUNK_SECONDS
+
+
+def run(label, audio, **kwargs):
+    start = time.perf_counter()
+    segments, info = transcribe_audio(audio, **kwargs)
+    elapsed = time.perf_counter() - start
+    duration = len(audio) / SAMPLE_RATE
+    print(f"{label:<28} {duration:>9.1f}s audio  {elapsed:>8.1f}s  RTF {elapsed / duration:.3f}  "
+          f"{len(segments)} segments  lang={info['language']}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='test_files/test_pt_with_audio.mp4', help='Video or audio file to decode')
+    parser.add_argument('--repeat', type=int, default=30, help='Number of times to repeat the decoded audio')
+    parser.add_argument('--model', default='base', help='Whisper model name')
+    parser.add_argument('--workers', type=int, default=max(2, DEFAULT_MAX_WORKERS), help='Parallel worker processes')
+    parser.add_argument('--chunk-seconds', type=float, default=DEFAULT_CHUNK_SECONDS, help='Target chunk length')
+    args = parser.parse_args()
+
+    audio = np.tile(extract_audio_array(args.input), args.repeat)
+    print(f"Input: {args.input} x{args.repeat} = {len(audio) / SAMPLE_RATE:.1f}s, model={args.model}, "
+          f"workers={args.workers}, chunk={args.chunk_seconds}s, cpus={os.cpu_count()}")
+
+    # Warm up both paths so model loading is not part of the measurement
+    transcribe_audio(audio[:5 * SAMPLE_RATE], model_name=args.model, parallel=False)
+    transcribe_audio(audio[:args.workers * 10 * SAMPLE_RATE], model_name=args.model, parallel=True,
+                     chunk_seconds=10, max_workers=args.workers)
+
+    single = run('single call', audio, model_name=args.model, parallel=False)
+    parallel = run(f'parallel ({args.workers} workers)', audio, model_name=args.model, parallel=True,
+                   chunk_seconds=args.chunk_seconds, max_workers=args.workers)
+
+    print(f"Speedup: {single / parallel:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
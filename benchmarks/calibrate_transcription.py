@@ -0,0 +1,257 @@
+"""
+Calibrate the transcription settings of this host
+
+Usage:
+    python -m benchmarks.calibrate_transcription --model base --max-wer 0.10
+
+Transcribes a reference corpus (the media files in test_files/ plus
+synthetic clips built from them: speech separated by long silences, and
+speech over a music-like tone bed) with every combination of beam size,
+compute type, VAD and thread layout. For each one it measures the real-time
+factor (RTF, processing time divided by audio duration, with as many clips
+transcribed at once as the layout has decoders) and the word error rate
+(WER) against reference transcripts. The fastest configuration within
+--max-wer is saved as this host's profile, which transcribe_audio (and so
+generate_subtitles and the upload pipeline) loads from then on.
+
+References come from a .srt or .txt file with the same name as a clip when
+there is one, otherwise from the most careful decode (beam 5, float32, no
+VAD) of --reference-model. Clips are cut after MAX_CLIP_SECONDS, at the end
+of the last subtitle starting before it for .srt references; clips with a
+.txt reference cannot be aligned and are used whole.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.video_processor import extract_audio_array
+from utils.subtitle_generator import transcribe_audio
+from utils.subtitle_formats import read_subtitles, parse_timestamp
+from utils.parallel_transcriber import SAMPLE_RATE
+from utils.job_queue import DEFAULT_MAX_WORKERS as JOB_WORKERS
+from utils.transcription_settings import default_settings, save_profile, host_key, PROFILE_PATH
+
+MEDIA_EXTENSIONS = ('.mp4', '.mkv', '.mov', '.webm', '.avi', '.wav', '.mp3', '.aac', '.m4a', '.flac')
+
+# Longest part of each corpus file used, to keep calibration runs short
+MAX_CLIP_SECONDS = 60
+
+REFERENCE_SETTINGS = {
+    'beam_size': 5,
+    'compute_type': 'float32',
+    'vad_filter': False,
+    'vad_min_silence_ms': 500,
+    'cpu_threads': os.cpu_count() or 1,
+    'num_workers': 1
+}
+
+
+def word_errors(reference, hypothesis):
+    """
+    Count word-level edits between two texts (case and punctuation ignored)
+
+    Returns:
+        tuple: (substitutions + deletions + insertions, number of reference words)
+    """
+    ref = re.findall(r'\w+', reference.lower())
+    hyp = re.findall(r'\w+', hypothesis.lower())
+
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1], len(ref)
+
+
+def transcript(audio, model_name, settings):
+    segments, _ = transcribe_audio(audio, model_name=model_name, parallel=False, settings=settings)
+    return ' '.join(segment['text'].strip() for segment in segments)
+
+
+def load_corpus(folder):
+    """Decode every media file with audio in a folder; returns (name, audio, reference text or None)"""
+    corpus = []
+    for name in sorted(os.listdir(folder)):
+        path = os.path.join(folder, name)
+        stem, extension = os.path.splitext(path)
+        if extension.lower() not in MEDIA_EXTENSIONS:
+            continue
+        try:
+            audio = extract_audio_array(path)
+        except Exception as e:
+            print(f"  skipping {name}: {str(e).splitlines()[0] if str(e) else e}")
+            continue
+        if len(audio) < SAMPLE_RATE:
+            continue
+
+        reference_path = next((stem + ext for ext in ('.srt', '.txt') if os.path.exists(stem + ext)), None)
+        reference, clip_seconds = read_reference(reference_path) if reference_path else (None, MAX_CLIP_SECONDS)
+        clip = audio[:int(clip_seconds * SAMPLE_RATE)] if clip_seconds else audio
+        corpus.append((name, clip, reference))
+    return corpus
+
+
+def read_reference(path, max_seconds=MAX_CLIP_SECONDS):
+    """
+    Read a reference transcript covering the start of a clip
+
+    Returns:
+        tuple: (text, seconds of audio it covers, or None for the whole clip)
+    """
+    if path.endswith('.srt'):
+        texts = []
+        end_ms = 0
+        for cue in read_subtitles(path, 'srt'):
+            if parse_timestamp(cue['start']) >= max_seconds * 1000:
+                break
+            texts.append(cue['text'])
+            end_ms = max(end_ms, parse_timestamp(cue['end']))
+        return ' '.join(texts), max(max_seconds, end_ms / 1000)
+
+    # Plain text has no timing, so the whole clip is used
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        return f.read(), None
+
+
+def tone_bed(samples, level=0.05):
+    """A chord with a slow tremolo, standing in for background music"""
+    t = np.arange(samples, dtype=np.float32) / SAMPLE_RATE
+    chord = sum(np.sin(2 * np.pi * frequency * t) for frequency in (220.0, 277.2, 329.6))
+    tremolo = 0.6 + 0.4 * np.sin(2 * np.pi * 0.5 * t)
+    return (level * chord * tremolo / 3).astype(np.float32)
+
+
+def synthetic_clips(name, audio, reference):
+    """Clips exercising VAD: long silences between speech, and music with and without speech"""
+    silence = np.zeros(8 * SAMPLE_RATE, dtype=np.float32)
+    music_intro = tone_bed(5 * SAMPLE_RATE)
+    gaps = np.concatenate([silence, audio, silence, audio, silence])
+    music = np.concatenate([music_intro, audio + tone_bed(len(audio))])
+    return [
+        (f"{name} + silences", gaps, f"{reference} {reference}"),
+        (f"{name} + music", np.clip(music, -1.0, 1.0), reference)
+    ]
+
+
+def parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+
+def thread_layouts(value):
+    """Parse '4x1,2x2' into (cpu_threads, num_workers) pairs; 'auto' derives them from the cores"""
+    if value != 'auto':
+        return [tuple(int(part) for part in item.split('x')) for item in parse_list(value)]
+    cores = os.cpu_count() or 1
+    return sorted({(max(1, cores // workers), workers) for workers in {1, max(1, JOB_WORKERS)}})
+
+
+def measure(clips, model_name, settings):
+    """Transcribe every clip with num_workers at a time; returns (RTF, WER)"""
+    # Load the model outside the measurement
+    transcript(clips[0][1][:2 * SAMPLE_RATE], model_name, settings)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=settings['num_workers']) as executor:
+        hypotheses = list(executor.map(lambda clip: transcript(clip[1], model_name, settings), clips))
+    elapsed = time.perf_counter() - start
+
+    errors = words = 0
+    for (_, _, reference), hypothesis in zip(clips, hypotheses):
+        clip_errors, clip_words = word_errors(reference, hypothesis)
+        errors += clip_errors
+        words += clip_words
+
+    duration = sum(len(audio) for _, audio, _ in clips) / SAMPLE_RATE
+    return elapsed / duration, errors / max(1, words)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default='test_files', help='Folder with reference media files')
+    parser.add_argument('--model', default='base', help='Whisper model to calibrate')
+    parser.add_argument('--reference-model', help='Model producing reference transcripts (default --model)')
+    parser.add_argument('--max-wer', type=float, default=0.10, help='Highest acceptable word error rate')
+    parser.add_argument('--beam-sizes', default='1,2,5', help='Beam sizes to try')
+    parser.add_argument('--compute-types', default='int8,int8_float32,float32', help='Compute types to try')
+    parser.add_argument('--vad', default='0,1', help='VAD settings to try (0 off, 1 on)')
+    parser.add_argument('--threads', default='auto',
+                        help="Thread layouts as cpu_threadsxnum_workers (e.g. '4x1,2x2'); 'auto' tries "
+                             "all cores for one decoder and an equal share for each of JOB_WORKERS decoders")
+    parser.add_argument('--no-synthetic', action='store_true', help='Only use the corpus files')
+    parser.add_argument('--dry-run', action='store_true', help='Measure without saving the profile')
+    parser.add_argument('--profile-path', default=PROFILE_PATH, help='Profile file to update')
+    args = parser.parse_args()
+
+    print(f"Host {host_key()}, model {args.model}, corpus {args.corpus}")
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print("No media files with audio found in the corpus")
+        return 1
+
+    reference_model = args.reference_model or args.model
+    clips = []
+    for name, audio, reference in corpus:
+        if reference is None:
+            reference = transcript(audio, reference_model, REFERENCE_SETTINGS)
+        clips.append((name, audio, reference))
+        if not args.no_synthetic:
+            clips.extend(synthetic_clips(name, audio, reference))
+
+    duration = sum(len(audio) for _, audio, _ in clips) / SAMPLE_RATE
+    transcribed = sum(1 for _, _, reference in corpus if reference is None)
+    print(f"{len(clips)} clips, {duration:.1f}s of audio; {transcribed} of {len(corpus)} references "
+          f"transcribed with {reference_model} (beam 5, float32)")
+
+    grid = itertools.product(
+        parse_list(args.beam_sizes, int),
+        parse_list(args.compute_types),
+        [value == '1' for value in parse_list(args.vad)],
+        thread_layouts(args.threads)
+    )
+
+    results = []
+    print(f"{'beam':>4} {'compute':<13} {'vad':<4} {'threads':>7} {'RTF':>7} {'WER':>7}")
+    for beam_size, compute_type, vad_filter, (cpu_threads, num_workers) in grid:
+        settings = dict(default_settings(), beam_size=beam_size, compute_type=compute_type,
+                        vad_filter=vad_filter, cpu_threads=cpu_threads, num_workers=num_workers)
+        try:
+            rtf, wer = measure(clips, args.model, settings)
+        except Exception as e:
+            print(f"{beam_size:>4} {compute_type:<13} {'on' if vad_filter else 'off':<4} "
+                  f"{cpu_threads:>4}x{num_workers:<2} failed: {str(e)}")
+            continue
+        results.append((rtf, wer, settings))
+        print(f"{beam_size:>4} {compute_type:<13} {'on' if vad_filter else 'off':<4} "
+              f"{cpu_threads:>4}x{num_workers:<2} {rtf:>7.3f} {wer:>7.3f}")
+
+    eligible = [result for result in results if result[1] <= args.max_wer]
+    if not eligible:
+        print(f"No configuration reached WER {args.max_wer}; profile not saved")
+        return 1
+
+    rtf, wer, settings = min(eligible, key=lambda result: (result[0], result[1]))
+    print(f"Fastest within WER {args.max_wer}: {settings} (RTF {rtf:.3f}, WER {wer:.3f})")
+
+    if not args.dry_run:
+        save_profile(args.model, settings, {
+            'rtf': round(rtf, 4),
+            'wer': round(wer, 4),
+            'max_wer': args.max_wer,
+            'clips': len(clips),
+            'audio_seconds': round(duration, 1)
+        }, path=args.profile_path)
+        print(f"Saved to {args.profile_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
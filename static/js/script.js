@@ -1,3 +1,127 @@
+// Files at least this large use the resumable chunked upload
+const CHUNKED_UPLOAD_MIN_BYTES = 32 * 1024 * 1024;
+
+// Chunks sent at the same time, and attempts per chunk
+const UPLOAD_CONNECTIONS = 4;
+const CHUNK_ATTEMPTS = 5;
+
+/**
+ * SHA-256 of a blob as hex, or null where Web Crypto is unavailable (plain HTTP)
+ */
+async function sha256Hex(blob) {
+    if (!window.crypto || !window.crypto.subtle) {
+        return null;
+    }
+    const digest = await window.crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Upload a file in numbered chunks over several connections
+ *
+ * The upload ID is kept in localStorage, so submitting the same file again
+ * after a dropped connection or a page reload only sends the missing chunks.
+ * Resolves with the URL of the processing job page.
+ */
+async function chunkedUpload(file, baseUrl, onProgress) {
+    const storageKey = 'upload:' + [file.name, file.size, file.lastModified].join(':');
+    let status = null;
+    
+    // Resume an earlier upload of the same file, if the server still has it
+    const savedId = localStorage.getItem(storageKey);
+    if (savedId) {
+        const response = await fetch(baseUrl + '/' + encodeURIComponent(savedId));
+        if (response.ok) {
+            status = await response.json();
+            if (status.complete && status.redirect) {
+                localStorage.removeItem(storageKey);
+                return status.redirect;
+            }
+        }
+    }
+    
+    if (!status) {
+        const response = await fetch(baseUrl, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        });
+        status = await response.json();
+        if (!response.ok || !status.success) {
+            throw new Error(status.error || response.statusText);
+        }
+        localStorage.setItem(storageKey, status.upload_id);
+    }
+    
+    const uploadUrl = baseUrl + '/' + encodeURIComponent(status.upload_id);
+    const chunkSize = status.chunk_size;
+    const queue = status.missing.slice();
+    let sentBytes = status.received.reduce((total, range) => total + range[1] - range[0], 0);
+    let redirect = null;
+    onProgress(sentBytes / file.size);
+    
+    async function sendChunk(index) {
+        const blob = file.slice(index * chunkSize, Math.min(file.size, (index + 1) * chunkSize));
+        const headers = {'Content-Type': 'application/octet-stream'};
+        const checksum = await sha256Hex(blob);
+        if (checksum) {
+            headers['X-Chunk-SHA256'] = checksum;
+        }
+        
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const response = await fetch(uploadUrl + '/chunks/' + index, {method: 'PUT', headers: headers, body: blob});
+                const data = await response.json();
+                if (response.ok && data.success) {
+                    sentBytes += blob.size;
+                    onProgress(sentBytes / file.size);
+                    redirect = data.redirect || redirect;
+                    return;
+                }
+                if (attempt >= CHUNK_ATTEMPTS || response.status === 404) {
+                    throw new Error(data.error || response.statusText);
+                }
+            } catch (error) {
+                if (attempt >= CHUNK_ATTEMPTS) {
+                    throw error;
+                }
+            }
+            // Back off before retrying: 1s, 2s, 4s, ...
+            await new Promise(resolve => setTimeout(resolve, 1000 * Math.pow(2, attempt - 1)));
+        }
+    }
+    
+    async function worker() {
+        while (queue.length > 0) {
+            await sendChunk(queue.shift());
+        }
+    }
+    
+    const workers = [];
+    for (let i = 0; i < Math.min(UPLOAD_CONNECTIONS, queue.length); i++) {
+        workers.push(worker());
+    }
+    await Promise.all(workers);
+    
+    // The request that completed the upload may still be starting the job
+    while (!redirect) {
+        await new Promise(resolve => setTimeout(resolve, 1000));
+        const response = await fetch(uploadUrl);
+        const data = await response.json();
+        if (!response.ok) {
+            throw new Error(data.error || response.statusText);
+        }
+        if (data.missing.length > 0) {
+            // The whole-file check failed and the server asked for everything again
+            throw new Error('Upload verification failed');
+        }
+        redirect = data.redirect;
+    }
+    
+    localStorage.removeItem(storageKey);
+    return redirect;
+}
+
 /**
  * Initialize file upload functionality
  */
@@ -110,6 +234,27 @@ function initFileUpload() {
                 progressBar.classList.remove('d-none');
             }
             
+            // Large files go up in resumable chunks over several connections
+            const chunkedUrl = uploadForm.dataset.chunkedUrl;
+            const file = fileInput.files[0];
+            if (chunkedUrl && window.fetch && file.size >= CHUNKED_UPLOAD_MIN_BYTES) {
+                chunkedUpload(file, chunkedUrl, function(fraction) {
+                    if (progressBarInner) {
+                        const percentComplete = Math.round(fraction * 100);
+                        progressBarInner.style.width = percentComplete + '%';
+                        progressBarInner.textContent = percentComplete + '%';
+                    }
+                }).then(function(redirect) {
+                    window.location.href = redirect;
+                }).catch(function(error) {
+                    if (progressBar) {
+                        progressBar.classList.add('d-none');
+                    }
+                    showAlert('Error uploading file: ' + error.message + '. Submit again to resume.', 'danger');
+                });
+                return;
+            }
+            
             // Create AJAX request
             const xhr = new XMLHttpRequest();
             
@@ -124,15 +269,30 @@ function initFileUpload() {
                 });
             }
             
+            // The streaming endpoint takes the raw file as the body, so the
+            // server can decode its audio while it is still arriving
+            const streamUrl = uploadForm.dataset.streamUrl;
+            
             // Load completed handler
             xhr.addEventListener('load', function() {
                 if (xhr.status >= 200 && xhr.status < 300) {
-                    window.location.href = xhr.responseURL;
+                    if (streamUrl) {
+                        const data = JSON.parse(xhr.responseText);
+                        window.location.href = data.redirect;
+                    } else {
+                        window.location.href = xhr.responseURL;
+                    }
                 } else {
                     if (progressBar) {
                         progressBar.classList.add('d-none');
                     }
-                    showAlert('Error uploading file: ' + xhr.statusText, 'danger');
+                    let message = xhr.statusText;
+                    try {
+                        message = JSON.parse(xhr.responseText).error || message;
+                    } catch (err) {
+                        // Not a JSON error response
+                    }
+                    showAlert('Error uploading file: ' + message, 'danger');
                 }
             });
             
@@ -152,9 +312,16 @@ function initFileUpload() {
                 showAlert('Upload aborted', 'warning');
             });
             
-            // Send the form data
-            xhr.open('POST', uploadForm.action);
-            xhr.send(formData);
+            // Send the file
+            if (streamUrl) {
+                const file = fileInput.files[0];
+                xhr.open('POST', streamUrl + '?filename=' + encodeURIComponent(file.name));
+                xhr.setRequestHeader('Content-Type', 'application/octet-stream');
+                xhr.send(file);
+            } else {
+                xhr.open('POST', uploadForm.action);
+                xhr.send(formData);
+            }
         });
     }
 }
@@ -305,54 +472,302 @@ function initSubtitleEditor() {
     }
     
     // Save subtitles
+    // Only cues edited since the last save are sent; edits are autosaved
+    // shortly after typing stops and the server merges bursts of saves
+    const dirtyCues = new Set();
+    let autosaveTimer = null;
+    let saveInFlight = null;
+    
+    const collectCue = (row) => {
+        const textInput = row.querySelector('.subtitle-text');
+        
+        // Ensure there are no line breaks in the text - replace with spaces
+        const text = textInput.value.replace(/\n/g, ' ').replace(/\r/g, '');
+        textInput.value = text;
+        
+        return {
+            index: parseInt(row.dataset.index),
+            start: row.querySelector('.start-time').value,
+            end: row.querySelector('.end-time').value,
+            text: text
+        };
+    };
+    
+    const saveChanges = (showResult) => {
+        clearTimeout(autosaveTimer);
+        
+        if (!dirtyCues.size) {
+            if (showResult) {
+                showAlert('Subtitles saved successfully!', 'success');
+            }
+            return Promise.resolve();
+        }
+        
+        // Wait for the previous save so patches reach the server in order
+        const previous = saveInFlight || Promise.resolve();
+        const changed = [];
+        dirtyCues.forEach(index => {
+            const row = document.querySelector(`#subtitlesTable tbody tr[data-index="${index}"]`);
+            if (row) {
+                changed.push(collectCue(row));
+            }
+        });
+        dirtyCues.clear();
+        
+        saveInFlight = previous.then(() => fetch('/patch_subtitles', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({ changed: changed })
+        }))
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                scheduleOverlayRefresh();
+                if (showResult) {
+                    showAlert('Subtitles saved successfully!', 'success');
+                }
+            } else {
+                changed.forEach(cue => dirtyCues.add(String(cue.index)));
+                showAlert('Error saving subtitles: ' + data.error, 'danger');
+            }
+        })
+        .catch(error => {
+            changed.forEach(cue => dirtyCues.add(String(cue.index)));
+            showAlert('Error: ' + error, 'danger');
+        });
+        
+        return saveInFlight;
+    };
+    
+    if (subtitleTable) {
+        subtitleTable.addEventListener('input', function(e) {
+            const row = e.target.closest('tr[data-index]');
+            if (!row) return;
+            
+            dirtyCues.add(row.dataset.index);
+            clearTimeout(autosaveTimer);
+            autosaveTimer = setTimeout(() => saveChanges(false), 1500);
+        });
+    }
+    
     if (saveButton) {
         saveButton.addEventListener('click', function() {
-            const rows = document.querySelectorAll('#subtitlesTable tbody tr');
-            const subtitles = [];
-            
-            if (!rows.length) {
+            if (!document.querySelectorAll('#subtitlesTable tbody tr').length) {
                 showAlert('No subtitles found to save', 'warning');
                 return;
             }
             
-            rows.forEach(row => {
-                const index = parseInt(row.dataset.index);
-                const startTime = row.querySelector('.start-time').value;
-                const endTime = row.querySelector('.end-time').value;
-                let text = row.querySelector('.subtitle-text').value;
-                
-                // Ensure there are no line breaks in the text - replace with spaces
-                text = text.replace(/\n/g, ' ').replace(/\r/g, '');
-                
-                // Also update the input field to reflect the changes
-                row.querySelector('.subtitle-text').value = text;
-                
-                subtitles.push({
-                    index: index,
-                    start: startTime,
-                    end: endTime,
-                    text: text
-                });
-            });
+            saveChanges(true);
+        });
+    }
+    
+    // Timing tools run on the server over the whole cue list
+    document.querySelectorAll('.retime-btn').forEach(btn => {
+        btn.addEventListener('click', function(e) {
+            e.preventDefault();
+            
+            const request = {operation: this.dataset.operation};
+            if (request.operation === 'shift') {
+                const seconds = parseFloat(prompt('Shift every subtitle by how many seconds? (negative moves them earlier)', '0.5'));
+                if (isNaN(seconds) || seconds === 0) return;
+                request.seconds = seconds;
+            } else if (request.operation === 'scale') {
+                const factor = parseFloat(prompt('Multiply all times by (e.g. 1.001 for 23.976 to 24 fps):', '1.001'));
+                if (isNaN(factor) || factor <= 0) return;
+                request.factor = factor;
+            } else if (request.operation === 'fix_overlaps') {
+                request.min_gap_ms = 40;
+            } else if (request.operation === 'resegment') {
+                const maxChars = parseInt(prompt('Split subtitles longer than how many characters?', '35'));
+                if (isNaN(maxChars) || maxChars < 10) return;
+                request.max_chars = maxChars;
+            }
             
-            // Send subtitles data to server
-            fetch('/save_subtitles', {
+            // Pending edits must reach the server before it retimes the list
+            saveChanges(false)
+            .then(() => fetch('/retime_subtitles', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify(subtitles)
+                body: JSON.stringify(request)
+            }))
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    updateSubtitleTable(data.subtitles);
+                    scheduleOverlayRefresh();
+                    showAlert('Subtitle timing updated', 'success');
+                } else {
+                    showAlert('Error updating timing: ' + data.error, 'danger');
+                }
+            })
+            .catch(error => {
+                showAlert('Error updating timing: ' + error, 'danger');
+            });
+        });
+    });
+    
+    // Import a subtitle file, replacing the cue list
+    const importButton = document.getElementById('importSubtitlesBtn');
+    const importInput = document.getElementById('importSubtitlesFile');
+    if (importButton && importInput) {
+        importButton.addEventListener('click', function(e) {
+            e.preventDefault();
+            importInput.click();
+        });
+        
+        importInput.addEventListener('change', function() {
+            const file = this.files[0];
+            this.value = '';
+            if (!file || !confirm(`Replace all subtitles with the cues in ${file.name}?`)) return;
+            
+            const formData = new FormData();
+            formData.append('subtitles_file', file);
+            
+            // Edits not saved yet are replaced too; a save already sent has
+            // to land before the import so it cannot patch the new cues
+            clearTimeout(autosaveTimer);
+            dirtyCues.clear();
+            (saveInFlight || Promise.resolve())
+            .then(() => fetch('/import_subtitles', {
+                method: 'POST',
+                body: formData
+            }))
+            .then(response => response.json())
+            .then(data => {
+                if (data.success) {
+                    updateSubtitleTable(data.subtitles);
+                    scheduleOverlayRefresh();
+                    showAlert(`Imported ${data.subtitles.length} subtitles`, 'success');
+                } else {
+                    showAlert('Error importing subtitles: ' + data.error, 'danger');
+                }
             })
+            .catch(error => {
+                showAlert('Error importing subtitles: ' + error, 'danger');
+            });
+        });
+    }
+    
+    // Downloads are generated from the server's cue list, so pending edits go first
+    document.querySelectorAll('.export-btn').forEach(link => {
+        link.addEventListener('click', function(e) {
+            e.preventDefault();
+            saveChanges(false).then(() => {
+                window.location.href = this.href;
+            });
+        });
+    });
+    
+    // Flush pending edits before the video is generated
+    const optionsForm = document.getElementById('subtitleOptionsForm');
+    if (optionsForm) {
+        optionsForm.addEventListener('submit', function(e) {
+            if (!dirtyCues.size && !saveInFlight) return;
+            
+            e.preventDefault();
+            saveChanges(false).then(() => optionsForm.submit());
+        });
+    }
+    
+    // Live subtitle overlay on the source video: the WebVTT track and the
+    // ::cue stylesheet are regenerated from the cue list and current options
+    const sourceVideo = document.getElementById('sourceVideo');
+    const cueStylesheet = document.getElementById('cueStylesheet');
+    let overlayTimer = null;
+    
+    const refreshOverlay = () => {
+        if (!sourceVideo || !optionsForm) return;
+        
+        const params = new URLSearchParams(new FormData(optionsForm));
+        params.set('v', Date.now());
+        
+        if (cueStylesheet) {
+            cueStylesheet.href = `${sourceVideo.dataset.cssUrl}?${params}`;
+        }
+        
+        // Replace the track element; changing src on an existing track is not reloaded by all browsers
+        const oldTrack = sourceVideo.querySelector('track');
+        const track = document.createElement('track');
+        track.kind = 'subtitles';
+        track.label = 'Subtitles';
+        track.default = true;
+        track.src = `${sourceVideo.dataset.vttUrl}?${params}`;
+        if (oldTrack) oldTrack.remove();
+        sourceVideo.appendChild(track);
+        track.addEventListener('load', () => { track.track.mode = 'showing'; });
+        track.track.mode = 'showing';
+    };
+    
+    const scheduleOverlayRefresh = () => {
+        clearTimeout(overlayTimer);
+        overlayTimer = setTimeout(refreshOverlay, 400);
+    };
+    
+    if (sourceVideo && optionsForm) {
+        optionsForm.addEventListener('change', scheduleOverlayRefresh);
+        optionsForm.addEventListener('input', scheduleOverlayRefresh);
+        refreshOverlay();
+        
+        // Rows are replaced after a translation
+        if (subtitleTable) {
+            new MutationObserver(scheduleOverlayRefresh).observe(subtitleTable.querySelector('tbody'), { childList: true });
+        }
+    }
+    
+    // Render a short clip around the selected subtitle with the current style
+    const previewClipBtn = document.getElementById('previewClipBtn');
+    const clipPreview = document.getElementById('clipPreview');
+    let selectedRow = null;
+    
+    if (subtitleTable) {
+        subtitleTable.addEventListener('focusin', function(e) {
+            selectedRow = e.target.closest('tr[data-index]') || selectedRow;
+        });
+    }
+    
+    if (previewClipBtn && clipPreview && optionsForm) {
+        previewClipBtn.addEventListener('click', function() {
+            const row = selectedRow || document.querySelector('#subtitlesTable tbody tr');
+            if (!row) {
+                showAlert('No subtitles found to preview', 'warning');
+                return;
+            }
+            
+            // Include a second of context around the cue
+            const start = Math.max(0, parseTimeCode(row.querySelector('.start-time').value) - 1);
+            const end = parseTimeCode(row.querySelector('.end-time').value) + 1;
+            
+            const formData = new FormData(optionsForm);
+            formData.append('start', start.toFixed(3));
+            formData.append('end', end.toFixed(3));
+            
+            previewClipBtn.disabled = true;
+            
+            // Make sure the clip shows the latest edits
+            saveChanges(false)
+            .then(() => fetch('/preview_clip', {
+                method: 'POST',
+                body: formData
+            }))
             .then(response => response.json())
             .then(data => {
                 if (data.success) {
-                    showAlert('Subtitles saved successfully!', 'success');
+                    clipPreview.src = data.url;
+                    clipPreview.classList.remove('d-none');
+                    clipPreview.play().catch(() => {});
                 } else {
-                    showAlert('Error saving subtitles: ' + data.error, 'danger');
+                    showAlert('Error rendering preview: ' + data.error, 'danger');
                 }
             })
             .catch(error => {
                 showAlert('Error: ' + error, 'danger');
+            })
+            .finally(() => {
+                previewClipBtn.disabled = false;
             });
         });
     }
@@ -771,6 +1186,120 @@ function initSubtitleEditor() {
     }
 }
 
+/**
+ * Poll a background job and follow its result once it finishes
+ */
+function initJobProgress(statusUrl, resultUrl) {
+    const progressBar = document.getElementById('jobProgress');
+    const messageEl = document.getElementById('jobMessage');
+    const stageItems = document.querySelectorAll('#jobStages [data-stage]');
+    
+    function updateStages(job) {
+        const currentIndex = job.stages.indexOf(job.stage);
+        stageItems.forEach((item, i) => {
+            const icon = item.querySelector('i');
+            if (!icon) return;
+            if (job.status === 'completed' || (currentIndex >= 0 && i < currentIndex)) {
+                icon.className = 'fas fa-check-circle text-success me-2';
+            } else if (i === currentIndex) {
+                icon.className = 'fas fa-spinner fa-spin text-primary me-2';
+            } else {
+                icon.className = 'far fa-circle me-2';
+            }
+        });
+    }
+    
+    function poll() {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                showAlert('Error: ' + data.error, 'danger');
+                return;
+            }
+            
+            const job = data.job;
+            if (progressBar) {
+                progressBar.style.width = job.progress + '%';
+                progressBar.textContent = job.progress + '%';
+            }
+            if (messageEl && job.message) {
+                messageEl.textContent = job.message;
+            }
+            updateStages(job);
+            
+            // Progressive renders can be watched once the first segments exist
+            const previewLink = document.getElementById('jobPreviewLink');
+            if (previewLink && job.details && job.details.playlist) {
+                previewLink.classList.remove('d-none');
+            }
+            
+            if (job.status === 'completed' || job.status === 'failed') {
+                // The result endpoint stores the output and redirects to the next page
+                window.location.href = resultUrl;
+                return;
+            }
+            
+            setTimeout(poll, 1500);
+        })
+        .catch(error => {
+            console.error('Error polling job status:', error);
+            setTimeout(poll, 5000);
+        });
+    }
+    
+    poll();
+}
+
+/**
+ * Play the HLS playlist of a render in progress and follow the render job
+ *
+ * Safari plays HLS natively; other browsers use hls.js. The playlist grows
+ * while the render runs, so playback starts at the beginning rather than at
+ * the newest segment. When the job finishes, a button leads to the final
+ * MP4 and its download.
+ */
+function initStreamPreview(video, playlistUrl, statusUrl) {
+    if (!video) return;
+    
+    if (video.canPlayType('application/vnd.apple.mpegurl')) {
+        video.src = playlistUrl;
+    } else if (window.Hls && Hls.isSupported()) {
+        const hls = new Hls({startPosition: 0});
+        hls.loadSource(playlistUrl);
+        hls.attachMedia(video);
+    } else {
+        showAlert('This browser cannot play the video while it renders. It will be available when rendering is complete.', 'warning');
+    }
+    
+    function poll() {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) return;
+            
+            const job = data.job;
+            if (job.status === 'completed' || job.status === 'failed') {
+                const notice = document.getElementById('streamNotice');
+                if (notice) {
+                    notice.innerHTML = job.status === 'completed'
+                        ? '<i class="fas fa-check-circle me-2"></i>Rendering is complete.'
+                        : '<i class="fas fa-exclamation-triangle me-2"></i>Rendering failed. Go back to the editor to try again.';
+                }
+                const download = document.getElementById('streamDownload');
+                if (download && job.status === 'completed') {
+                    download.classList.remove('d-none');
+                }
+                return;
+            }
+            setTimeout(poll, 3000);
+        })
+        .catch(() => setTimeout(poll, 5000));
+    }
+    
+    poll();
+}
+
 /**
  * Update subtitle table with new subtitle data
  */
@@ -811,6 +1340,16 @@ function updateSubtitleTable(subtitles) {
     });
 }
 
+/**
+ * Helper function to convert an SRT time code (HH:MM:SS,mmm) to seconds
+ */
+function parseTimeCode(timeCode) {
+    const parts = (timeCode || '').trim().replace(',', ':').split(':').map(Number);
+    if (parts.length !== 4 || parts.some(isNaN)) return 0;
+    
+    return parts[0] * 3600 + parts[1] * 60 + parts[2] + parts[3] / 1000;
+}
+
 /**
  * Helper function to format file size in human-readable format
  */
@@ -0,0 +1,68 @@
+import io
+import os
+import json
+import uuid
+import shutil
+import pytest
+
+import app as app_module
+from utils.chunked_upload import ChunkedUpload
+
+CONTENT = os.urandom(1000)
+CHUNK_SIZE = 400
+
+
+@pytest.fixture
+def upload_client():
+    session_id = str(uuid.uuid4())
+    session_folder = os.path.join(app_module.UPLOAD_FOLDER, session_id)
+    os.makedirs(session_folder)
+    upload = ChunkedUpload.create(session_folder, 'video.mp4', len(CONTENT), chunk_size=CHUNK_SIZE)
+
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as flask_session:
+            flask_session['session_id'] = session_id
+        yield client, upload
+
+    app_module.session_store.delete(session_id)
+    shutil.rmtree(session_folder, ignore_errors=True)
+
+
+def put_chunk(client, upload, index):
+    offset, length = upload.chunk_range(index)
+    return client.put(f'/uploads/{upload.upload_id}/chunks/{index}', data=CONTENT[offset:offset + length])
+
+
+def test_duplicate_chunk_after_finalize(upload_client):
+    client, upload = upload_client
+    for index in range(upload.chunk_count):
+        upload.write_chunk(index, io.BytesIO(CONTENT[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]))
+    upload.finalize()
+
+    response = put_chunk(client, upload, 1)
+    assert response.status_code == 200
+    assert json.loads(response.data)['complete'] is True
+
+
+def test_duplicate_chunk_racing_finalize(upload_client, monkeypatch):
+    """A retried chunk that passed the finalized check while another request finalized"""
+    client, upload = upload_client
+    for index in range(upload.chunk_count):
+        upload.write_chunk(index, io.BytesIO(CONTENT[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]))
+
+    write_chunk = ChunkedUpload.write_chunk
+
+    def finalize_first(self, *args, **kwargs):
+        # The other request moves the .part file into place first
+        ChunkedUpload.open(self.folder, self.upload_id).finalize()
+        return write_chunk(self, *args, **kwargs)
+
+    monkeypatch.setattr(ChunkedUpload, 'write_chunk', finalize_first)
+
+    response = put_chunk(client, upload, 1)
+    assert response.status_code == 200
+    assert json.loads(response.data) == {'success': True, 'complete': True, 'redirect': None}
+
+    with open(upload.video_path, 'rb') as f:
+        assert f.read() == CONTENT
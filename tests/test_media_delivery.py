@@ -0,0 +1,113 @@
+import re
+import pytest
+from flask import Flask
+
+from utils import media_delivery
+from utils.media_delivery import parse_ranges, send_media
+
+CONTENT = bytes(range(256)) * 40  # 10240 bytes
+
+
+@pytest.fixture
+def client(tmp_path):
+    (tmp_path / 'session').mkdir()
+    (tmp_path / 'session' / 'video.mp4').write_bytes(CONTENT)
+
+    app = Flask(__name__)
+
+    @app.route('/media/<path:filename>')
+    def media(filename):
+        return send_media(str(tmp_path), filename)
+
+    return app.test_client()
+
+
+def test_parse_ranges():
+    assert parse_ranges(None, 100) is None
+    assert parse_ranges('bytes=0-9', 100) == [(0, 10)]
+    assert parse_ranges('bytes=90-', 100) == [(90, 100)]
+    assert parse_ranges('bytes=-10', 100) == [(90, 100)]
+    assert parse_ranges('bytes=95-200', 100) == [(95, 100)]
+    assert parse_ranges('bytes=0-0, 50-59', 100) == [(0, 1), (50, 60)]
+    assert parse_ranges('bytes=100-', 100) == []
+    assert parse_ranges('bytes=9-0', 100) is None
+    assert parse_ranges('items=0-9', 100) is None
+
+
+def test_whole_file(client):
+    response = client.get('/media/session/video.mp4')
+    assert response.status_code == 200
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.data == CONTENT
+
+
+def test_single_range(client):
+    response = client.get('/media/session/video.mp4', headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 100-199/{len(CONTENT)}"
+    assert response.headers['Content-Length'] == '100'
+    assert response.data == CONTENT[100:200]
+
+    # Open-ended ranges, as sent by video players when seeking
+    response = client.get('/media/session/video.mp4', headers={'Range': 'bytes=10000-'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == f"bytes 10000-{len(CONTENT) - 1}/{len(CONTENT)}"
+    assert response.data == CONTENT[10000:]
+
+
+def test_multiple_ranges(client):
+    response = client.get('/media/session/video.mp4', headers={'Range': 'bytes=0-9, 500-509, -5'})
+    assert response.status_code == 206
+    assert response.mimetype == 'multipart/byteranges'
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+    boundary = response.mimetype_params['boundary']
+    parts = response.data.split(f"--{boundary}".encode())
+    assert parts[0] == b'' and parts[-1] == b'--\r\n'
+
+    found = []
+    for part in parts[1:-1]:
+        headers, _, body = part.strip(b'\r\n').partition(b'\r\n\r\n')
+        match = re.search(rb'Content-Range: bytes (\d+)-(\d+)/(\d+)', headers)
+        start, end = int(match.group(1)), int(match.group(2)) + 1
+        assert body == CONTENT[start:end]
+        found.append((start, end))
+    assert found == [(0, 10), (500, 510), (len(CONTENT) - 5, len(CONTENT))]
+
+
+def test_unsatisfiable_range(client):
+    response = client.get('/media/session/video.mp4', headers={'Range': f"bytes={len(CONTENT)}-"})
+    assert response.status_code == 416
+    assert response.headers['Content-Range'] == f"bytes */{len(CONTENT)}"
+
+
+def test_if_range_mismatch_sends_whole_file(client):
+    response = client.get('/media/session/video.mp4',
+                          headers={'Range': 'bytes=0-9', 'If-Range': '"stale"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_missing_file_and_path_escape(client):
+    assert client.get('/media/session/missing.mp4').status_code == 404
+    assert client.get('/media/../secret.txt').status_code == 404
+
+
+def test_nginx_offload(client, monkeypatch):
+    monkeypatch.setattr(media_delivery, 'OFFLOAD', 'nginx')
+    monkeypatch.setattr(media_delivery, 'ACCEL_PREFIX', '/protected-media/')
+
+    response = client.get('/media/session/video.mp4', headers={'Range': 'bytes=0-9'})
+    assert response.status_code == 200
+    assert response.headers['X-Accel-Redirect'] == '/protected-media/session/video.mp4'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.data == b''
+
+
+def test_sendfile_offload(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(media_delivery, 'OFFLOAD', 'sendfile')
+
+    response = client.get('/media/session/video.mp4')
+    assert response.headers['X-Sendfile'] == str(tmp_path / 'session' / 'video.mp4')
+    assert 'X-Accel-Redirect' not in response.headers
+    assert response.data == b''
@@ -0,0 +1,72 @@
+import random
+import sqlite3
+
+from utils.session_store import SessionStore
+
+
+def make_cues(count):
+    return [{'index': i, 'start': '00:00:00,000', 'end': '00:00:01,000', 'text': f'cue {i}'}
+            for i in range(1, count + 1)]
+
+
+def test_appends_do_not_load_the_list(tmp_path, monkeypatch):
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'))
+    store.set_subtitles('s', make_cues(3))
+
+    loads = []
+    load = store._load
+    monkeypatch.setattr(store, '_load', lambda *args: loads.append(1) or load(*args))
+
+    for _ in range(5):
+        store.patch_subtitles('s', inserted=[{'text': 'new'}])
+    assert loads == []
+
+    monkeypatch.setattr(store, '_load', load)
+    assert [cue['index'] for cue in store.get_subtitles('s')] == [1, 2, 3, 4, 5, 6, 7, 8]
+
+
+def test_last_cue_follows_random_edits(tmp_path):
+    """Appends land after the real last cue, whatever edits came before"""
+    rng = random.Random(7)
+    store = SessionStore(str(tmp_path / 'sessions.sqlite3'))
+    expected = make_cues(4)
+    store.set_subtitles('s', expected)
+    expected = [cue['index'] for cue in expected]
+
+    for _ in range(300):
+        action = rng.random()
+        if action < 0.4:
+            assigned = store.patch_subtitles('s', inserted=[{'text': 'end'}] * rng.randint(1, 2))['inserted']
+            expected.extend(assigned)
+        elif action < 0.6 and expected:
+            after = rng.choice(expected + [None, 9999])
+            index = store.patch_subtitles('s', inserted=[{'text': 'mid', 'after': after}])['inserted'][0]
+            if after is None:
+                expected.insert(0, index)
+            elif after in expected:
+                expected.insert(expected.index(after) + 1, index)
+            else:
+                # Unknown cues append at the end
+                expected.append(index)
+        elif expected:
+            index = expected[-1] if rng.random() < 0.5 else rng.choice(expected)
+            store.patch_subtitles('s', deleted=[index])
+            expected.remove(index)
+
+        if rng.random() < 0.05:
+            store.compact('s')
+
+    assert [cue['index'] for cue in store.get_subtitles('s')] == expected
+
+
+def test_old_store_gains_the_column(tmp_path):
+    path = str(tmp_path / 'sessions.sqlite3')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE subtitles (session_id TEXT PRIMARY KEY, data TEXT NOT NULL, '
+                     'revision INTEGER NOT NULL DEFAULT 0, next_index INTEGER NOT NULL DEFAULT 1, '
+                     'updated_at REAL NOT NULL)')
+        conn.execute("INSERT INTO subtitles VALUES ('s', '[{\"index\": 1, \"text\": \"a\"}]', 1, 2, 0)")
+
+    store = SessionStore(path)
+    assert store.patch_subtitles('s', inserted=[{'text': 'b'}])['inserted'] == [2]
+    assert [cue['text'] for cue in store.get_subtitles('s')] == ['a', 'b']
@@ -0,0 +1,56 @@
+import os
+import uuid
+import shutil
+import pytest
+
+import app as app_module
+from utils.subtitle_formats import FORMATS, parse_timestamp, read_subtitles
+
+SUBTITLES = [
+    {'index': 1, 'start': '00:00:01,000', 'end': '00:00:02,500', 'text': 'Hello there'},
+    {'index': 2, 'start': '00:00:03,000', 'end': '00:00:04,000', 'text': 'x < y & z &amp; w'}
+]
+
+
+@pytest.fixture
+def client():
+    session_id = str(uuid.uuid4())
+    session_folder = os.path.join(app_module.UPLOAD_FOLDER, session_id)
+    os.makedirs(session_folder)
+    app_module.session_store.update(session_id, subtitles_path=os.path.join(session_folder, 'subtitles.srt'))
+    app_module.session_store.set_subtitles(session_id, SUBTITLES)
+
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        with client.session_transaction() as flask_session:
+            flask_session['session_id'] = session_id
+        yield client, session_folder
+
+    app_module.session_store.delete(session_id)
+    shutil.rmtree(session_folder, ignore_errors=True)
+
+
+@pytest.mark.parametrize('fmt', sorted(FORMATS))
+def test_download_every_format(client, fmt):
+    client, session_folder = client
+    response = client.get(f'/download_subtitles?format={fmt}')
+
+    assert response.status_code == 200
+    extension, mimetype = FORMATS[fmt]
+    assert response.mimetype == mimetype
+    assert f'subtitles{extension}' in response.headers['Content-Disposition']
+
+    path = os.path.join(session_folder, f'downloaded{extension}')
+    with open(path, 'wb') as f:
+        f.write(response.data)
+    cues = list(read_subtitles(path, fmt))
+
+    assert [cue['text'] for cue in cues] == [cue['text'] for cue in SUBTITLES]
+    # ASS keeps centiseconds, which these times are exact in
+    assert [parse_timestamp(cue['start']) for cue in cues] == [parse_timestamp(cue['start']) for cue in SUBTITLES]
+
+
+def test_download_unknown_format(client):
+    client, _ = client
+    response = client.get('/download_subtitles?format=docx')
+    assert response.status_code == 302
@@ -0,0 +1,105 @@
+import json
+import sqlite3
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import pytest
+
+from utils.translation import GoogleTranslateProvider, translate_texts
+from utils.translation_cache import TranslationCache
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers like the Google endpoint, translating by upper-casing each line
+
+    Batches containing a text listed in server.merge_texts come back with
+    that text joined to the next line, as real providers sometimes do.
+    """
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8')
+        text = parse_qs(body)['q'][0]
+        lines = text.split('\n')
+        self.server.requests.append(lines)
+
+        translated = [line.upper() for line in lines]
+        for merge_text in self.server.merge_texts:
+            if len(lines) > 1 and merge_text in lines[:-1]:
+                i = lines.index(merge_text)
+                translated[i:i + 2] = [f"{translated[i]} {translated[i + 1]}"]
+
+        payload = json.dumps([[['\n'.join(translated), text, None, None]], None, 'en'])
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(payload.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    server.requests = []
+    server.merge_texts = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def provider(server):
+    return GoogleTranslateProvider(base_url=f"http://127.0.0.1:{server.server_port}/translate",
+                                   max_retries=0)
+
+
+def test_batches_keep_order_and_empty_texts(server, provider):
+    texts = ['one', '', 'two\nlines', 'three', 'one']
+    result = translate_texts(texts, 'en', 'pt', provider=provider, cache=False, max_size=2)
+
+    assert result == ['ONE', '', 'TWO LINES', 'THREE', 'ONE']
+    # Duplicates are sent once, in batches of at most two texts
+    assert sorted(text for lines in server.requests for text in lines) == ['one', 'three', 'two lines']
+    assert all(len(lines) <= 2 for lines in server.requests)
+
+
+def test_mismatched_batch_is_halved(server, provider):
+    server.merge_texts = {'a'}
+    texts = ['a', 'b', 'c', 'd']
+    result = translate_texts(texts, 'en', 'pt', provider=provider, cache=False)
+
+    assert result == ['A', 'B', 'C', 'D']
+    # The whole batch, then its halves; 'a' stays merged until it is sent alone
+    assert server.requests == [['a', 'b', 'c', 'd'], ['a', 'b'], ['a'], ['b'], ['c', 'd']]
+
+
+def test_cache_hits_skip_the_provider(server, provider, tmp_path):
+    cache = TranslationCache(str(tmp_path / 'translations.sqlite3'))
+    cache.put_many({'cached line': 'LINHA GUARDADA'}, 'en', 'pt')
+
+    result = translate_texts(['cached line', 'new line'], 'en', 'pt', provider=provider, cache=cache)
+    assert result == ['LINHA GUARDADA', 'NEW LINE']
+    assert server.requests == [['new line']]
+
+    # The miss was stored, so a second run sends nothing
+    server.requests.clear()
+    assert translate_texts(['new line', 'cached line'], 'en', 'pt', provider=provider,
+                           cache=cache) == ['NEW LINE', 'LINHA GUARDADA']
+    assert server.requests == []
+
+
+def test_unreadable_cache_falls_back_to_the_provider(server, provider):
+    class BrokenCache:
+        def get_many(self, texts, source, target):
+            raise sqlite3.OperationalError('database is locked')
+
+        def put_many(self, translations, source, target):
+            raise sqlite3.OperationalError('database is locked')
+
+    result = translate_texts(['one', 'two'], 'en', 'pt', provider=provider, cache=BrokenCache())
+    assert result == ['ONE', 'TWO']
+    assert server.requests == [['one', 'two']]
@@ -0,0 +1,224 @@
+import re
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FONT = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+
+# Named colors offered by the edit page, as ASS BBGGRR
+ASS_COLORS = {
+    'white': 'FFFFFF',
+    'black': '000000',
+    'yellow': '00FFFF',
+    'lime': '00FF00',
+    'cyan': 'FFFF00',
+    'magenta': 'FF00FF',
+    'red': '0000FF',
+    'orange': '0080FF',
+    'aliceblue': 'FFF8F0',
+    'pink': 'C0C0FF',
+    'navy': '800000',
+    'darkred': '000080',
+    'darkgreen': '008000',
+    'purple': '800080',
+    'gray': '808080',
+    'brown': '2A2AA5'
+}
+
+# Numpad alignment of each position preset (2 = bottom center)
+ALIGNMENTS = {
+    'bottom': 2,
+    'top': 8,
+    'center': 5
+}
+
+STYLE_FORMAT = (
+    'Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, '
+    'Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, '
+    'Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding'
+)
+EVENT_FORMAT = 'Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text'
+
+
+def ass_color(color, default='FFFFFF', alpha='00'):
+    """
+    Convert a color name or #RRGGBB code to an ASS color (&HAABBGGRR)
+
+    Args:
+        color (str): Color name from ASS_COLORS or a #RRGGBB hex code
+        default (str): BBGGRR used for unknown colors
+        alpha (str): Alpha byte in hex (00 is opaque, FF fully transparent)
+
+    Returns:
+        str: ASS color
+    """
+    color = (color or '').strip().lower()
+    if re.fullmatch(r'#[0-9a-f]{6}', color):
+        bgr = color[5:7] + color[3:5] + color[1:3]
+    else:
+        bgr = ASS_COLORS.get(color, default)
+    return f"&H{alpha}{bgr.upper()}"
+
+
+def ass_time(value):
+    """
+    Format a time for ASS events (H:MM:SS.cc)
+
+    Args:
+        value (float or str): Seconds, or an SRT time code (HH:MM:SS,mmm)
+
+    Returns:
+        str: ASS time
+    """
+    if isinstance(value, str):
+        hours, minutes, rest = value.strip().replace(',', '.').split(':')
+        value = int(hours) * 3600 + int(minutes) * 60 + float(rest)
+
+    centiseconds = max(0, int(round(value * 100)))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    seconds, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{seconds:02d}.{centiseconds:02d}"
+
+
+def ass_text(text):
+    """Make cue text safe for an ASS event (single line, no override blocks)"""
+    text = (text or '').replace('\r', '').replace('\n', ' ')
+    # Braces start override blocks and backslashes start escapes in ASS
+    return text.replace('\\', '＼').replace('{', '(').replace('}', ')')
+
+
+def normalize_style(font_size=24, font_color='white', bg_color='black', position='bottom',
+                    custom_position=False, custom_pos_x=50, custom_pos_y=90, subtitle_width=80,
+                    font=DEFAULT_FONT):
+    """
+    Fill in defaults for the style options accepted by embed_subtitles
+
+    Returns:
+        tuple: Sorted (name, value) pairs, usable as a cache key
+    """
+    return tuple(sorted({
+        'font_size': int(font_size),
+        'font_color': str(font_color),
+        'bg_color': str(bg_color),
+        'position': str(position).lower(),
+        'custom_position': bool(custom_position),
+        'custom_pos_x': int(custom_pos_x),
+        'custom_pos_y': int(custom_pos_y),
+        'subtitle_width': int(subtitle_width),
+        'font': font
+    }.items()))
+
+
+@lru_cache(maxsize=64)
+def _build_header(style_key):
+    """Build the script header and per-event prefix for a normalized style"""
+    style = dict(style_key)
+    font_size = style['font_size']
+
+    # Small fonts are laid out on a larger canvas, so they stay sharp
+    if font_size <= 20:
+        play_res_x, play_res_y = 1920, 1080
+    else:
+        play_res_x, play_res_y = 1280, 720
+
+    # BorderStyle 4 draws an opaque box behind the text, 1 an outline only
+    if style['bg_color'].lower() == 'transparent':
+        border_style, outline = 1, 2
+        back_color = '&HFF000000'
+    else:
+        border_style, outline = 4, 1
+        back_color = ass_color(style['bg_color'], default='000000')
+
+    # Subtitle width is a percentage of the frame, split evenly between both sides
+    margin = int(play_res_x * (100 - style['subtitle_width']) / 200)
+
+    prefix = ''
+    if style['custom_position'] and style['position'] == 'custom':
+        # Top center of the text at the dragged position
+        x = min(100, style['custom_pos_x'] + style['subtitle_width'] / 2) * play_res_x / 100
+        y = style['custom_pos_y'] * play_res_y / 100
+        prefix = f"{{\\an8\\pos({int(x)},{int(y)})}}"
+        alignment = 8
+    else:
+        alignment = ALIGNMENTS.get(style['position'], ALIGNMENTS['bottom'])
+
+    style_line = ','.join(str(value) for value in [
+        'Default', 'DejaVu Sans', font_size,
+        ass_color(style['font_color']), ass_color(style['font_color']), '&H00000000', back_color,
+        -1, 0, 0, 0, 100, 100, 0, 0, border_style,
+        outline, 0, alignment, margin, margin, 35, 1
+    ])
+
+    header = (
+        "[Script Info]\n"
+        "ScriptType: v4.00+\n"
+        f"PlayResX: {play_res_x}\n"
+        f"PlayResY: {play_res_y}\n"
+        # 2 = no word wrapping, so every cue stays on one line
+        "WrapStyle: 2\n"
+        "ScaledBorderAndShadow: yes\n"
+        "\n"
+        "[V4+ Styles]\n"
+        f"Format: {STYLE_FORMAT}\n"
+        f"Style: {style_line}\n"
+        "\n"
+        "[Events]\n"
+        f"Format: {EVENT_FORMAT}\n"
+    )
+    return header, prefix
+
+
+def style_header(**style):
+    """
+    Return the ASS header for a set of style options (cached per style)
+
+    Args:
+        **style: Style options accepted by embed_subtitles
+
+    Returns:
+        tuple: (header text, prefix added to every event's text)
+    """
+    return _build_header(normalize_style(**style))
+
+
+def stream_ass(subtitles, f, **style):
+    """
+    Write an ASS script to an open text file, one event at a time
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start' and 'end' (seconds or
+            SRT time codes) and 'text'; a generator is consumed lazily
+        f: Text file object
+        **style: Style options accepted by embed_subtitles
+
+    Returns:
+        int: Number of events written
+    """
+    header, prefix = style_header(**style)
+    f.write(header)
+
+    count = 0
+    for subtitle in subtitles:
+        f.write(f"Dialogue: 0,{ass_time(subtitle['start'])},{ass_time(subtitle['end'])},"
+                f"Default,,0,0,0,,{prefix}{ass_text(subtitle.get('text'))}\n")
+        count += 1
+    return count
+
+
+def write_ass(subtitles, output_path, **style):
+    """
+    Write cues to an ASS file styled with the embed_subtitles options
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start' and 'end' (seconds or
+            SRT time codes) and 'text'
+        output_path (str): Path of the ASS file
+        **style: Style options accepted by embed_subtitles
+
+    Returns:
+        int: Number of events written
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        return stream_ass(subtitles, f, **style)
@@ -0,0 +1,261 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Size of each numbered chunk; the last one may be shorter
+CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_MB', '8')) * 1024 * 1024
+
+# Bytes read from a chunk request at a time
+READ_SIZE = 1024 * 1024
+
+
+class ChunkedUpload:
+    """
+    Resumable upload written chunk by chunk into a preallocated file
+
+    Chunks may arrive in any order and over several connections, even in
+    different worker processes: each one is written at its offset with
+    os.pwrite, then marked in a one-byte-per-chunk bitmap file, so no lock
+    is needed. The request that completes the bitmap claims finalization
+    with an exclusive marker file, verifies the checksum and moves the file
+    into place.
+
+    Files kept in the session folder, next to the final video:
+        upload-<id>.json    filename, size, chunk size and checksum
+        upload-<id>.chunks  received bitmap
+        upload-<id>.part    the preallocated video
+        upload-<id>.done    finalization marker
+    """
+
+    def __init__(self, folder, upload_id, meta):
+        self.folder = folder
+        self.upload_id = upload_id
+        self.filename = meta['filename']
+        self.size = meta['size']
+        self.chunk_size = meta['chunk_size']
+        self.sha256 = meta.get('sha256')
+
+    def _path(self, suffix):
+        return os.path.join(self.folder, f"upload-{self.upload_id}.{suffix}")
+
+    @property
+    def video_path(self):
+        return os.path.join(self.folder, self.filename)
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    @classmethod
+    def create(cls, folder, filename, size, chunk_size=CHUNK_SIZE, sha256=None):
+        """
+        Start an upload and preallocate its file
+
+        Args:
+            folder (str): Session folder
+            filename (str): Sanitized name of the final video file
+            size (int): Total size in bytes
+            chunk_size (int): Size of each chunk in bytes
+            sha256 (str): Expected SHA-256 of the whole file, if known
+
+        Returns:
+            ChunkedUpload: The new upload
+        """
+        if size <= 0:
+            raise ValueError("Upload size must be positive")
+
+        meta = {
+            'filename': filename,
+            'size': int(size),
+            'chunk_size': int(chunk_size),
+            'sha256': sha256.lower() if sha256 else None
+        }
+        upload = cls(folder, uuid.uuid4().hex, meta)
+
+        fd = os.open(upload._path('part'), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            # Reserve the blocks up front where supported, so a full disk
+            # fails here rather than halfway through the upload
+            if hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(fd, 0, upload.size)
+                except OSError:
+                    os.ftruncate(fd, upload.size)
+            else:
+                os.ftruncate(fd, upload.size)
+        finally:
+            os.close(fd)
+
+        with open(upload._path('chunks'), 'wb') as f:
+            f.write(bytes(upload.chunk_count))
+        with open(upload._path('json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+        logger.info(f"Started upload {upload.upload_id}: {filename}, {size} bytes in {upload.chunk_count} chunks")
+        return upload
+
+    @classmethod
+    def open(cls, folder, upload_id):
+        """
+        Load an upload started earlier
+
+        Args:
+            folder (str): Session folder
+            upload_id (str): Upload ID returned by create
+
+        Returns:
+            ChunkedUpload or None: The upload, or None if it does not exist
+        """
+        if not upload_id or not upload_id.isalnum():
+            return None
+        try:
+            with open(os.path.join(folder, f"upload-{upload_id}.json"), 'r', encoding='utf-8') as f:
+                return cls(folder, upload_id, json.load(f))
+        except (FileNotFoundError, ValueError, KeyError):
+            return None
+
+    def chunk_range(self, index):
+        """
+        Return the byte range of a chunk
+
+        Args:
+            index (int): Chunk number, starting at 0
+
+        Returns:
+            tuple: (offset, length)
+        """
+        if not 0 <= index < self.chunk_count:
+            raise ValueError(f"Chunk {index} is out of range (0-{self.chunk_count - 1})")
+        offset = index * self.chunk_size
+        return offset, min(self.chunk_size, self.size - offset)
+
+    def received_chunks(self):
+        """Return one flag per chunk, True for chunks written completely"""
+        with open(self._path('chunks'), 'rb') as f:
+            return [bool(flag) for flag in f.read()]
+
+    def missing_chunks(self):
+        """Return the numbers of the chunks still to be sent"""
+        return [index for index, received in enumerate(self.received_chunks()) if not received]
+
+    def received_ranges(self):
+        """
+        Return the received bytes as merged [start, end) ranges
+
+        Returns:
+            list: [start, end] pairs in increasing order
+        """
+        ranges = []
+        for index, received in enumerate(self.received_chunks()):
+            if not received:
+                continue
+            start, length = self.chunk_range(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = start + length
+            else:
+                ranges.append([start, start + length])
+        return ranges
+
+    @property
+    def is_finalized(self):
+        return os.path.exists(self._path('done'))
+
+    def write_chunk(self, index, stream, checksum=None):
+        """
+        Write one chunk at its offset and mark it as received
+
+        Args:
+            index (int): Chunk number
+            stream: File-like object holding exactly the chunk's bytes
+            checksum (str): Expected SHA-256 of the chunk, if sent by the client
+
+        Returns:
+            bool: True if every chunk has now been received
+        """
+        offset, length = self.chunk_range(index)
+        digest = hashlib.sha256()
+        written = 0
+
+        fd = os.open(self._path('part'), os.O_WRONLY)
+        try:
+            for data in iter(lambda: stream.read(READ_SIZE), b''):
+                if written + len(data) > length:
+                    raise ValueError(f"Chunk {index} is larger than {length} bytes")
+                view = memoryview(data)
+                while view:
+                    count = os.pwrite(fd, view, offset + written)
+                    view = view[count:]
+                    written += count
+                digest.update(data)
+        finally:
+            os.close(fd)
+
+        if written != length:
+            raise ValueError(f"Chunk {index} has {written} bytes, expected {length}")
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise ValueError(f"Checksum mismatch in chunk {index}")
+
+        # Mark the chunk only once its bytes are in place
+        fd = os.open(self._path('chunks'), os.O_WRONLY)
+        try:
+            os.pwrite(fd, b'\x01', index)
+        finally:
+            os.close(fd)
+
+        return all(self.received_chunks())
+
+    def finalize(self):
+        """
+        Verify the completed file and move it into place
+
+        Safe to call from several requests at once: only the first caller
+        finalizes, the others get None.
+
+        Returns:
+            str or None: Path of the video, or None if another request finalized it
+        """
+        try:
+            fd = os.open(self._path('done'), os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+            os.close(fd)
+        except FileExistsError:
+            return None
+
+        if self.sha256:
+            digest = hashlib.sha256()
+            with open(self._path('part'), 'rb') as f:
+                for block in iter(lambda: f.read(READ_SIZE), b''):
+                    digest.update(block)
+            if digest.hexdigest() != self.sha256:
+                # Every chunk has to be sent again
+                with open(self._path('chunks'), 'wb') as f:
+                    f.write(bytes(self.chunk_count))
+                os.remove(self._path('done'))
+                raise ValueError("Checksum mismatch in the completed upload")
+
+        os.replace(self._path('part'), self.video_path)
+        os.remove(self._path('chunks'))
+        logger.info(f"Completed upload {self.upload_id}: {self.video_path}")
+        return self.video_path
+
+    def status(self):
+        """
+        Describe the upload for a client resuming it
+
+        Returns:
+            dict: Upload ID, sizes, received byte ranges and missing chunk numbers
+        """
+        finalized = self.is_finalized and not os.path.exists(self._path('chunks'))
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.filename,
+            'size': self.size,
+            'chunk_size': self.chunk_size,
+            'chunks': self.chunk_count,
+            'received': [[0, self.size]] if finalized else self.received_ranges(),
+            'missing': [] if finalized else self.missing_chunks(),
+            'complete': finalized
+        }
@@ -0,0 +1,430 @@
+import sys
+import json
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Byte positions of the digits in 'HH:MM:SS,mmm'
+TIME_CODE_LENGTH = 12
+TIME_CODE_DIGITS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+TIME_CODE_WEIGHTS = np.array([
+    36000000, 3600000,  # hours
+    600000, 60000,      # minutes
+    10000, 1000,        # seconds
+    100, 10, 1          # milliseconds
+], dtype=np.int64)
+
+
+def time_code_to_ms(time_code):
+    """
+    Parse one SRT time code to integer milliseconds
+
+    Accepts ',' or '.' before the milliseconds and any number of hour digits.
+
+    Args:
+        time_code (str): Time code such as 00:01:02,345
+
+    Returns:
+        int: Milliseconds
+    """
+    clock, _, fraction = time_code.strip().replace('.', ',').partition(',')
+    hours, minutes, seconds = clock.split(':')
+    milliseconds = int((fraction + '000')[:3]) if fraction else 0
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + milliseconds
+
+
+def time_codes_to_ms(time_codes):
+    """
+    Parse many SRT time codes at once
+
+    Codes in the usual fixed-width form are parsed as one NumPy operation;
+    any other shape falls back to time_code_to_ms.
+
+    Args:
+        time_codes (list): Time code strings
+
+    Returns:
+        numpy.ndarray: int64 milliseconds
+    """
+    if not time_codes:
+        return np.zeros(0, dtype=np.int64)
+
+    try:
+        if all(len(code) == TIME_CODE_LENGTH for code in time_codes):
+            raw = np.array(time_codes, dtype=f'S{TIME_CODE_LENGTH}')
+            digits = raw.view(np.uint8).reshape(-1, TIME_CODE_LENGTH)[:, TIME_CODE_DIGITS].astype(np.int64) - 48
+            if ((digits >= 0) & (digits <= 9)).all():
+                return digits @ TIME_CODE_WEIGHTS
+    except UnicodeEncodeError:
+        pass
+
+    return np.array([time_code_to_ms(code) for code in time_codes], dtype=np.int64)
+
+
+def ms_to_time_codes(milliseconds):
+    """
+    Format many millisecond values as SRT time codes
+
+    Args:
+        milliseconds (numpy.ndarray): Milliseconds (negative values become 0)
+
+    Returns:
+        list: Time code strings
+    """
+    milliseconds = np.maximum(np.asarray(milliseconds, dtype=np.int64), 0)
+    hours, rest = np.divmod(milliseconds, 3600000)
+    minutes, rest = np.divmod(rest, 60000)
+    seconds, rest = np.divmod(rest, 1000)
+    return [
+        f"{h:02d}:{m:02d}:{s:02d},{ms:03d}"
+        for h, m, s, ms in zip(hours.tolist(), minutes.tolist(), seconds.tolist(), rest.tolist())
+    ]
+
+
+class Cue:
+    """
+    View of one cue in a CueTrack
+
+    Reads and writes go straight to the track's arrays; time codes are only
+    formatted when asked for.
+    """
+
+    __slots__ = ('_track', '_position')
+
+    def __init__(self, track, position):
+        self._track = track
+        self._position = position
+
+    @property
+    def index(self):
+        return int(self._track.indices[self._position])
+
+    @property
+    def start_ms(self):
+        return int(self._track.start[self._position])
+
+    @start_ms.setter
+    def start_ms(self, value):
+        self._track.start[self._position] = value
+
+    @property
+    def end_ms(self):
+        return int(self._track.end[self._position])
+
+    @end_ms.setter
+    def end_ms(self, value):
+        self._track.end[self._position] = value
+
+    @property
+    def start(self):
+        return ms_to_time_codes([self.start_ms])[0]
+
+    @property
+    def end(self):
+        return ms_to_time_codes([self.end_ms])[0]
+
+    @property
+    def text(self):
+        return self._track.texts[self._track.text_ids[self._position]]
+
+    @text.setter
+    def text(self, value):
+        self._track.text_ids[self._position] = self._track.intern(value)
+
+    def to_dict(self):
+        """Return the cue in the editor's JSON form"""
+        return {'index': self.index, 'start': self.start, 'end': self.end, 'text': self.text}
+
+    def __repr__(self):
+        return f"Cue({self.index}, {self.start} --> {self.end}, {self.text!r})"
+
+
+class CueTrack:
+    """
+    Subtitle cues stored column-wise
+
+    Start and end times are int64 millisecond arrays and texts are stored
+    once each, referenced by an int32 ID per cue, so a track of repeated
+    lines costs a few bytes per cue. Retiming operations (shift, scale,
+    clamp, overlap repair, gap filling) run as whole-array NumPy operations
+    and modify the track in place. Conversion to and from the editor's list
+    of dicts with 'HH:MM:SS,mmm' strings only happens at the edges.
+    """
+
+    def __init__(self, start=None, end=None, text_ids=None, texts=None, indices=None):
+        """
+        Args:
+            start (array-like): Start times in milliseconds
+            end (array-like): End times in milliseconds
+            text_ids (array-like): Position of each cue's text in texts
+            texts (list): Distinct texts
+            indices (array-like): Cue indices (1..n by default)
+        """
+        self.start = np.asarray(start if start is not None else [], dtype=np.int64)
+        self.end = np.asarray(end if end is not None else [], dtype=np.int64)
+        self.text_ids = np.asarray(text_ids if text_ids is not None else [], dtype=np.int32)
+        self.texts = list(texts or [])
+        self._text_lookup = {text: i for i, text in enumerate(self.texts)}
+        if indices is None:
+            indices = np.arange(1, len(self.start) + 1)
+        self.indices = np.asarray(indices, dtype=np.int64)
+
+    @classmethod
+    def from_dicts(cls, subtitles):
+        """
+        Build a track from the editor's subtitle dictionaries
+
+        Args:
+            subtitles (list): Dictionaries with 'index', 'start', 'end' (SRT
+                time codes) and 'text'
+
+        Returns:
+            CueTrack: The track
+        """
+        track = cls()
+        track.start = time_codes_to_ms([subtitle['start'] for subtitle in subtitles])
+        track.end = time_codes_to_ms([subtitle['end'] for subtitle in subtitles])
+        track.text_ids = np.fromiter(
+            (track.intern(subtitle.get('text', '')) for subtitle in subtitles),
+            dtype=np.int32, count=len(subtitles)
+        )
+        try:
+            track.indices = np.array([int(subtitle['index']) for subtitle in subtitles], dtype=np.int64)
+        except (KeyError, TypeError, ValueError):
+            track.indices = np.arange(1, len(subtitles) + 1, dtype=np.int64)
+        return track
+
+    @classmethod
+    def from_cues(cls, cues):
+        """
+        Build a track from cues timed in seconds (see read_srt_cues)
+
+        Args:
+            cues (list): Dictionaries with 'start' and 'end' in seconds and 'text'
+
+        Returns:
+            CueTrack: The track
+        """
+        track = cls()
+        track.start = np.round(np.array([cue['start'] for cue in cues], dtype=np.float64) * 1000).astype(np.int64)
+        track.end = np.round(np.array([cue['end'] for cue in cues], dtype=np.float64) * 1000).astype(np.int64)
+        track.text_ids = np.fromiter((track.intern(cue.get('text', '')) for cue in cues),
+                                     dtype=np.int32, count=len(cues))
+        track.indices = np.arange(1, len(cues) + 1, dtype=np.int64)
+        return track
+
+    def intern(self, text):
+        """Return the ID of a text, adding it to the store if new"""
+        text_id = self._text_lookup.get(text)
+        if text_id is None:
+            text_id = len(self.texts)
+            self.texts.append(text)
+            self._text_lookup[text] = text_id
+        return text_id
+
+    def __len__(self):
+        return len(self.start)
+
+    def __getitem__(self, position):
+        if not -len(self) <= position < len(self):
+            raise IndexError(position)
+        return Cue(self, position % len(self))
+
+    def __iter__(self):
+        return (Cue(self, position) for position in range(len(self)))
+
+    def copy(self):
+        """Return an independent copy of the track"""
+        return CueTrack(self.start.copy(), self.end.copy(), self.text_ids.copy(), self.texts, self.indices.copy())
+
+    def _take(self, selection):
+        """New track with the cues selected by a mask or position array"""
+        return CueTrack(self.start[selection], self.end[selection], self.text_ids[selection],
+                        self.texts, self.indices[selection])
+
+    def _range_mask(self, first=None, last=None):
+        """Mask of the cues whose index lies in [first, last] (all if both are None)"""
+        mask = np.ones(len(self), dtype=bool)
+        if first is not None:
+            mask &= self.indices >= first
+        if last is not None:
+            mask &= self.indices <= last
+        return mask
+
+    def shift(self, offset_ms, first=None, last=None):
+        """
+        Move cues by a fixed offset
+
+        Args:
+            offset_ms (int): Milliseconds to add (negative moves cues earlier)
+            first (int): Index of the first cue to move (from the start if None)
+            last (int): Index of the last cue to move (to the end if None)
+
+        Returns:
+            CueTrack: self
+        """
+        mask = self._range_mask(first, last)
+        self.start[mask] += int(offset_ms)
+        self.end[mask] += int(offset_ms)
+        return self
+
+    def scale(self, factor, origin_ms=0):
+        """
+        Stretch or compress the timeline around a fixed point
+
+        Useful for subtitles made for another frame rate (e.g. 25/23.976).
+
+        Args:
+            factor (float): Multiplier applied to the distance from origin_ms
+            origin_ms (int): Time that stays in place
+
+        Returns:
+            CueTrack: self
+        """
+        self.start = np.round((self.start - origin_ms) * factor).astype(np.int64) + origin_ms
+        self.end = np.round((self.end - origin_ms) * factor).astype(np.int64) + origin_ms
+        return self
+
+    def clamp(self, min_ms=0, max_ms=None):
+        """
+        Keep every cue within [min_ms, max_ms]
+
+        Cues left empty by the clamp keep zero length rather than being removed.
+
+        Returns:
+            CueTrack: self
+        """
+        np.clip(self.start, min_ms, max_ms, out=self.start)
+        np.clip(self.end, min_ms, max_ms, out=self.end)
+        np.maximum(self.end, self.start, out=self.end)
+        return self
+
+    def sort(self):
+        """
+        Order cues by start time (stable, so equal starts keep their order)
+
+        Returns:
+            CueTrack: self
+        """
+        order = np.argsort(self.start, kind='stable')
+        self.start, self.end = self.start[order], self.end[order]
+        self.text_ids, self.indices = self.text_ids[order], self.indices[order]
+        return self
+
+    def fix_overlaps(self, min_gap_ms=0):
+        """
+        Shorten cues that run into the next one
+
+        Cues are sorted by start first. Each cue ends at most min_gap_ms
+        before the next one starts, but never before its own start.
+
+        Returns:
+            CueTrack: self
+        """
+        self.sort()
+        if len(self) > 1:
+            limit = self.start[1:] - int(min_gap_ms)
+            self.end[:-1] = np.maximum(np.minimum(self.end[:-1], limit), self.start[:-1])
+        return self
+
+    def fill_gaps(self, max_gap_ms, min_gap_ms=0):
+        """
+        Extend cues up to the next one when the pause between them is short
+
+        Args:
+            max_gap_ms (int): Gaps up to this long are closed
+            min_gap_ms (int): Gap left between the cues after extending
+
+        Returns:
+            CueTrack: self
+        """
+        self.sort()
+        if len(self) > 1:
+            target = self.start[1:] - int(min_gap_ms)
+            gap = self.start[1:] - self.end[:-1]
+            close = (gap > min_gap_ms) & (gap <= max_gap_ms)
+            self.end[:-1] = np.where(close, np.maximum(target, self.end[:-1]), self.end[:-1])
+        return self
+
+    def window(self, start_ms, end_ms=None):
+        """
+        Cues overlapping [start_ms, end_ms), clipped to it and moved so that
+        start_ms becomes zero
+
+        Args:
+            start_ms (int): Window start
+            end_ms (int): Window end (None for no end)
+
+        Returns:
+            CueTrack: New track
+        """
+        mask = self.end > start_ms
+        if end_ms is not None:
+            mask &= self.start < end_ms
+        track = self._take(mask)
+        track.clamp(start_ms, end_ms)
+        return track.shift(-start_ms)
+
+    def compact(self):
+        """
+        Drop texts no cue refers to any more (after edits or windowing)
+
+        Returns:
+            CueTrack: self
+        """
+        used, self.text_ids = np.unique(self.text_ids, return_inverse=True)
+        self.text_ids = self.text_ids.astype(np.int32)
+        self.texts = [self.texts[i] for i in used.tolist()]
+        self._text_lookup = {text: i for i, text in enumerate(self.texts)}
+        return self
+
+    def renumber(self):
+        """
+        Number cues 1..n in their current order
+
+        Returns:
+            CueTrack: self
+        """
+        self.indices = np.arange(1, len(self) + 1, dtype=np.int64)
+        return self
+
+    def nbytes(self):
+        """Approximate memory used by the arrays and the text store"""
+        arrays = self.start.nbytes + self.end.nbytes + self.text_ids.nbytes + self.indices.nbytes
+        return arrays + sum(sys.getsizeof(text) for text in self.texts) + sys.getsizeof(self.texts)
+
+    def iter_dicts(self):
+        """Yield the cues in the editor's JSON form, formatting times in bulk"""
+        starts = ms_to_time_codes(self.start)
+        ends = ms_to_time_codes(self.end)
+        texts = self.texts
+        for index, start, end, text_id in zip(self.indices.tolist(), starts, ends, self.text_ids.tolist()):
+            yield {'index': index, 'start': start, 'end': end, 'text': texts[text_id]}
+
+    def to_dicts(self):
+        """Return the cues as the editor's list of dictionaries"""
+        return list(self.iter_dicts())
+
+    def to_cues(self):
+        """Return the cues with times in seconds (see read_srt_cues)"""
+        texts = self.texts
+        return [
+            {'start': start / 1000.0, 'end': end / 1000.0, 'text': texts[text_id]}
+            for start, end, text_id in zip(self.start.tolist(), self.end.tolist(), self.text_ids.tolist())
+        ]
+
+    def to_json(self):
+        """
+        Serialize the cues as the JSON the editor loads
+
+        Written directly rather than through dictionaries; each distinct
+        text is JSON-encoded once, however many cues share it.
+        """
+        encoded = [json.dumps(text) for text in self.texts]
+        starts = ms_to_time_codes(self.start)
+        ends = ms_to_time_codes(self.end)
+        return '[' + ', '.join(
+            f'{{"index": {index}, "start": "{start}", "end": "{end}", "text": {encoded[text_id]}}}'
+            for index, start, end, text_id in zip(self.indices.tolist(), starts, ends, self.text_ids.tolist())
+        ) + ']'
@@ -0,0 +1,212 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Job status values
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+# Number of jobs that can run at the same time in one worker process
+DEFAULT_MAX_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+
+# How long finished jobs are kept around for status and result queries
+FINISHED_JOB_TTL = 3600  # 1 hour
+
+
+class Job:
+    """
+    A unit of background work that moves through a list of named stages
+    """
+
+    def __init__(self, kind, owner=None, stages=None):
+        """
+        Args:
+            kind (str): Kind of job (e.g. 'upload', 'render')
+            owner (str): Session ID that is allowed to query the job
+            stages (list): Ordered stage names the job moves through
+        """
+        self.id = str(uuid.uuid4())
+        self.kind = kind
+        self.owner = owner
+        self.stages = list(stages or [])
+        self.stage = STATUS_QUEUED
+        self.status = STATUS_QUEUED
+        self.progress = 0
+        self.message = ''
+        self.result = None
+        self.error = None
+        # Small values a running job publishes for the browser (e.g. a live preview)
+        self.details = {}
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage, message=''):
+        """
+        Move the job to a new stage
+
+        Args:
+            stage (str): Stage name (should be one of the job's stages)
+            message (str): Human-readable description of the stage
+        """
+        with self._lock:
+            self.stage = stage
+            self.message = message
+            if stage in self.stages:
+                # Progress at the start of a stage, based on its position
+                self.progress = int(100 * self.stages.index(stage) / len(self.stages))
+            self.updated_at = time.time()
+        logger.info(f"Job {self.id} ({self.kind}) stage: {stage}")
+
+    def set_progress(self, fraction):
+        """
+        Report progress within the current stage
+
+        Args:
+            fraction (float): Completed fraction of the current stage (0.0 to 1.0)
+        """
+        with self._lock:
+            if self.stage in self.stages and self.stages:
+                stage_width = 100 / len(self.stages)
+                stage_start = self.stages.index(self.stage) * stage_width
+                fraction = min(max(fraction, 0.0), 1.0)
+                self.progress = max(self.progress, int(stage_start + stage_width * fraction))
+            self.updated_at = time.time()
+
+    def set_detail(self, key, value):
+        """
+        Publish a value in the job's status while it runs
+
+        Args:
+            key (str): Name of the value
+            value: JSON-serializable value
+        """
+        with self._lock:
+            self.details[key] = value
+            self.updated_at = time.time()
+
+    def is_finished(self):
+        return self.status in (STATUS_COMPLETED, STATUS_FAILED)
+
+    def to_dict(self):
+        """
+        Return a JSON-serializable view of the job (without the result)
+        """
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'stage': self.stage,
+                'stages': self.stages,
+                'progress': self.progress,
+                'message': self.message,
+                'error': self.error,
+                'details': dict(self.details),
+                'created_at': self.created_at,
+                'updated_at': self.updated_at
+            }
+
+
+class JobQueue:
+    """
+    Bounded pool that runs jobs in background threads and tracks their state
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Args:
+            max_workers (int): Maximum number of jobs running concurrently
+        """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, *args, owner=None, stages=None, **kwargs):
+        """
+        Queue a job for execution
+
+        Args:
+            kind (str): Kind of job (e.g. 'upload', 'render')
+            func (callable): Function called as func(job, *args, **kwargs). Its
+                return value becomes the job result.
+            owner (str): Session ID that is allowed to query the job
+            stages (list): Ordered stage names the job moves through
+
+        Returns:
+            Job: The queued job
+        """
+        self._prune()
+
+        job = Job(kind, owner=owner, stages=stages)
+        with self._lock:
+            self._jobs[job.id] = job
+
+        self._executor.submit(self._run, job, func, args, kwargs)
+        logger.info(f"Queued job {job.id} ({kind})")
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        job.status = STATUS_RUNNING
+        try:
+            result = func(job, *args, **kwargs)
+            job.result = result
+            job.status = STATUS_COMPLETED
+            job.stage = STATUS_COMPLETED
+            job.progress = 100
+            logger.info(f"Job {job.id} ({job.kind}) completed")
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+            job.error = str(e)
+            job.status = STATUS_FAILED
+        finally:
+            job.finished_at = time.time()
+            job.updated_at = job.finished_at
+
+    def get(self, job_id):
+        """
+        Look up a job by ID
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            Job or None: The job, if it is known to this process
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def active_jobs(self, owner=None):
+        """
+        Return jobs that are queued or running
+
+        Args:
+            owner (str): Only return jobs owned by this session ID
+
+        Returns:
+            list: Active jobs
+        """
+        with self._lock:
+            return [
+                job for job in self._jobs.values()
+                if not job.is_finished() and (owner is None or job.owner == owner)
+            ]
+
+    def _prune(self):
+        """Forget finished jobs older than FINISHED_JOB_TTL"""
+        cutoff = time.time() - FINISHED_JOB_TTL
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,116 @@
+import os
+import json
+import logging
+import tempfile
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Parent folder of the persistent caches; kept outside the upload folder so
+# session cleanup never removes it
+CACHE_ROOT = os.path.join(tempfile.gettempdir(), 'video_subtitler_cache')
+
+
+class JsonFileStore:
+    """
+    A folder of JSON files with least-recently-used eviction
+
+    Reading a file refreshes its modification time, and evict() deletes the
+    files with the oldest modification times until the folder fits in
+    max_bytes. Files are written to a temporary file first and renamed, so
+    readers never see partial entries.
+    """
+
+    def __init__(self, directory, max_bytes, description='cache'):
+        """
+        Args:
+            directory (str): Folder holding the files
+            max_bytes (int): Maximum total size of the folder
+            description (str): Name of the store in log messages
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.description = description
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def read(self, filename):
+        """
+        Load a file and mark it as recently used
+
+        Args:
+            filename (str): Name of the file in the store
+
+        Returns:
+            The decoded JSON data, or None if the file is missing or unreadable
+                (unreadable files are deleted)
+        """
+        path = self.path(filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            os.utime(path, None)
+            return data
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable {self.description} entry {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def write(self, filename, data):
+        """
+        Store JSON data under a file name, replacing any earlier file
+
+        Args:
+            filename (str): Name of the file in the store
+            data: JSON-serializable data
+        """
+        path = self.path(filename)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def evict(self):
+        """
+        Delete least recently used files until the store fits in max_bytes
+
+        Returns:
+            int: Number of files deleted
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return 0
+
+            entries.sort()
+            removed = 0
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+
+            logger.info(f"Evicted {removed} {self.description} files")
+            return removed
@@ -0,0 +1,231 @@
+import os
+import re
+import uuid
+import logging
+import mimetypes
+from urllib.parse import quote
+from flask import Response, request, abort
+from werkzeug.http import http_date, quote_etag, parse_etags
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+logger = logging.getLogger(__name__)
+
+# '' serves files from Python, 'nginx' hands them to the proxy with
+# X-Accel-Redirect, 'sendfile' with X-Sendfile (Apache, lighttpd, Caddy)
+OFFLOAD = os.environ.get('MEDIA_OFFLOAD', '').lower()
+
+# Internal nginx location aliased to the upload folder (X-Accel-Redirect only)
+ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/protected-media/')
+
+# Bytes read at a time for ranges that cannot go through sendfile
+READ_SIZE = 256 * 1024
+
+# Requests asking for more ranges than this get the whole file
+MAX_RANGES = 16
+
+RANGE_PATTERN = re.compile(r'^\s*(\d*)\s*-\s*(\d*)\s*$')
+
+# HLS playlists and fragmented-MP4 segments of progressive renders
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/iso.segment', '.m4s')
+
+
+def parse_ranges(header, size):
+    """
+    Parse a Range header against a file size
+
+    Args:
+        header (str): Value of the Range header
+        size (int): File size in bytes
+
+    Returns:
+        list or None: (start, end) pairs with end exclusive, in request order;
+            an empty list if no range is satisfiable; None if the header is
+            missing, malformed or not worth honoring (full response)
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not spec:
+        return None
+
+    parts = spec.split(',')
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        match = RANGE_PATTERN.match(part)
+        if not match or match.group(0).strip() == '-':
+            return None
+        first, last = match.groups()
+
+        if first == '':
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            start, end = max(0, size - length), size
+        else:
+            start = int(first)
+            end = size if last == '' else min(int(last) + 1, size)
+            if last != '' and int(last) < start:
+                return None
+            if start >= size:
+                continue
+
+        ranges.append((start, end))
+
+    return ranges
+
+
+def _file_response(path, start, end, size, mimetype):
+    """Body for the bytes [start, end) of a file, through sendfile when possible"""
+    f = open(path, 'rb')
+    f.seek(start)
+
+    if end == size:
+        # Runs to the end of the file, so the server's file wrapper (gunicorn
+        # uses sendfile) can send the rest of the file without copying it
+        body = wrap_file(request.environ, f, READ_SIZE)
+    else:
+        def body_iter():
+            try:
+                remaining = end - start
+                while remaining > 0:
+                    data = f.read(min(READ_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+            finally:
+                f.close()
+        body = body_iter()
+
+    response = Response(body, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = end - start
+    return response
+
+
+def _multipart_response(path, ranges, size, mimetype):
+    """multipart/byteranges body for several ranges"""
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (f"--{boundary}\r\nContent-Type: {mimetype}\r\n"
+         f"Content-Range: bytes {start}-{end - 1}/{size}\r\n\r\n").encode('ascii')
+        for start, end in ranges
+    ]
+    closing = f"\r\n--{boundary}--\r\n".encode('ascii')
+    length = sum(len(header) + (end - start) for header, (start, end) in zip(part_headers, ranges))
+    length += 2 * (len(ranges) - 1) + len(closing)
+
+    def body_iter():
+        with open(path, 'rb') as f:
+            for i, (header, (start, end)) in enumerate(zip(part_headers, ranges)):
+                if i:
+                    yield b'\r\n'
+                yield header
+                f.seek(start)
+                remaining = end - start
+                while remaining > 0:
+                    data = f.read(min(READ_SIZE, remaining))
+                    if not data:
+                        break
+                    remaining -= len(data)
+                    yield data
+            yield closing
+
+    response = Response(body_iter(), direct_passthrough=True,
+                        content_type=f"multipart/byteranges; boundary={boundary}")
+    response.content_length = length
+    return response
+
+
+def _offload_response(path, root, mimetype):
+    """Empty response telling the front proxy which file to send"""
+    response = Response(mimetype=mimetype)
+    if OFFLOAD == 'nginx':
+        relative = os.path.relpath(path, root).replace(os.sep, '/')
+        response.headers['X-Accel-Redirect'] = ACCEL_PREFIX.rstrip('/') + '/' + quote(relative)
+    else:
+        response.headers['X-Sendfile'] = path
+    # The proxy sets the length and answers Range requests itself
+    return response
+
+
+def send_media(root, filename, mimetype=None, as_attachment=False, download_name=None, max_age=None):
+    """
+    Send a file from a folder with byte-range support
+
+    Single ranges reaching the end of the file, which is what video players
+    request when seeking, and whole-file responses go through the WSGI file
+    wrapper, so gunicorn sends them with sendfile. Other ranges are read in
+    blocks and several ranges are returned as multipart/byteranges. With
+    MEDIA_OFFLOAD set, only headers are returned and the front proxy sends
+    the bytes, so no worker is held for the transfer.
+
+    Args:
+        root (str): Folder the file must be in
+        filename (str): File name relative to root (from the URL)
+        mimetype (str): Content type (guessed from the name by default)
+        as_attachment (bool): Ask the browser to download the file
+        download_name (str): File name offered for the download
+        max_age (int): Cache lifetime in seconds (revalidate every time if None)
+
+    Returns:
+        flask.Response: The response
+    """
+    path = safe_join(root, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    path = os.path.abspath(path)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = f"{stat.st_mtime_ns:x}-{size:x}"
+
+    if OFFLOAD in ('nginx', 'sendfile'):
+        response = _offload_response(path, os.path.abspath(root), mimetype)
+    else:
+        # Revalidation of an unchanged file
+        if etag in parse_etags(request.headers.get('If-None-Match')):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        ranges = parse_ranges(request.headers.get('Range'), size)
+
+        # If-Range: only honor the ranges if the client holds this version
+        if_range = request.headers.get('If-Range')
+        if ranges is not None and if_range and if_range.strip() != quote_etag(etag):
+            ranges = None
+
+        if ranges is None:
+            response = _file_response(path, 0, size, size, mimetype)
+        elif not ranges:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f"bytes */{size}"
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            response = _file_response(path, start, end, size, mimetype)
+            response.status_code = 206
+            response.headers['Content-Range'] = f"bytes {start}-{end - 1}/{size}"
+        else:
+            response = _multipart_response(path, ranges, size, mimetype)
+            response.status_code = 206
+
+    response.headers['Accept-Ranges'] = 'bytes'
+    response.set_etag(etag)
+    response.headers['Last-Modified'] = http_date(stat.st_mtime)
+    if max_age is None:
+        response.headers['Cache-Control'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = f"public, max-age={int(max_age)}"
+
+    if as_attachment:
+        name = download_name or os.path.basename(path)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(name)}"
+
+    return response
@@ -0,0 +1,292 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from collections import OrderedDict
+from utils.json_store import JsonFileStore, CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIR = os.environ.get('MEDIA_INDEX_DIR', os.path.join(CACHE_ROOT, 'media'))
+DEFAULT_MAX_BYTES = int(os.environ.get('MEDIA_INDEX_MAX_MB', '64')) * 1024 * 1024
+
+# Entries kept in memory, so repeated lookups skip the JSON file too
+MEMORY_ENTRIES = 32
+
+
+def file_key(path):
+    """
+    Key a file by its absolute path, size and modification time
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        str: Hex digest; changes whenever the file is replaced or rewritten
+    """
+    stat = os.stat(path)
+    key = repr((os.path.abspath(path), stat.st_size, stat.st_mtime_ns)).encode('utf-8')
+    return hashlib.sha256(key).hexdigest()
+
+
+def _parse_rate(rate):
+    """Convert an FFprobe rate such as '30000/1001' to a float"""
+    try:
+        numerator, _, denominator = (rate or '0/1').partition('/')
+        denominator = float(denominator or 1)
+        return float(numerator) / denominator if denominator else 0.0
+    except ValueError:
+        return 0.0
+
+
+def _stream_info(stream):
+    """Keep the fields of an FFprobe stream that later stages use"""
+    info = {
+        'index': stream.get('index'),
+        'type': stream.get('codec_type', 'unknown'),
+        'codec': stream.get('codec_name', 'unknown'),
+        'language': stream.get('tags', {}).get('language'),
+        'duration': float(stream.get('duration') or 0)
+    }
+
+    if info['type'] == 'video':
+        info['width'] = stream.get('width', 0)
+        info['height'] = stream.get('height', 0)
+        info['frame_rate'] = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+        info['pix_fmt'] = stream.get('pix_fmt')
+    elif info['type'] == 'audio':
+        info['sample_rate'] = int(stream.get('sample_rate') or 0)
+        info['channels'] = stream.get('channels', 0)
+        info['channel_layout'] = stream.get('channel_layout')
+
+    return info
+
+
+def probe_streams(path):
+    """
+    Read the container format and every stream of a media file
+
+    Args:
+        path (str): Path to the media file
+
+    Returns:
+        tuple: (format dict, list of stream dicts)
+    """
+    command = [
+        'ffprobe', '-v', 'error', '-print_format', 'json',
+        '-show_format', '-show_streams', path
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+    probed = json.loads(result.stdout)
+
+    container = probed.get('format', {})
+    media_format = {
+        'format_name': container.get('format_name', 'unknown'),
+        'duration': float(container.get('duration') or 0),
+        'size': int(container.get('size') or 0),
+        'bit_rate': int(container.get('bit_rate') or 0)
+    }
+    return media_format, [_stream_info(stream) for stream in probed.get('streams', [])]
+
+
+def probe_gops(path, duration=0.0):
+    """
+    Read the packet table of the first video stream and group it into GOPs
+
+    Only packet headers are read, so nothing is decoded.
+
+    Args:
+        path (str): Path to the media file
+        duration (float): Media duration, used as the end of the last GOP
+
+    Returns:
+        list: One dict per GOP with 'start' and 'end' in seconds, the byte
+            offset ('pos') of its first packet, its 'packets' and 'bytes',
+            and whether it starts with a keyframe
+    """
+    command = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags,pos,size', '-of', 'csv=p=0',
+        path
+    ]
+    result = subprocess.run(command, check=True, capture_output=True, text=True)
+
+    gops = []
+    for line in result.stdout.splitlines():
+        # FFprobe prints the fields in its own order, not the requested one
+        fields = dict(zip(('pts_time', 'size', 'pos', 'flags'), line.split(',')))
+        pts_time = fields.get('pts_time', 'N/A')
+        if pts_time in ('', 'N/A'):
+            continue
+        pts_time = float(pts_time)
+        size = int(fields.get('size') or 0)
+
+        is_keyframe = 'K' in fields.get('flags', '')
+
+        # Packets before the first keyframe form a GOP of their own
+        if is_keyframe or not gops:
+            pos = fields.get('pos', 'N/A')
+            gops.append({
+                'keyframe': is_keyframe,
+                'start': pts_time,
+                'end': pts_time,
+                'pos': int(pos) if pos not in ('', 'N/A') else None,
+                'packets': 0,
+                'bytes': 0
+            })
+
+        gop = gops[-1]
+        gop['packets'] += 1
+        gop['bytes'] += size
+        gop['end'] = max(gop['end'], pts_time)
+
+    # Packets are in decode order; sort GOPs by presentation time and make
+    # each one end where the next begins
+    gops.sort(key=lambda gop: gop['start'])
+    for gop, following in zip(gops, gops[1:]):
+        gop['end'] = following['start']
+    if gops:
+        gops[-1]['end'] = max(gops[-1]['end'], duration)
+
+    return gops
+
+
+class MediaIndex:
+    """
+    Probe results for media files, computed once per file
+
+    Each file is probed the first time it is looked up: the container
+    format, every stream, and the GOP table of the first video stream (from
+    packet flags). Entries are keyed by path, size and modification time, so
+    a replaced file is probed again, and are stored as JSON files with the
+    most recently used ones also kept in memory. Least recently used files
+    are evicted once the index grows beyond max_bytes.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            index_dir (str): Directory holding the index entries
+            max_bytes (int): Maximum total size of the index
+        """
+        self.index_dir = index_dir
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per key, so a file is never probed twice at the same time
+        self._probe_locks = {}
+        self._store = JsonFileStore(index_dir, max_bytes, 'media index')
+
+    def _entry_name(self, key):
+        return f"media-{key}.json"
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _read(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+
+        entry = self._store.read(self._entry_name(key))
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def get(self, path):
+        """
+        Return the index entry of a media file, probing it if needed
+
+        Args:
+            path (str): Path to the media file
+
+        Returns:
+            dict: Entry with 'format', 'streams', 'video' and 'audio' (the
+                first stream of each type, or None), 'keyframes' and 'gops'
+        """
+        key = file_key(path)
+        entry = self._read(key)
+        if entry is not None:
+            return entry
+
+        with self._lock:
+            probe_lock = self._probe_locks.setdefault(key, threading.Lock())
+
+        with probe_lock:
+            entry = self._read(key)
+            if entry is None:
+                entry = self._probe(path)
+                try:
+                    self._store.write(self._entry_name(key), entry)
+                    self._store.evict()
+                except Exception as e:
+                    logger.error(f"Error storing media index entry: {str(e)}")
+                self._remember(key, entry)
+
+        with self._lock:
+            self._probe_locks.pop(key, None)
+        return entry
+
+    def _probe(self, path):
+        start = time.perf_counter()
+        media_format, streams = probe_streams(path)
+        video = next((stream for stream in streams if stream['type'] == 'video'), None)
+        audio = next((stream for stream in streams if stream['type'] == 'audio'), None)
+        gops = probe_gops(path, media_format['duration']) if video else []
+
+        logger.info(f"Indexed {path}: {len(streams)} streams, {len(gops)} GOPs "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return {
+            'path': os.path.abspath(path),
+            'format': media_format,
+            'streams': streams,
+            'video': video,
+            'audio': audio,
+            'keyframes': [gop['start'] for gop in gops if gop['keyframe']],
+            'gops': gops,
+            'indexed_at': time.time()
+        }
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_media_index():
+    """
+    Return the shared media index
+    """
+    global _default_index
+
+    with _default_index_lock:
+        if _default_index is None:
+            try:
+                _default_index = MediaIndex()
+            except Exception as e:
+                # Fall back to an index in a private temporary folder
+                logger.error(f"Error opening media index {DEFAULT_INDEX_DIR}: {str(e)}")
+                _default_index = MediaIndex(tempfile.mkdtemp(prefix='media_index_'))
+        return _default_index
+
+
+def media_info(path):
+    """
+    Return the index entry of a media file (see MediaIndex.get)
+
+    Args:
+        path (str): Path to the media file
+
+    Returns:
+        dict: Index entry
+    """
+    return get_media_index().get(path)
@@ -0,0 +1,240 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+from utils.transcription_settings import get_transcription_settings, model_options
+
+logger = logging.getLogger(__name__)
+
+# Approximate parameter counts (in millions) of the Whisper checkpoints that
+# faster-whisper can load. Used to estimate how much memory a model occupies.
+MODEL_PARAMS_MILLIONS = {
+    'tiny': 39,
+    'tiny.en': 39,
+    'base': 74,
+    'base.en': 74,
+    'small': 244,
+    'small.en': 244,
+    'medium': 769,
+    'medium.en': 769,
+    'large-v1': 1550,
+    'large-v2': 1550,
+    'large-v3': 1550,
+    'large': 1550,
+    'turbo': 809,
+    'large-v3-turbo': 809,
+    'distil-large-v3': 756,
+}
+
+# Bytes used per weight for each CTranslate2 compute type
+COMPUTE_TYPE_BYTES = {
+    'int8': 1,
+    'int8_float16': 1,
+    'int8_float32': 1,
+    'int8_bfloat16': 1,
+    'int16': 2,
+    'float16': 2,
+    'bfloat16': 2,
+    'float32': 4,
+    'default': 4,
+}
+
+# Default memory budget for loaded models, overridable per deployment
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get('WHISPER_MODEL_MEMORY_MB', '2048'))
+
+
+def estimate_model_size_mb(model_name, compute_type='int8'):
+    """
+    Estimate the resident size of a Whisper model
+
+    Args:
+        model_name (str): Whisper model name ("tiny", "base", "small", ...)
+        compute_type (str): CTranslate2 compute type ("int8", "float16", ...)
+
+    Returns:
+        int: Estimated size in megabytes
+    """
+    params = MODEL_PARAMS_MILLIONS.get(model_name, MODEL_PARAMS_MILLIONS['medium'])
+    bytes_per_param = COMPUTE_TYPE_BYTES.get(compute_type, 4)
+    # Add a fixed overhead for the runtime, tokenizer and feature extractor
+    return int(params * bytes_per_param * 1.2) + 50
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of loaded Whisper models
+
+    Models are keyed by (model name, compute type, device) plus any other
+    load options, such as cpu_threads, and loaded at most once per process.
+    When the estimated size of the loaded models exceeds the memory budget,
+    the least recently used models are evicted.
+    """
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, loader=None):
+        """
+        Args:
+            memory_budget_mb (int): Maximum estimated memory for loaded models
+            loader (callable): Function (model_name, device, compute_type, **kwargs)
+                returning a model. Defaults to faster_whisper.WhisperModel.
+        """
+        self.memory_budget_mb = memory_budget_mb
+        self._loader = loader
+        self._models = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def _load(self, model_name, device, compute_type, **kwargs):
+        if self._loader is not None:
+            return self._loader(model_name, device=device, compute_type=compute_type, **kwargs)
+
+        from faster_whisper import WhisperModel
+        return WhisperModel(model_name, device=device, compute_type=compute_type, **kwargs)
+
+    def get_model(self, model_name='base', compute_type='int8', device='cpu', **kwargs):
+        """
+        Return a loaded model, loading it on first use
+
+        Args:
+            model_name (str): Whisper model to use ("tiny", "base", "small", "medium")
+            compute_type (str): CTranslate2 compute type
+            device (str): Device to run on ("cpu", "cuda", "auto")
+            **kwargs: Extra arguments passed to the loader on first load
+
+        Returns:
+            WhisperModel: The shared model instance
+        """
+        # Thread settings are fixed when a model is loaded, so a model loaded
+        # with other options is a different entry
+        key = (model_name, compute_type, device) + tuple(sorted(kwargs.items()))
+
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Load outside the registry lock so other models stay available, but
+        # make concurrent requests for the same model wait for a single load
+        with key_lock:
+            with self._lock:
+                model = self._models.get(key)
+                if model is not None:
+                    self._models.move_to_end(key)
+                    return model
+
+            logger.info(f"Loading Whisper model: {model_name} ({compute_type}, {device})")
+            model = self._load(model_name, device, compute_type, **kwargs)
+
+            with self._lock:
+                self._models[key] = model
+                self._sizes[key] = estimate_model_size_mb(model_name, compute_type)
+                self._evict(keep=key)
+
+        return model
+
+    def _evict(self, keep):
+        """Evict least recently used models until the budget is met (lock held)"""
+        while self.loaded_size_mb() > self.memory_budget_mb and len(self._models) > 1:
+            oldest = next(iter(self._models))
+            if oldest == keep:
+                break
+            self._models.pop(oldest)
+            size = self._sizes.pop(oldest, 0)
+            self._key_locks.pop(oldest, None)
+            logger.info(f"Evicted Whisper model {oldest} (~{size} MB) from registry")
+
+    def loaded_size_mb(self):
+        """Return the estimated memory used by loaded models"""
+        return sum(self._sizes.values())
+
+    def loaded_models(self):
+        """Return the keys of loaded models, least recently used first"""
+        with self._lock:
+            return list(self._models.keys())
+
+    def warm_up(self, model_names, compute_type=None, device='cpu'):
+        """
+        Load a list of models ahead of the first request
+
+        Args:
+            model_names (list): Model names to load
+            compute_type (str): CTranslate2 compute type; by default each model
+                is loaded with its transcription settings, as transcribe_audio
+                will request it
+            device (str): Device to run on
+        """
+        for model_name in model_names:
+            try:
+                if compute_type is None:
+                    options = model_options(get_transcription_settings(model_name))
+                else:
+                    options = {'compute_type': compute_type}
+                self.get_model(model_name, device=device, **options)
+            except Exception as e:
+                logger.error(f"Error warming up Whisper model {model_name}: {str(e)}")
+
+    def clear(self):
+        """Drop all loaded models"""
+        with self._lock:
+            self._models.clear()
+            self._sizes.clear()
+            self._key_locks.clear()
+
+
+# Shared registry used by the application
+registry = ModelRegistry()
+
+
+def get_whisper_model(model_name='base', compute_type='int8', device='cpu', **kwargs):
+    """
+    Get a shared Whisper model from the process-wide registry
+
+    Args:
+        model_name (str): Whisper model to use ("tiny", "base", "small", "medium")
+        compute_type (str): CTranslate2 compute type
+        device (str): Device to run on
+
+    Returns:
+        WhisperModel: The shared model instance
+    """
+    return registry.get_model(model_name, compute_type=compute_type, device=device, **kwargs)
+
+
+def warm_up_models(model_names=None, compute_type=None, device='cpu', background=True):
+    """
+    Preload Whisper models at startup
+
+    Args:
+        model_names (list): Model names to load. Defaults to the comma-separated
+            WHISPER_WARMUP_MODELS environment variable.
+        compute_type (str): CTranslate2 compute type (from the transcription
+            settings by default)
+        device (str): Device to run on
+        background (bool): Load in a daemon thread instead of blocking
+
+    Returns:
+        threading.Thread or None: The warm-up thread when running in background
+    """
+    if model_names is None:
+        model_names = [name.strip() for name in os.environ.get('WHISPER_WARMUP_MODELS', '').split(',') if name.strip()]
+
+    if not model_names:
+        return None
+
+    logger.info(f"Warming up Whisper models: {', '.join(model_names)}")
+
+    if not background:
+        registry.warm_up(model_names, compute_type=compute_type, device=device)
+        return None
+
+    thread = threading.Thread(
+        target=registry.warm_up,
+        args=(model_names,),
+        kwargs={'compute_type': compute_type, 'device': device},
+        name='whisper-warmup',
+        daemon=True
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,371 @@
+import os
+import csv
+import math
+import hashlib
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.video_processor import get_video_info, read_srt_cues, ass_filter, preflight_filter
+from utils.ass_writer import write_ass, DEFAULT_FONT
+from utils.media_index import media_info
+from utils.cue_track import CueTrack
+
+logger = logging.getLogger(__name__)
+
+# Number of segments encoded at the same time; each encoder gets an equal
+# share of the CPU threads
+DEFAULT_MAX_WORKERS = int(os.environ.get('RENDER_WORKERS', str(max(1, (os.cpu_count() or 1) // 2))))
+
+# 'auto' renders videos of at least two minimum-length segments in parallel,
+# '1' always, '0' never
+PARALLEL_MODE = os.environ.get('RENDER_PARALLEL', 'auto')
+
+# Segments shorter than this are not worth an extra FFmpeg process
+MIN_SEGMENT_SECONDS = float(os.environ.get('RENDER_MIN_SEGMENT_SECONDS', '30'))
+
+# Target segment length; shorter segments mean less to re-encode after an edit
+SEGMENT_SECONDS = float(os.environ.get('RENDER_SEGMENT_SECONDS', '60'))
+
+# Encoder settings shared by every segment, matching embed_subtitles
+VIDEO_ENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'medium']
+
+
+def should_render_parallel(duration, max_workers=None, incremental=False):
+    """
+    Decide whether a video is long enough for segment-parallel rendering
+
+    Args:
+        duration (float): Video duration in seconds
+        max_workers (int): Number of concurrent encoders
+        incremental (bool): Rendered segments are cached, so segmenting pays
+            off on later renders even with a single encoder
+
+    Returns:
+        bool: True if the video should be rendered in segments
+    """
+    if PARALLEL_MODE == '0':
+        return False
+    if PARALLEL_MODE == '1':
+        return True
+
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    return (max_workers >= 2 or incremental) and duration >= 2 * MIN_SEGMENT_SECONDS
+
+
+def get_keyframe_times(video_path):
+    """
+    List the timestamps of the video's keyframes
+
+    Read from the media index, which takes them from packet flags, so
+    nothing is decoded and the file is only scanned once.
+
+    Args:
+        video_path (str): Path to the video file
+
+    Returns:
+        list: Keyframe times in seconds, in increasing order
+    """
+    return list(media_info(video_path)['keyframes'])
+
+
+def choose_cut_points(keyframes, duration, segments, min_segment_seconds=MIN_SEGMENT_SECONDS):
+    """
+    Pick keyframes that split the video into roughly equal segments
+
+    Args:
+        keyframes (list): Keyframe times in seconds
+        duration (float): Video duration in seconds
+        segments (int): Desired number of segments
+        min_segment_seconds (float): Shortest segment allowed
+
+    Returns:
+        list: Cut times in seconds, each one a keyframe
+    """
+    segments = max(1, min(segments, int(duration // max(min_segment_seconds, 1e-3)) or 1))
+    cuts = []
+    previous = 0.0
+
+    for i in range(1, segments):
+        target = duration * i / segments
+        candidates = [t for t in keyframes if t - previous >= min_segment_seconds and duration - t >= min_segment_seconds]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda t: abs(t - target))
+        if cut <= previous:
+            continue
+        cuts.append(cut)
+        previous = cut
+
+    return cuts
+
+
+def split_at_keyframes(video_path, cut_points, work_dir):
+    """
+    Split the video stream at the given keyframes without re-encoding
+
+    Args:
+        video_path (str): Path to the input video
+        cut_points (list): Keyframe times to cut at
+        work_dir (str): Folder for the segment files
+
+    Returns:
+        list: (segment_path, start, end) tuples in order
+    """
+    list_path = os.path.join(work_dir, 'segments.csv')
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', video_path,
+        '-map', '0:v:0', '-c', 'copy',
+        '-f', 'segment',
+        '-reset_timestamps', '1',
+        '-segment_list', list_path, '-segment_list_type', 'csv'
+    ]
+    if cut_points:
+        # The muxer cuts at the first keyframe at or after each time; back off
+        # a millisecond so rounding never skips to the next keyframe
+        command += ['-segment_times', ','.join(f"{max(0.0, t - 0.001):.3f}" for t in cut_points)]
+    command.append(os.path.join(work_dir, 'source_%03d.mkv'))
+
+    subprocess.run(command, check=True, capture_output=True)
+
+    segments = []
+    with open(list_path, 'r', encoding='utf-8') as f:
+        for name, start, end in csv.reader(f):
+            segments.append((os.path.join(work_dir, name), float(start), float(end)))
+    return segments
+
+
+def _load_or_split(video_path, cut_points, work_dir, cache_dir):
+    """Return the source segments, reusing a split cached for the same file and cuts"""
+    if not cache_dir:
+        return split_at_keyframes(video_path, cut_points, work_dir)
+
+    stat = os.stat(video_path)
+    split_key = hashlib.sha256(_key_bytes(
+        os.path.abspath(video_path), stat.st_size, stat.st_mtime, [round(t, 3) for t in cut_points]
+    )).hexdigest()[:16]
+    source_dir = os.path.join(cache_dir, f"source-{split_key}")
+
+    if not os.path.exists(os.path.join(source_dir, 'segments.csv')):
+        temp_dir = tempfile.mkdtemp(prefix='source-', dir=cache_dir)
+        split_at_keyframes(video_path, cut_points, temp_dir)
+        shutil.rmtree(source_dir, ignore_errors=True)
+        os.rename(temp_dir, source_dir)
+    else:
+        logger.info(f"Reusing cached source segments in {source_dir}")
+
+    segments = []
+    with open(os.path.join(source_dir, 'segments.csv'), 'r', encoding='utf-8') as f:
+        for name, start, end in csv.reader(f):
+            segments.append((os.path.join(source_dir, name), float(start), float(end)))
+    return segments
+
+
+def _key_bytes(*parts):
+    """Serialize cache key parts into bytes for hashing"""
+    return repr(parts).encode('utf-8')
+
+
+def segment_cache_key(segment_path, start, end, subtitles_path):
+    """
+    Key a rendered segment by its range, the cues shown in it and the style
+
+    Args:
+        segment_path (str): Source segment, whose folder identifies the input file
+        start (float): Segment start in seconds
+        end (float): Segment end in seconds
+        subtitles_path (str): The segment's shifted ASS file, which holds the
+            style and exactly the cues overlapping the segment
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256(_key_bytes(segment_path, round(start, 3), round(end, 3), VIDEO_ENCODE_ARGS))
+    with open(subtitles_path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def prune_render_cache(cache_dir, keep):
+    """
+    Delete cached segments and source splits that the latest render did not use
+
+    Args:
+        cache_dir (str): Render cache folder
+        keep (set): File and folder names to keep
+    """
+    for name in os.listdir(cache_dir):
+        if name in keep:
+            continue
+        path = os.path.join(cache_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _render_segment(segment_path, video_filter, output_path, threads):
+    """Burn subtitles into one segment (video only)"""
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', segment_path,
+        '-vf', video_filter,
+        '-an'
+    ] + VIDEO_ENCODE_ARGS + ['-threads', str(threads), output_path]
+
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg error rendering {segment_path}: {e.stderr.decode() if e.stderr else 'Unknown error'}")
+        raise
+    return output_path
+
+
+def concat_segments(segment_paths, audio_source, output_path, work_dir):
+    """
+    Join rendered segments with the concat demuxer and add the original audio
+
+    Video is stream-copied; the audio is encoded once over the whole file so
+    there are no gaps at segment boundaries.
+
+    Args:
+        segment_paths (list): Rendered segment files, in order
+        audio_source (str): File whose audio track is used
+        output_path (str): Path of the output video
+        work_dir (str): Folder for the concat list
+    """
+    list_path = os.path.join(work_dir, 'concat.txt')
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for path in segment_paths:
+            escaped = path.replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', audio_source,
+        '-map', '0:v', '-map', '1:a?',
+        '-c:v', 'copy', '-c:a', 'aac',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    subprocess.run(command, check=True, capture_output=True)
+
+
+def render_parallel(video_path, subtitles_path, output_path, style=None, max_workers=None,
+                    progress_callback=None, work_dir=None, cache_dir=None):
+    """
+    Burn subtitles into a video by rendering keyframe-aligned segments in parallel
+
+    The video stream is cut at keyframes by stream copy, each segment is
+    encoded by its own FFmpeg process with a subtitle file shifted to the
+    segment start, and the results are joined with the concat demuxer. The
+    output has the same frame count and frame timing as a single-pass
+    render, but not identical pixels: each segment is encoded with its own
+    rate control and keyframe placement.
+
+    With a cache_dir, source segments and rendered segments are kept between
+    renders. Rendered segments are keyed by their range, the cues overlapping
+    them and the style, so after a small edit only the touched segments are
+    encoded again and the rest are reassembled by stream copy.
+
+    Args:
+        video_path (str): Path to the input video
+        subtitles_path (str): Path to the SRT subtitles file
+        output_path (str): Path where the output video will be saved
+        style (dict): Style options accepted by embed_subtitles
+        max_workers (int): Number of concurrent encoders
+        progress_callback (callable): Called with the rendered fraction (0.0 to 1.0)
+        work_dir (str): Folder for intermediate files (a temporary folder by default)
+        cache_dir (str): Folder keeping segments between renders (no caching if None)
+
+    Returns:
+        bool: True on success
+    """
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    threads = max(1, (os.cpu_count() or 1) // max_workers)
+    style = style or {}
+    font = style.get('font', DEFAULT_FONT)
+
+    owns_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='render_', dir=os.path.dirname(output_path) or None)
+    os.makedirs(work_dir, exist_ok=True)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+
+    try:
+        duration = get_video_info(video_path)['duration']
+        segment_count = max(max_workers, math.ceil(duration / SEGMENT_SECONDS)) if cache_dir else max_workers
+        cut_points = choose_cut_points(get_keyframe_times(video_path), duration, segment_count)
+        segments = _load_or_split(video_path, cut_points, work_dir, cache_dir)
+        # Each segment takes its window of the track with array operations
+        track = CueTrack.from_cues(read_srt_cues(subtitles_path))
+
+        rendered = [None] * len(segments)
+        pending = []
+        done_seconds = 0.0
+        for i, (segment_path, start, end) in enumerate(segments):
+            segment_subtitles = os.path.join(work_dir, f"subtitles_{i:03d}.ass")
+            window = track.window(int(round(start * 1000)), int(round(end * 1000)))
+            write_ass(window.to_cues(), segment_subtitles, **style)
+
+            if cache_dir:
+                key = segment_cache_key(segment_path, start, end, segment_subtitles)
+                cached_path = os.path.join(cache_dir, f"rendered-{key}.mkv")
+                if os.path.exists(cached_path):
+                    rendered[i] = cached_path
+                    done_seconds += end - start
+                    continue
+                target_path = cached_path
+            else:
+                target_path = os.path.join(work_dir, f"rendered_{i:03d}.mkv")
+
+            pending.append((i, segment_path, segment_subtitles, target_path))
+
+        # Check the filter graph on one frame before starting the encoders
+        if pending:
+            _, segment_path, segment_subtitles, _ = pending[0]
+            preflight_filter(segment_path, ass_filter(segment_subtitles, font))
+
+        logger.info(f"Rendering {duration:.1f}s of video: {len(pending)} of {len(segments)} segments "
+                    f"to encode with {max_workers} encoders x {threads} threads")
+        if progress_callback and duration:
+            progress_callback(min(done_seconds / duration, 1.0))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+            for i, segment_path, segment_subtitles, target_path in pending:
+                # Encode next to the target and rename, so the cache never
+                # holds a partial segment
+                temp_path = os.path.join(work_dir, f"rendered_{i:03d}.tmp.mkv")
+                future = executor.submit(
+                    _render_segment, segment_path, ass_filter(segment_subtitles, font), temp_path, threads
+                )
+                futures[future] = (i, temp_path, target_path)
+
+            for future in as_completed(futures):
+                i, temp_path, target_path = futures[future]
+                future.result()
+                os.replace(temp_path, target_path)
+                rendered[i] = target_path
+
+                done_seconds += segments[i][2] - segments[i][1]
+                if progress_callback and duration:
+                    progress_callback(min(done_seconds / duration, 1.0))
+
+        concat_segments(rendered, video_path, output_path, work_dir)
+        logger.info(f"Successfully rendered {output_path} from {len(segments)} segments")
+
+        if cache_dir:
+            keep = {os.path.basename(path) for path in rendered}
+            keep.add(os.path.basename(os.path.dirname(segments[0][0])))
+            prune_render_cache(cache_dir, keep)
+        return True
+    finally:
+        if owns_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,348 @@
+import os
+import re
+import wave
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from utils.model_registry import get_whisper_model
+from utils.transcription_settings import get_transcription_settings, decode_options
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Target length of each chunk transcribed by a worker process
+DEFAULT_CHUNK_SECONDS = float(os.environ.get('TRANSCRIBE_CHUNK_SECONDS', '300'))
+
+# Number of worker processes; each one gets an equal share of the CPU threads
+DEFAULT_MAX_WORKERS = int(os.environ.get('TRANSCRIBE_WORKERS', str(max(1, (os.cpu_count() or 1) // 4))))
+
+# 'auto' parallelizes audio longer than two chunks, '1' always, '0' never
+PARALLEL_MODE = os.environ.get('TRANSCRIBE_PARALLEL', 'auto')
+
+# Audio included before each chunk boundary so words cut by the split are
+# transcribed in full by the following chunk
+OVERLAP_SECONDS = 1.0
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def get_audio_duration(audio):
+    """
+    Return the duration of the audio in seconds, or None if unknown
+
+    Args:
+        audio (str or numpy.ndarray): Path to a WAV file, or 16 kHz mono float32 samples
+
+    Returns:
+        float or None: Duration in seconds
+    """
+    if isinstance(audio, np.ndarray):
+        return len(audio) / SAMPLE_RATE
+
+    if isinstance(audio, str) and audio.lower().endswith('.wav'):
+        try:
+            with wave.open(audio, 'rb') as wav_file:
+                return wav_file.getnframes() / float(wav_file.getframerate())
+        except Exception as e:
+            logger.warning(f"Could not read WAV duration of {audio}: {str(e)}")
+
+    return None
+
+
+def should_parallelize(audio, chunk_seconds=None):
+    """
+    Decide whether the audio is long enough for parallel chunked transcription
+
+    Args:
+        audio (str or numpy.ndarray): Path to the audio file, or 16 kHz mono float32 samples
+        chunk_seconds (float): Target chunk length
+
+    Returns:
+        bool: True if the audio should be transcribed in parallel
+    """
+    if PARALLEL_MODE == '0':
+        return False
+    if PARALLEL_MODE == '1':
+        return True
+
+    if DEFAULT_MAX_WORKERS < 2:
+        return False
+
+    duration = get_audio_duration(audio)
+    chunk_seconds = chunk_seconds or DEFAULT_CHUNK_SECONDS
+    return duration is not None and duration >= 2 * chunk_seconds
+
+
+def find_split_points(audio, chunk_seconds, search_seconds=10.0, frame_seconds=0.03, sample_rate=SAMPLE_RATE):
+    """
+    Find sample positions to split the audio at, preferring silence
+
+    For every multiple of chunk_seconds, the quietest point within
+    search_seconds of it is chosen, so cuts land in pauses between words.
+
+    Args:
+        audio (numpy.ndarray): Mono float32 samples
+        chunk_seconds (float): Target chunk length
+        search_seconds (float): How far from the target to look for silence
+        frame_seconds (float): Length of the frames energy is measured over
+        sample_rate (int): Sample rate in Hz
+
+    Returns:
+        list: Sample indices to split at, in increasing order
+    """
+    frame = max(1, int(frame_seconds * sample_rate))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+
+    # Frame RMS energy, smoothed over ~300 ms so cuts land in real pauses
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy = np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1))
+    window = max(1, int(0.3 / frame_seconds))
+    smoothed = np.convolve(energy, np.ones(window, dtype=np.float32) / window, mode='same')
+
+    total_seconds = len(audio) / sample_rate
+    splits = []
+    last_frame = 0
+    target = chunk_seconds
+
+    # Leave at least half a chunk for the last piece
+    while target < total_seconds - chunk_seconds / 2:
+        lo = max(last_frame + 1, int((target - search_seconds) / frame_seconds))
+        hi = min(n_frames, int((target + search_seconds) / frame_seconds))
+        if hi <= lo:
+            break
+
+        # Among the quietest frames, cut at the one closest to the target
+        window_energy = smoothed[lo:hi]
+        quiet = np.flatnonzero(window_energy <= window_energy.min() * 1.05 + 1e-6)
+        target_frame = int(target / frame_seconds) - lo
+        best = lo + int(quiet[np.argmin(np.abs(quiet - target_frame))])
+        split_sample = best * frame + frame // 2
+        splits.append(split_sample)
+
+        last_frame = best
+        target = split_sample / sample_rate + chunk_seconds
+
+    return splits
+
+
+def _normalize_word(word):
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def strip_repeated_words(previous_text, next_text, max_words=8):
+    """
+    Remove words at the start of next_text that repeat the end of previous_text
+
+    Args:
+        previous_text (str): Text of the last segment before a chunk boundary
+        next_text (str): Text of the first segment after the boundary
+        max_words (int): Longest repeated run to look for
+
+    Returns:
+        str: next_text without the repeated leading words
+    """
+    previous_words = [_normalize_word(w) for w in previous_text.split()]
+    next_words = next_text.split()
+    next_normalized = [_normalize_word(w) for w in next_words]
+
+    for k in range(min(max_words, len(previous_words), len(next_words)), 0, -1):
+        if previous_words[-k:] == next_normalized[:k]:
+            return ' '.join(next_words[k:])
+
+    return next_text
+
+
+def merge_chunk_segments(chunk_results, boundary_tolerance=1.0):
+    """
+    Merge per-chunk segments onto one timeline, deduplicating boundary words
+
+    Args:
+        chunk_results (list): One list of segments per chunk, in chunk order,
+            with timestamps already offset onto the global timeline
+        boundary_tolerance (float): Segments starting within this many seconds
+            of the previous segment's end are checked for repeated words
+
+    Returns:
+        list: Merged segments
+    """
+    merged = []
+
+    for segments in chunk_results:
+        segments = list(segments)
+
+        if merged and segments:
+            previous = merged[-1]
+            first = segments[0]
+
+            if first['start'] < previous['end'] + boundary_tolerance:
+                text = strip_repeated_words(previous['text'], first['text'])
+                if text.strip():
+                    segments[0] = dict(first, text=text)
+                    # Drop the timings of the repeated words too
+                    removed = len(first['text'].split()) - len(text.split())
+                    if removed and first.get('words'):
+                        segments[0]['words'] = first['words'][removed:]
+                else:
+                    segments = segments[1:]
+
+        for segment in segments:
+            # Keep the timeline monotonic across chunk boundaries
+            if merged and segment['start'] < merged[-1]['end']:
+                segment = dict(segment, start=min(merged[-1]['end'], segment['end']))
+            merged.append(segment)
+
+    return merged
+
+
+def _get_pool(max_workers):
+    """Return the shared process pool, recreating it if the size changed"""
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is None or _pool_workers != max_workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # Spawn instead of fork: the parent has running threads and a
+            # loaded model that must not be copied mid-operation
+            context = multiprocessing.get_context('spawn')
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+            _pool_workers = max_workers
+        return _pool
+
+
+def _reset_pool():
+    global _pool, _pool_workers
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+        _pool_workers = 0
+
+
+def _detect_language(audio_head, model_name, compute_type, cpu_threads):
+    """Detect the spoken language from the first seconds of audio (worker process)"""
+    model = get_whisper_model(model_name, compute_type=compute_type, device='cpu', cpu_threads=cpu_threads,
+                              num_workers=1)
+    # transcribe() detects the language eagerly and decodes segments lazily,
+    # so discarding the generator skips the actual decoding
+    _, info = model.transcribe(audio_head, beam_size=1)
+    return info.language, info.language_probability
+
+
+def _transcribe_chunk(audio_chunk, offset, owned_start, owned_end, model_name, compute_type,
+                      cpu_threads, decode, language):
+    """Transcribe one chunk and return its segments on the global timeline (worker process)"""
+    model = get_whisper_model(model_name, compute_type=compute_type, device='cpu', cpu_threads=cpu_threads,
+                              num_workers=1)
+    segments, _ = model.transcribe(audio_chunk, language=language, word_timestamps=True, **decode)
+
+    result = []
+    for segment in segments:
+        start = segment.start + offset
+        end = segment.end + offset
+
+        # Segments centred in the overlap belong to the previous chunk
+        if (start + end) / 2 < owned_start or start >= owned_end:
+            continue
+
+        words = [[word.start + offset, word.end + offset, word.word] for word in (segment.words or [])]
+        result.append({'start': start, 'end': end, 'text': segment.text, 'words': words})
+
+    return result
+
+
+def transcribe_parallel(audio, model_name="base", chunk_seconds=None, max_workers=None,
+                        progress_callback=None, settings=None, overlap_seconds=OVERLAP_SECONDS):
+    """
+    Transcribe long audio by splitting it at silence and running the chunks
+    in parallel worker processes
+
+    Args:
+        audio (str or numpy.ndarray): Path to the audio file, or 16 kHz mono float32 samples
+        model_name (str): Whisper model to use ("tiny", "base", "small", "medium")
+        chunk_seconds (float): Target chunk length
+        max_workers (int): Number of worker processes
+        progress_callback (callable): Called with the transcribed fraction (0.0 to 1.0)
+        settings (dict): Transcription settings (see utils.transcription_settings);
+            the CPU cores are shared between the worker processes, so only the
+            compute type, beam size and VAD settings apply
+        overlap_seconds (float): Audio included before each chunk boundary
+
+    Returns:
+        tuple: (segments, info) in the same format as transcribe_audio
+    """
+    if isinstance(audio, str):
+        from faster_whisper.audio import decode_audio
+        audio = decode_audio(audio, sampling_rate=SAMPLE_RATE)
+
+    settings = settings or get_transcription_settings(model_name)
+    compute_type = settings['compute_type']
+    decode = decode_options(settings)
+    chunk_seconds = chunk_seconds or DEFAULT_CHUNK_SECONDS
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    cpu_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    total_seconds = len(audio) / SAMPLE_RATE
+
+    boundaries = [0] + find_split_points(audio, chunk_seconds) + [len(audio)]
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+
+    logger.info(f"Transcribing {total_seconds:.1f}s of audio in {len(boundaries) - 1} chunks "
+                f"with {max_workers} workers x {cpu_threads} threads")
+
+    pool = _get_pool(max_workers)
+    try:
+        # Detect the language once so every chunk decodes with the same one
+        language, language_probability = pool.submit(
+            _detect_language, audio[:30 * SAMPLE_RATE], model_name, compute_type, cpu_threads
+        ).result()
+        logger.info(f"Detected language: {language} with probability {language_probability:.2f}")
+
+        futures = {}
+        for i in range(len(boundaries) - 1):
+            owned_start = boundaries[i]
+            owned_end = boundaries[i + 1]
+            chunk_start = max(0, owned_start - overlap) if i > 0 else 0
+
+            future = pool.submit(
+                _transcribe_chunk,
+                audio[chunk_start:owned_end],
+                chunk_start / SAMPLE_RATE,
+                owned_start / SAMPLE_RATE,
+                owned_end / SAMPLE_RATE,
+                model_name,
+                compute_type,
+                cpu_threads,
+                decode,
+                language
+            )
+            futures[future] = i
+
+        chunk_results = [None] * len(futures)
+        done_seconds = 0.0
+        for future in as_completed(futures):
+            i = futures[future]
+            chunk_results[i] = future.result()
+
+            done_seconds += (boundaries[i + 1] - boundaries[i]) / SAMPLE_RATE
+            if progress_callback and total_seconds:
+                progress_callback(done_seconds / total_seconds)
+    except Exception:
+        # A crashed worker leaves the pool unusable; start fresh next time
+        _reset_pool()
+        raise
+
+    segments = merge_chunk_segments(chunk_results)
+
+    return segments, {
+        'language': language,
+        'language_probability': language_probability,
+        'duration': total_seconds
+    }
@@ -0,0 +1,277 @@
+import os
+import logging
+import shutil
+import time
+from utils.video_processor import (
+    extract_audio, extract_audio_array, get_video_info, embed_subtitles, mux_subtitles,
+    embed_subtitles_hls, remux_hls
+)
+from utils.model_registry import warm_up_models
+from utils.parallel_render import should_render_parallel, render_parallel
+from utils.subtitle_generator import (
+    transcribe_audio, segments_to_subtitles, write_srt, generate_google_subtitles,
+    ensure_audio_file, srt_to_dict, detect_subtitle_language, translate_subtitles
+)
+from utils.transcript_cache import get_transcript_cache, file_hash, audio_fingerprint
+from utils.transcription_settings import get_transcription_settings
+from utils.segmenter import words_from_segments, save_word_index, resegment, WORD_INDEX_FILENAME
+
+logger = logging.getLogger(__name__)
+
+# Stages reported by the upload and render jobs, in order
+UPLOAD_STAGES = ['extracting_audio', 'transcribing', 'probing', 'detecting_language', 'translating']
+RENDER_STAGES = ['rendering']
+
+# How subtitles end up in the output: burned into the picture, or muxed as a
+# soft subtitle track (stream copy) in an MP4 or MKV container. 'progressive'
+# burns them in while writing HLS segments that can be watched during the
+# render, then remuxes the segments into the MP4
+OUTPUT_MODES = {
+    'burn': None,
+    'progressive': '.mp4',
+    'soft_mp4': '.mp4',
+    'soft_mkv': '.mkv'
+}
+
+
+# Decode audio straight into memory instead of writing audio.wav
+STREAM_AUDIO = os.environ.get('STREAM_AUDIO', '1') != '0'
+
+# Keep rendered segments between renders of the same session
+RENDER_CACHE = os.environ.get('RENDER_CACHE', '1') != '0'
+
+
+def process_upload(job, video_path, session_folder, whisper_model="base", target_language='pt-br',
+                   stream_audio=STREAM_AUDIO, audio=None):
+    """
+    Run the full upload pipeline: audio extraction, transcription, probing,
+    language detection and translation
+
+    Args:
+        job (Job): Job used to report stage and progress
+        video_path (str): Path to the uploaded video
+        session_folder (str): Folder where intermediate files are written
+        whisper_model (str): Whisper model to use ("tiny", "base", "small", "medium")
+        target_language (str): Language the subtitles are translated to
+        stream_audio (bool): Pipe FFmpeg's PCM output directly into Whisper
+            instead of writing an intermediate WAV file
+        audio (numpy.ndarray): Audio already decoded while the file was
+            uploaded (see ingest_upload); extraction is skipped if given
+
+    Returns:
+        dict: Paths, video info and subtitles produced by the pipeline
+    """
+    cache = get_transcript_cache()
+    # Resolved once, so the transcript is cached under the settings it was made with
+    settings = get_transcription_settings(whisper_model)
+    subtitles_path = os.path.join(session_folder, 'subtitles.srt')
+    audio_path = None
+
+    # An identical upload hits the cache before any audio is decoded
+    content_hash = file_hash(video_path) if cache else None
+    cached = cache.get_by_file(content_hash, whisper_model, settings) if cache else None
+    video_info = cached['video_info'] if cached is not None else None
+
+    if cached is None:
+        # Start loading the model so it overlaps with audio decoding
+        warm_up_models([whisper_model], background=True)
+
+        # Extract audio from the video
+        job.set_stage('extracting_audio', 'Extracting audio from the video')
+        if audio is not None:
+            logger.info(f"Using audio decoded during the upload of {video_path}")
+        elif stream_audio:
+            audio = extract_audio_array(video_path)
+        else:
+            audio_path = os.path.join(session_folder, 'audio.wav')
+            extract_audio(video_path, audio_path)
+            audio = audio_path
+
+        # Remuxed copies of a video decode to the same audio; only the
+        # transcript is shared, the container of this file is probed
+        fingerprint = audio_fingerprint(audio) if cache else None
+        cached = cache.get(fingerprint, whisper_model, settings) if cache else None
+        if cached is not None:
+            video_info = get_video_info(video_path)
+            cache.add_alias(content_hash, fingerprint, video_info)
+
+    if cached is not None:
+        logger.info(f"Reusing cached transcript for {video_path}")
+        job.set_stage('transcribing', 'Reusing a previous transcript of this video')
+        segments = cached['segments']
+        write_srt(segments_to_subtitles(segments), subtitles_path)
+    else:
+        # Generate subtitles using Whisper for better accuracy
+        job.set_stage('transcribing', 'Transcribing audio with Whisper')
+        logger.info(f"Using Whisper {whisper_model} model for transcription")
+        try:
+            segments, info = transcribe_audio(audio, model_name=whisper_model, progress_callback=job.set_progress,
+                                              settings=settings)
+        except Exception as e:
+            logger.error(f"Error generating Whisper subtitles: {str(e)}")
+            logger.warning("Falling back to Google Speech Recognition")
+            segments = None
+            generate_google_subtitles(ensure_audio_file(audio, subtitles_path), subtitles_path)
+
+        # Get video info
+        job.set_stage('probing', 'Reading video information')
+        video_info = get_video_info(video_path)
+
+        if segments is not None:
+            write_srt(segments_to_subtitles(segments), subtitles_path)
+            if cache:
+                try:
+                    cache.put(fingerprint, whisper_model, segments, info['language'], video_info,
+                              content_hash=content_hash, settings=settings)
+                except Exception as e:
+                    logger.error(f"Error storing transcript in cache: {str(e)}")
+
+    # Keep the word timings so cues can be split again after editing
+    words = words_from_segments(segments) if segments is not None else None
+    if words is not None:
+        try:
+            save_word_index(words, os.path.join(session_folder, WORD_INDEX_FILENAME))
+        except OSError as e:
+            logger.error(f"Error saving word index: {str(e)}")
+    
+    # Read SRT file and convert to JSON for editing
+    subtitles_dict = srt_to_dict(subtitles_path)
+
+    # Detect the language of the subtitles
+    job.set_stage('detecting_language', 'Detecting subtitle language')
+    language_code = detect_subtitle_language(subtitles_dict)
+    logger.info(f"Detected subtitle language: {language_code}")
+
+    # Always translate to Brazilian Portuguese (pt-br) regardless of the source language
+    job.set_stage('translating', f'Translating detected {language_code} speech to {target_language}')
+    subtitles_dict = translate_subtitles(subtitles_dict, target_language=target_language)
+
+    # Translations are often longer than the speech they replace; split the
+    # long ones over the speech in their window
+    subtitles_dict = resegment(subtitles_dict, words)
+
+    # Save the translated subtitles back to the SRT file
+    write_srt(subtitles_dict, subtitles_path)
+
+    return {
+        'audio_path': audio_path,
+        'subtitles_path': subtitles_path,
+        'video_info': video_info,
+        'language': language_code,
+        'subtitles': subtitles_dict
+    }
+
+
+def output_path_for_mode(output_path, output_mode):
+    """
+    Return the output path with the extension required by the output mode
+
+    Args:
+        output_path (str): Requested output path
+        output_mode (str): One of OUTPUT_MODES
+    """
+    extension = OUTPUT_MODES.get(output_mode)
+    if extension is None:
+        return output_path
+    return os.path.splitext(output_path)[0] + extension
+
+
+def burn_subtitles(job, video_path, subtitles_path, output_path, style):
+    """
+    Burn subtitles in, rendering long videos as parallel segments
+
+    Rendered segments are cached in a render_cache folder next to the output,
+    so regenerating after an edit only re-encodes the segments it touched.
+    """
+    cache_dir = os.path.join(os.path.dirname(output_path), 'render_cache') if RENDER_CACHE else None
+
+    if should_render_parallel(get_video_info(video_path)['duration'], incremental=bool(cache_dir)):
+        try:
+            render_parallel(video_path, subtitles_path, output_path, style,
+                            progress_callback=job.set_progress, cache_dir=cache_dir)
+            return
+        except Exception as e:
+            logger.warning(f"Parallel render failed, falling back to a single pass: {str(e)}")
+
+    embed_subtitles(video_path, subtitles_path, output_path, **style)
+
+
+def stream_dir_for(output_path):
+    """Folder holding the HLS playlist and segments of a progressive render"""
+    return os.path.join(os.path.dirname(output_path), 'stream')
+
+
+def burn_progressive(job, video_path, subtitles_path, output_path, style):
+    """
+    Burn subtitles in as HLS segments, then remux them into the output MP4
+
+    The playlist's location (relative to the output folder) is published in
+    the job details once its first segment exists, so the browser can start
+    playing while the rest is encoded.
+    """
+    stream_dir = stream_dir_for(output_path)
+    shutil.rmtree(stream_dir, ignore_errors=True)
+    os.makedirs(stream_dir)
+    playlist_path = os.path.join(stream_dir, 'playlist.m3u8')
+    playlist_name = os.path.relpath(playlist_path, os.path.dirname(output_path)).replace(os.sep, '/')
+
+    def progress(fraction):
+        if 'playlist' not in job.details and os.path.exists(playlist_path):
+            job.set_detail('playlist', playlist_name)
+        job.set_progress(fraction)
+
+    started = time.perf_counter()
+    embed_subtitles_hls(video_path, subtitles_path, playlist_path, progress_callback=progress, **style)
+    job.set_detail('playlist', playlist_name)
+    logger.info(f"Streamed all segments in {time.perf_counter() - started:.1f}s")
+
+    job.set_stage('rendering', 'Joining the segments into an MP4 file')
+    remux_hls(playlist_path, output_path)
+
+
+def render_video(job, video_path, subtitles_path, output_path, style, output_mode='burn'):
+    """
+    Render the output video with subtitles
+
+    Args:
+        job (Job): Job used to report stage and progress
+        video_path (str): Path to the input video
+        subtitles_path (str): Path to the SRT subtitles file
+        output_path (str): Path where the output video will be saved
+        style (dict): Keyword arguments passed to embed_subtitles
+        output_mode (str): 'burn' to re-encode with the subtitles in the picture,
+            'progressive' to do so while writing HLS segments that can be
+            watched during the render, 'soft_mp4' or 'soft_mkv' to add a
+            subtitle track without re-encoding (style is not applied;
+            output_path gets the container's extension)
+
+    Returns:
+        dict: Output path and filename
+    """
+    logger.info(f"Generating video with subtitles from {video_path} to {output_path} ({output_mode})")
+
+    try:
+        if output_mode == 'progressive':
+            job.set_stage('rendering', 'Embedding subtitles; the preview starts with the first segments')
+            output_path = output_path_for_mode(output_path, output_mode)
+            burn_progressive(job, video_path, subtitles_path, output_path, style)
+        elif output_mode in OUTPUT_MODES and output_mode != 'burn':
+            job.set_stage('rendering', 'Adding the subtitle track to the video')
+            output_path = output_path_for_mode(output_path, output_mode)
+            mux_subtitles(video_path, subtitles_path, output_path)
+        else:
+            job.set_stage('rendering', 'Embedding subtitles into the video')
+            burn_subtitles(job, video_path, subtitles_path, output_path, style)
+    except Exception as e:
+        logger.error(f"Error in embed_subtitles: {str(e)}")
+        logger.error(f"Video path exists: {os.path.exists(video_path)}")
+        logger.error(f"Subtitles path exists: {os.path.exists(subtitles_path)}")
+        logger.error(f"Output directory exists: {os.path.exists(os.path.dirname(output_path))}")
+        raise
+
+    logger.info(f"Successfully generated video with subtitles: {output_path}")
+
+    return {
+        'output_path': output_path,
+        'output_filename': os.path.basename(output_path)
+    }
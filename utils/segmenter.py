@@ -0,0 +1,286 @@
+import os
+import re
+import json
+import bisect
+import logging
+from utils.subtitle_formats import format_timestamp, parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Longest cue, in characters (cues are single lines)
+MAX_CHARS = int(os.environ.get('SUBTITLE_MAX_CHARS', '35'))
+
+# Fastest reading speed, in characters per second; faster cues are held
+# on screen longer, into the pause that follows them
+MAX_CPS = float(os.environ.get('SUBTITLE_MAX_CPS', '17'))
+
+MIN_DURATION_MS = 700
+MAX_DURATION_MS = 7000
+
+# A pause this long between two words always starts a new cue
+MAX_GAP_MS = 700
+
+# Time left between a cue and the next one when a cue is extended
+MIN_GAP_MS = 40
+
+# Word timings of a session, written next to subtitles.srt
+WORD_INDEX_FILENAME = 'words.json'
+
+SENTENCE_END = ('.', '!', '?', '…', '。', '？', '！')
+
+
+def _normalize(text):
+    return re.sub(r'[^\w]', '', text.lower())
+
+
+def estimate_words(start_ms, end_ms, text):
+    """
+    Spread the words of a text over a time span in proportion to their length
+
+    Used for segments without word timestamps (Google Speech Recognition,
+    transcripts cached before word timestamps were recorded).
+
+    Args:
+        start_ms (int): Start of the span
+        end_ms (int): End of the span
+        text (str): Text spoken in the span
+
+    Returns:
+        list: (start_ms, end_ms, word) tuples
+    """
+    tokens = text.split()
+    if not tokens:
+        return []
+
+    total = sum(len(token) + 1 for token in tokens)
+    duration = max(0, end_ms - start_ms)
+    words = []
+    position = 0
+    for token in tokens:
+        word_start = start_ms + duration * position // total
+        position += len(token) + 1
+        words.append((word_start, start_ms + duration * position // total, token))
+    return words
+
+
+def words_from_segments(segments):
+    """
+    Flatten transcription segments into one list of timed words
+
+    Args:
+        segments (list): Dicts with 'start', 'end' (seconds) and 'text', and
+            'words' as [start, end, word] lists when Whisper produced them
+
+    Returns:
+        list: (start_ms, end_ms, word) tuples in time order
+    """
+    words = []
+    for segment in segments:
+        segment_words = segment.get('words')
+        if segment_words:
+            for start, end, word in segment_words:
+                word = word.strip()
+                if word:
+                    words.append((int(round(start * 1000)), int(round(end * 1000)), word))
+        else:
+            text = segment['text'].replace('\n', ' ').replace('\r', '')
+            words.extend(estimate_words(int(round(segment['start'] * 1000)),
+                                        int(round(segment['end'] * 1000)), text))
+    return words
+
+
+def segment_words(words, max_chars=MAX_CHARS, max_cps=MAX_CPS, min_duration_ms=MIN_DURATION_MS,
+                  max_duration_ms=MAX_DURATION_MS, max_gap_ms=MAX_GAP_MS, min_gap_ms=MIN_GAP_MS,
+                  end_limit_ms=None):
+    """
+    Group timed words into single-line cues in one pass
+
+    A cue ends before the word that would take it past max_chars or
+    max_duration_ms, at a pause longer than max_gap_ms, and after a word
+    ending a sentence once the cue is a third full. Every cue starts on its
+    first word and ends on its last, then is held longer if it is shorter
+    than min_duration_ms or reads faster than max_cps, without running
+    into the next cue.
+
+    Args:
+        words (iterable): (start_ms, end_ms, word) tuples in time order
+        max_chars (int): Longest cue in characters
+        max_cps (float): Fastest reading speed in characters per second
+        min_duration_ms (int): Shortest time a cue stays on screen
+        max_duration_ms (int): Longest time a cue stays on screen
+        max_gap_ms (int): Pause that always starts a new cue
+        min_gap_ms (int): Time kept free before the next cue when extending
+        end_limit_ms (int): Time the last cue may not be extended past
+
+    Returns:
+        list: Subtitle dictionaries with 'index', 'start', 'end' and 'text'
+    """
+    cues = []
+    current = []
+    length = 0
+    previous_end = 0
+
+    def close(next_start):
+        nonlocal previous_end
+        text = ' '.join(word for _, _, word in current)
+        start = max(current[0][0], previous_end)
+        end = max(current[-1][1], start)
+
+        needed = max(min_duration_ms, int(len(text) * 1000 / max_cps) if max_cps else 0)
+        if end - start < needed:
+            limit = start + needed
+            if next_start is not None:
+                limit = min(limit, next_start - min_gap_ms)
+            end = max(end, limit)
+
+        cues.append({
+            'index': len(cues) + 1,
+            'start': format_timestamp(start),
+            'end': format_timestamp(end),
+            'text': text
+        })
+        previous_end = end
+
+    for start, end, word in words:
+        if current:
+            _, last_end, last_word = current[-1]
+            if (length + 1 + len(word) > max_chars
+                    or start - last_end > max_gap_ms
+                    or end - current[0][0] > max_duration_ms
+                    or (last_word.endswith(SENTENCE_END) and length >= max_chars // 3)):
+                close(start)
+                current = []
+                length = 0
+
+        current.append((start, end, word))
+        length += len(word) + (1 if length else 0)
+
+    if current:
+        close(end_limit_ms)
+
+    return cues
+
+
+def segments_to_cues(segments, **limits):
+    """
+    Build cues from transcription segments, using word timestamps where present
+
+    Args:
+        segments (list): Transcription segments (see words_from_segments)
+        **limits: Limits accepted by segment_words
+
+    Returns:
+        list: Subtitle dictionaries
+    """
+    return segment_words(words_from_segments(segments), **limits)
+
+
+def _speech_time(spans, offset):
+    """Time at which `offset` ms of speech have elapsed within merged spans"""
+    for start, end in spans:
+        if offset <= end - start:
+            return start + offset
+        offset -= end - start
+    return spans[-1][1]
+
+
+def resegment(subtitles, word_index, max_chars=MAX_CHARS, **limits):
+    """
+    Split cues longer than max_chars again, timing the pieces from the word index
+
+    A cue whose text still matches the words transcribed in its window is
+    split at those words' real timings. Edited or translated text is spread
+    over the speech in the window in proportion to its length, skipping the
+    pauses between words, so no re-transcription is needed either way.
+    Cues within the limit are kept as they are.
+
+    Args:
+        subtitles (list): Subtitle dictionaries with SRT time codes
+        word_index (list): (start_ms, end_ms, word) tuples in time order, or
+            None to spread text evenly over each cue
+        max_chars (int): Longest cue in characters
+        **limits: Other limits accepted by segment_words
+
+    Returns:
+        list: Subtitle dictionaries numbered from 1
+    """
+    word_index = word_index or []
+    starts = [word[0] for word in word_index]
+    result = []
+
+    for subtitle in subtitles:
+        text = ' '.join((subtitle.get('text') or '').split())
+        if len(text) <= max_chars:
+            result.append(dict(subtitle, text=text))
+            continue
+
+        cue_start = parse_timestamp(subtitle['start'])
+        cue_end = max(parse_timestamp(subtitle['end']), cue_start)
+
+        # Words whose middle falls inside the cue
+        first = bisect.bisect_left(starts, cue_start - MAX_DURATION_MS)
+        last = bisect.bisect_left(starts, cue_end)
+        window = [word for word in word_index[first:last] if cue_start <= (word[0] + word[1]) // 2 < cue_end]
+
+        if window and _normalize(''.join(word for _, _, word in window)) == _normalize(text):
+            words = [(max(start, cue_start), min(end, cue_end), word) for start, end, word in window]
+        else:
+            spans = []
+            for start, end, _ in window:
+                start, end = max(start, cue_start), min(end, cue_end)
+                if spans and start <= spans[-1][1]:
+                    spans[-1][1] = max(spans[-1][1], end)
+                elif end > start:
+                    spans.append([start, end])
+            if not spans:
+                spans = [[cue_start, cue_end]]
+
+            # Lay the text out over the speech only, then map it back to the clock
+            speech = sum(end - start for start, end in spans)
+            words = [(_speech_time(spans, start), _speech_time(spans, end), word)
+                     for start, end, word in estimate_words(0, speech, text)]
+
+        pieces = segment_words(words, max_chars=max_chars, end_limit_ms=cue_end, **limits)
+        # The pieces cover the same time as the cue they replace
+        pieces[0]['start'] = subtitle['start']
+        pieces[-1]['end'] = subtitle['end']
+        result.extend(pieces)
+
+    for index, subtitle in enumerate(result, 1):
+        subtitle['index'] = index
+    return result
+
+
+def save_word_index(words, path):
+    """
+    Save timed words so cues can be split again without transcribing
+
+    Args:
+        words (list): (start_ms, end_ms, word) tuples
+        path (str): Path of the JSON file
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump([list(word) for word in words], f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+    logger.info(f"Saved {len(words)} timed words to {path}")
+
+
+def load_word_index(path):
+    """
+    Load timed words saved by save_word_index
+
+    Args:
+        path (str): Path of the JSON file
+
+    Returns:
+        list or None: (start_ms, end_ms, word) tuples, or None if there is no index
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [tuple(word) for word in json.load(f)]
+    except FileNotFoundError:
+        return None
+    except (ValueError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable word index {path}: {str(e)}")
+        return None
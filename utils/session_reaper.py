@@ -0,0 +1,200 @@
+import os
+import json
+import time
+import heapq
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Sessions without any request for this long are deleted
+DEFAULT_TTL_SECONDS = int(os.environ.get('SESSION_TTL_SECONDS', '3600'))
+
+# Sessions with queued or running jobs are checked again after this long
+BUSY_RETRY_SECONDS = 300
+
+# Touches write the expiry index at most this often
+PERSIST_INTERVAL = 60
+
+
+class SessionReaper:
+    """
+    Background thread that deletes expired session folders
+
+    Expiry times are kept in a min-heap, so the thread sleeps until the
+    earliest session is due instead of scanning the upload folder. Touching
+    a session only updates a dictionary; the heap entry is refreshed lazily
+    when it comes due. Expiry times are saved to a JSON index so restarts
+    keep them.
+    """
+
+    def __init__(self, upload_folder, index_path=None, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 is_busy=None, on_expire=None):
+        """
+        Args:
+            upload_folder (str): Folder holding one subfolder per session
+            index_path (str): Path to the expiry index (defaults to sessions-index.json
+                in the upload folder)
+            ttl_seconds (int): Idle time after which a session expires
+            is_busy (callable): Called with a session ID; sessions for which it
+                returns True are never deleted
+            on_expire (callable): Called with the session ID after its folder is deleted
+        """
+        self.upload_folder = upload_folder
+        self.index_path = index_path or os.path.join(upload_folder, 'sessions-index.json')
+        self.ttl_seconds = ttl_seconds
+        self.is_busy = is_busy
+        self.on_expire = on_expire
+
+        self._expiry = {}
+        self._heap = []
+        self._condition = threading.Condition()
+        self._last_persist = 0
+        self._thread = None
+
+        self._load()
+
+    def _load(self):
+        """Restore expiry times from the index and adopt folders missing from it"""
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._expiry = {session_id: float(expires_at) for session_id, expires_at in json.load(f).items()}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable session index {self.index_path}: {str(e)}")
+
+        # One scan at startup picks up folders created before the index existed
+        try:
+            for folder_name in os.listdir(self.upload_folder):
+                folder_path = os.path.join(self.upload_folder, folder_name)
+                if folder_name not in self._expiry and os.path.isdir(folder_path):
+                    self._expiry[folder_name] = os.path.getmtime(folder_path) + self.ttl_seconds
+        except FileNotFoundError:
+            pass
+
+        # Forget sessions whose folder is already gone
+        self._expiry = {
+            session_id: expires_at for session_id, expires_at in self._expiry.items()
+            if os.path.isdir(os.path.join(self.upload_folder, session_id))
+        }
+        self._heap = [(expires_at, session_id) for session_id, expires_at in self._expiry.items()]
+        heapq.heapify(self._heap)
+
+    def _persist(self):
+        """Write the expiry index atomically (caller holds the condition)"""
+        try:
+            temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._expiry, f)
+            os.replace(temp_path, self.index_path)
+            self._last_persist = time.time()
+        except Exception as e:
+            logger.error(f"Error writing session index: {str(e)}")
+
+    def touch(self, session_id):
+        """
+        Push back the expiry of a session, registering it if it is new
+
+        Args:
+            session_id (str): Session ID
+        """
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+
+        with self._condition:
+            is_new = session_id not in self._expiry
+            if is_new and not os.path.isdir(os.path.join(self.upload_folder, session_id)):
+                # Stale cookie for a session that is already gone
+                return
+            self._expiry[session_id] = expires_at
+
+            if is_new:
+                heapq.heappush(self._heap, (expires_at, session_id))
+                # Wake the thread if this is now the earliest session
+                if self._heap[0][1] == session_id:
+                    self._condition.notify()
+
+            if is_new or now - self._last_persist > PERSIST_INTERVAL:
+                self._persist()
+
+    def forget(self, session_id):
+        """
+        Stop tracking a session that was removed by other means
+
+        Args:
+            session_id (str): Session ID
+        """
+        with self._condition:
+            if self._expiry.pop(session_id, None) is not None:
+                # The heap entry is skipped when it comes due
+                self._persist()
+
+    def start(self):
+        """Start the background thread (once)"""
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='session-reaper', daemon=True)
+                self._thread.start()
+
+    def _next_due(self):
+        """
+        Wait until a session is due and return its ID (caller holds the condition)
+        """
+        while True:
+            if not self._heap:
+                self._condition.wait()
+                continue
+
+            expires_at, session_id = self._heap[0]
+            current = self._expiry.get(session_id)
+            if current is None:
+                # Forgotten or already expired
+                heapq.heappop(self._heap)
+                continue
+            if current > expires_at:
+                # Touched since the entry was pushed
+                heapq.heapreplace(self._heap, (current, session_id))
+                continue
+
+            delay = expires_at - time.time()
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                return session_id
+            self._condition.wait(delay)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                session_id = self._next_due()
+
+            try:
+                self._expire(session_id)
+            except Exception as e:
+                logger.error(f"Error expiring session {session_id}: {str(e)}")
+
+    def _expire(self, session_id):
+        if self.is_busy and self.is_busy(session_id):
+            logger.info(f"Session {session_id} has active jobs, keeping it")
+            with self._condition:
+                if session_id in self._expiry:
+                    retry_at = max(self._expiry[session_id], time.time() + BUSY_RETRY_SECONDS)
+                    self._expiry[session_id] = retry_at
+                    heapq.heappush(self._heap, (retry_at, session_id))
+            return
+
+        with self._condition:
+            # The session may have been touched or forgotten since it came due
+            expires_at = self._expiry.get(session_id)
+            if expires_at is None or expires_at > time.time():
+                if expires_at is not None:
+                    heapq.heappush(self._heap, (expires_at, session_id))
+                return
+            del self._expiry[session_id]
+            self._persist()
+
+        shutil.rmtree(os.path.join(self.upload_folder, session_id), ignore_errors=True)
+        if self.on_expire:
+            self.on_expire(session_id)
+        logger.info(f"Expired session {session_id}")
@@ -0,0 +1,401 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Patches arriving within this many seconds of the previous one are merged
+# into the same journal entry, so bursts of autosaves cost a single row
+COALESCE_SECONDS = float(os.environ.get('SUBTITLE_COALESCE_SECONDS', '2'))
+
+# Journals longer than this are folded into the subtitle list on the next read
+MAX_JOURNAL_ENTRIES = 200
+
+
+def cue_key(index):
+    """Normalize a cue index so '3' and 3 refer to the same cue"""
+    try:
+        return int(index)
+    except (TypeError, ValueError):
+        return index
+
+
+def apply_patch(subtitles, ops):
+    """
+    Apply journal operations to a subtitle list
+
+    Args:
+        subtitles (list): Subtitle dictionaries, modified in place
+        ops (list): Operations, each one of
+            {'op': 'set', 'cue': {...}} to update the cue with the same index,
+            {'op': 'insert', 'after': index or None, 'cue': {...}} to insert a cue,
+            {'op': 'delete', 'index': index} to remove a cue
+
+    Returns:
+        list: The patched subtitles
+    """
+    positions = None
+
+    for op in ops:
+        if positions is None:
+            positions = {cue_key(cue['index']): i for i, cue in enumerate(subtitles)}
+
+        if op['op'] == 'set':
+            position = positions.get(cue_key(op['cue']['index']))
+            if position is not None:
+                subtitles[position] = dict(subtitles[position], **op['cue'])
+        elif op['op'] == 'insert':
+            after = op.get('after')
+            position = 0 if after is None else positions.get(cue_key(after), len(subtitles) - 1) + 1
+            subtitles.insert(position, dict(op['cue']))
+            positions = None
+        elif op['op'] == 'delete':
+            position = positions.get(cue_key(op['index']))
+            if position is not None:
+                del subtitles[position]
+                positions = None
+
+    return subtitles
+
+
+def merge_ops(ops):
+    """
+    Collapse repeated updates of the same cue, keeping the latest values
+
+    Only runs of 'set' operations are merged; inserts and deletes keep their
+    order relative to the updates around them.
+    """
+    merged = []
+    run = {}
+
+    for op in ops:
+        if op['op'] == 'set':
+            key = cue_key(op['cue']['index'])
+            if key in run:
+                previous = merged[run[key]]
+                merged[run[key]] = {'op': 'set', 'cue': dict(previous['cue'], **op['cue'])}
+                continue
+            run[key] = len(merged)
+        else:
+            run = {}
+        merged.append(op)
+
+    return merged
+
+
+class SessionStore:
+    """
+    Server-side storage for per-session state and subtitles
+
+    Only the session ID travels in the Flask cookie. The small state (paths,
+    video info, output file) and the subtitle list are kept in separate rows,
+    so routes that only need the state never deserialize the transcript.
+
+    Edits are appended to a per-session journal instead of rewriting the
+    subtitle list. Every change bumps the subtitles' revision, which callers
+    compare against the revision of the SRT file on disk to write it only
+    when it is actually needed.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path to the SQLite database file
+        """
+        self.path = path
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS subtitles (
+                    session_id TEXT PRIMARY KEY,
+                    data TEXT NOT NULL,
+                    revision INTEGER NOT NULL DEFAULT 0,
+                    next_index INTEGER NOT NULL DEFAULT 1,
+                    last_index INTEGER,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(subtitles)')}
+            if 'last_index' not in columns:
+                # Stores created before the last cue was tracked
+                conn.execute('ALTER TABLE subtitles ADD COLUMN last_index INTEGER')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS subtitle_journal (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    ops TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS subtitle_journal_session ON subtitle_journal (session_id, id)')
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        """
+        Load the state of a session
+
+        Args:
+            session_id (str): Session ID
+
+        Returns:
+            dict: Session state (empty if the session is unknown)
+        """
+        if not session_id:
+            return {}
+
+        row = self._connect().execute('SELECT state FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    def update(self, session_id, **fields):
+        """
+        Merge fields into the state of a session, creating it if needed
+
+        Args:
+            session_id (str): Session ID
+            **fields: Values to store
+
+        Returns:
+            dict: The updated state
+        """
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE serializes concurrent read-modify-write updates
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT state FROM sessions WHERE id = ?', (session_id,)).fetchone()
+            state = json.loads(row[0]) if row else {}
+            state.update(fields)
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (id, state, updated_at) VALUES (?, ?, ?)',
+                (session_id, json.dumps(state), time.time())
+            )
+        return state
+
+    def get_subtitles(self, session_id):
+        """
+        Load the subtitles of a session, with journaled edits applied
+
+        Args:
+            session_id (str): Session ID
+
+        Returns:
+            list or None: Subtitle dictionaries, or None if none were stored
+        """
+        if not session_id:
+            return None
+
+        subtitles, revision, journal_length = self._load(self._connect(), session_id)
+        if subtitles is not None and journal_length > MAX_JOURNAL_ENTRIES:
+            subtitles, _ = self.compact(session_id)
+        return subtitles
+
+    def get_revision(self, session_id):
+        """
+        Return the revision of a session's subtitles (0 if none were stored)
+
+        Args:
+            session_id (str): Session ID
+        """
+        row = self._connect().execute(
+            'SELECT revision FROM subtitles WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _load(self, conn, session_id):
+        """Return (subtitles, revision, journal length) with the journal applied"""
+        row = conn.execute(
+            'SELECT data, revision FROM subtitles WHERE session_id = ?', (session_id,)
+        ).fetchone()
+        if not row:
+            return None, 0, 0
+
+        subtitles = json.loads(row[0])
+        entries = conn.execute(
+            'SELECT ops FROM subtitle_journal WHERE session_id = ? ORDER BY id', (session_id,)
+        ).fetchall()
+        for (ops,) in entries:
+            apply_patch(subtitles, json.loads(ops))
+        return subtitles, row[1], len(entries)
+
+    def set_subtitles(self, session_id, subtitles):
+        """
+        Replace the subtitles of a session, discarding its journal
+
+        Args:
+            session_id (str): Session ID
+            subtitles (list): Subtitle dictionaries
+
+        Returns:
+            int: The new revision
+        """
+        next_index = max((cue_key(cue.get('index')) for cue in subtitles
+                          if isinstance(cue_key(cue.get('index')), int)), default=0) + 1
+        last_index = cue_key(subtitles[-1].get('index')) if subtitles else None
+
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            revision = self._revision(conn, session_id) + 1
+            conn.execute(
+                'INSERT OR REPLACE INTO subtitles (session_id, data, revision, next_index, last_index, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (session_id, json.dumps(subtitles), revision, next_index, last_index, time.time())
+            )
+            conn.execute('DELETE FROM subtitle_journal WHERE session_id = ?', (session_id,))
+        return revision
+
+    def _revision(self, conn, session_id):
+        row = conn.execute('SELECT revision FROM subtitles WHERE session_id = ?', (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def patch_subtitles(self, session_id, changed=(), inserted=(), deleted=()):
+        """
+        Record edits to individual cues in the journal
+
+        Args:
+            session_id (str): Session ID
+            changed (list): Updated cues, matched to stored cues by 'index'
+            inserted (list): New cues; each may name the cue it follows in 'after'
+                (None inserts at the start, a missing key appends at the end)
+            deleted (list): Indexes of removed cues
+
+        Returns:
+            dict: 'revision' and the 'inserted' indexes assigned to new cues,
+                or None if the session has no subtitles
+        """
+        conn = self._connect()
+        with conn:
+            # BEGIN IMMEDIATE keeps index assignment and coalescing consistent
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                'SELECT revision, next_index, last_index FROM subtitles WHERE session_id = ?', (session_id,)
+            ).fetchone()
+            if not row:
+                return None
+            # last_index is None when the list is empty or the last cue is unknown
+            revision, next_index, last_index = row
+
+            ops = [{'op': 'set', 'cue': dict(cue)} for cue in changed]
+            assigned = []
+            for cue in inserted:
+                cue = dict(cue)
+                if 'after' in cue:
+                    after = cue.pop('after')
+                    # A cue that no longer exists also appends, so anything
+                    # but the last cue leaves the end of the list unknown
+                    appended = last_index is not None and cue_key(after) == cue_key(last_index)
+                    if not appended:
+                        last_index = None
+                else:
+                    # Append after the last cue, or after the previous new one
+                    if last_index is None:
+                        last_index = self._last_index(conn, session_id, ops)
+                    after = last_index
+                    appended = True
+                cue['index'] = next_index
+                ops.append({'op': 'insert', 'after': after, 'cue': cue})
+                assigned.append(next_index)
+                if appended:
+                    last_index = next_index
+                next_index += 1
+            for index in deleted:
+                ops.append({'op': 'delete', 'index': index})
+                if last_index is not None and cue_key(index) == cue_key(last_index):
+                    # Looked up again from the list on the next append
+                    last_index = None
+
+            if not ops:
+                return {'revision': revision, 'inserted': []}
+
+            now = time.time()
+            last = conn.execute(
+                'SELECT id, ops, created_at FROM subtitle_journal WHERE session_id = ? ORDER BY id DESC LIMIT 1',
+                (session_id,)
+            ).fetchone()
+            if last and now - last[2] < COALESCE_SECONDS:
+                conn.execute(
+                    'UPDATE subtitle_journal SET ops = ?, created_at = ? WHERE id = ?',
+                    (json.dumps(merge_ops(json.loads(last[1]) + ops)), now, last[0])
+                )
+            else:
+                conn.execute(
+                    'INSERT INTO subtitle_journal (session_id, ops, created_at) VALUES (?, ?, ?)',
+                    (session_id, json.dumps(merge_ops(ops)), now)
+                )
+
+            revision += 1
+            conn.execute(
+                'UPDATE subtitles SET revision = ?, next_index = ?, last_index = ?, updated_at = ? '
+                'WHERE session_id = ?',
+                (revision, next_index, last_index, now, session_id)
+            )
+
+        return {'revision': revision, 'inserted': assigned}
+
+    def _last_index(self, conn, session_id, pending=()):
+        """
+        Index of the last cue, read from the full list with pending ops applied
+
+        Only needed when the row does not track it: after the last cue was
+        deleted or a cue was inserted before the end, and for sessions stored
+        before it was tracked.
+        """
+        subtitles, _, _ = self._load(conn, session_id)
+        if subtitles is not None and pending:
+            apply_patch(subtitles, pending)
+        return subtitles[-1]['index'] if subtitles else None
+
+    def compact(self, session_id):
+        """
+        Fold the journal into the stored subtitle list
+
+        Args:
+            session_id (str): Session ID
+
+        Returns:
+            tuple: (subtitles, revision); subtitles is None if none were stored
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            subtitles, revision, journal_length = self._load(conn, session_id)
+            if subtitles is not None and journal_length:
+                conn.execute(
+                    'UPDATE subtitles SET data = ?, updated_at = ? WHERE session_id = ?',
+                    (json.dumps(subtitles), time.time(), session_id)
+                )
+                conn.execute('DELETE FROM subtitle_journal WHERE session_id = ?', (session_id,))
+        return subtitles, revision
+
+    def delete(self, session_id):
+        """
+        Remove all data stored for a session
+
+        Args:
+            session_id (str): Session ID
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            conn.execute('DELETE FROM subtitles WHERE session_id = ?', (session_id,))
+            conn.execute('DELETE FROM subtitle_journal WHERE session_id = ?', (session_id,))
@@ -0,0 +1,195 @@
+import os
+import struct
+import logging
+import threading
+import subprocess
+from utils.video_processor import pcm_to_float
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request at a time
+CHUNK_SIZE = 1024 * 1024
+
+# Bytes of the upload inspected before deciding whether it can be streamed
+SNIFF_BYTES = 4 * 1024 * 1024
+
+# Tee streamable uploads into FFmpeg while they arrive
+STREAM_INGEST = os.environ.get('STREAM_INGEST', '1') != '0'
+
+EBML_MAGIC = b'\x1a\x45\xdf\xa3'
+
+
+def is_streamable(head):
+    """
+    Decide from the first bytes of a file whether FFmpeg can decode it from a pipe
+
+    Matroska and WebM always can. MP4 and MOV can when the moov box comes
+    before the media data (faststart) or the file is fragmented; with the
+    moov box at the end, FFmpeg needs to seek and the upload has to finish
+    first.
+
+    Args:
+        head (bytes): Beginning of the file
+
+    Returns:
+        bool or None: True or False, or None if more bytes are needed
+    """
+    if head.startswith(EBML_MAGIC):
+        return True
+
+    offset = 0
+    while offset + 8 <= len(head):
+        size, box_type = struct.unpack('>I4s', head[offset:offset + 8])
+        if offset == 0 and box_type != b'ftyp':
+            # Not an ISO media file (e.g. AVI): decode from disk
+            return False
+
+        if box_type in (b'moov', b'moof'):
+            return True
+        if box_type == b'mdat':
+            return False
+
+        if size == 1:
+            if offset + 16 > len(head):
+                return None
+            size = struct.unpack('>Q', head[offset + 8:offset + 16])[0]
+        if size < 8:
+            # Box runs to the end of the file, or the header is corrupt
+            return False
+        offset += size
+
+    return None if len(head) < SNIFF_BYTES else False
+
+
+class AudioTee:
+    """
+    FFmpeg process decoding audio from bytes written to it
+
+    Output is 16-bit mono PCM, collected by a background thread so FFmpeg
+    never blocks on a full pipe while the upload is still being fed in.
+    """
+
+    def __init__(self, sample_rate=16000):
+        command = [
+            'ffmpeg', '-nostdin', '-v', 'error', '-i', 'pipe:0',
+            '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+            '-ar', str(sample_rate), '-ac', '1',
+            'pipe:1'
+        ]
+        self.sample_rate = sample_rate
+        self.failed = False
+        self._pcm = bytearray()
+        self._stderr = []
+        self._process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        self._threads = [
+            threading.Thread(target=self._read_stdout, daemon=True),
+            threading.Thread(target=lambda: self._stderr.append(self._process.stderr.read()), daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _read_stdout(self):
+        for data in iter(lambda: self._process.stdout.read(CHUNK_SIZE), b''):
+            self._pcm.extend(data)
+
+    def write(self, data):
+        """Feed bytes to FFmpeg; a failed decoder is skipped from then on"""
+        if self.failed:
+            return
+        try:
+            self._process.stdin.write(data)
+        except (BrokenPipeError, OSError) as e:
+            logger.warning(f"Streaming audio extraction stopped: {str(e)}")
+            self.failed = True
+
+    def finish(self):
+        """
+        Close the input and wait for FFmpeg
+
+        Returns:
+            numpy.ndarray or None: Decoded samples, or None if decoding failed
+        """
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        return_code = self._process.wait()
+        for thread in self._threads:
+            thread.join()
+
+        if return_code != 0 or self.failed:
+            error_output = b''.join(self._stderr).decode(errors='replace')
+            logger.warning(f"Streaming audio extraction failed, extracting from disk instead: {error_output}")
+            return None
+        return pcm_to_float(self._pcm)
+
+    def abort(self):
+        """Stop FFmpeg without waiting for its output"""
+        self._process.kill()
+        self.finish()
+
+
+def ingest_upload(stream, video_path, content_length=None, sample_rate=16000, stream_audio=STREAM_INGEST):
+    """
+    Write an upload to disk while decoding its audio from the same bytes
+
+    The body is read once: every chunk is written to video_path and, if the
+    container can be decoded from a pipe, fed into FFmpeg, so audio
+    extraction finishes shortly after the last byte arrives.
+
+    Args:
+        stream: File-like object with the raw upload (e.g. request.stream)
+        video_path (str): Path where the upload is saved
+        content_length (int): Expected size in bytes, if known; a shorter
+            body is treated as an aborted upload
+        sample_rate (int): Sample rate of the decoded audio in Hz
+        stream_audio (bool): Decode audio while uploading
+
+    Returns:
+        numpy.ndarray or None: Decoded audio, or None if the upload could not
+            be streamed and extraction has to run from the saved file
+    """
+    tee = None
+    head = bytearray()
+    decided = not stream_audio
+    received = 0
+
+    try:
+        with open(video_path, 'wb') as f:
+            for data in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                f.write(data)
+                received += len(data)
+
+                if tee is not None:
+                    tee.write(data)
+                elif not decided:
+                    head.extend(data)
+                    streamable = is_streamable(bytes(head))
+                    if streamable is not None:
+                        decided = True
+                        if streamable:
+                            try:
+                                tee = AudioTee(sample_rate)
+                                tee.write(bytes(head))
+                            except OSError as e:
+                                logger.warning(f"Could not start streaming audio extraction: {str(e)}")
+                        head = None
+
+        if content_length is not None and received < content_length:
+            raise IOError(f"Upload ended after {received} of {content_length} bytes")
+    except BaseException:
+        if tee is not None:
+            tee.abort()
+        raise
+
+    if tee is None:
+        logger.info(f"Saved {received} bytes to {video_path}; audio is extracted from disk")
+        return None
+
+    audio = tee.finish()
+    if audio is not None:
+        logger.info(f"Saved {received} bytes to {video_path} and decoded "
+                    f"{len(audio) / sample_rate:.1f}s of audio while uploading")
+    return audio
@@ -0,0 +1,514 @@
+import os
+import codecs
+import re
+import json
+import logging
+from utils.ass_writer import stream_ass
+from utils.webvtt import stream_webvtt
+
+logger = logging.getLogger(__name__)
+
+# Characters read at a time by the JSON reader
+READ_SIZE = 64 * 1024
+
+# Extension and MIME type of each supported format
+FORMATS = {
+    'srt': ('.srt', 'application/x-subrip'),
+    'vtt': ('.vtt', 'text/vtt'),
+    'ass': ('.ass', 'text/x-ssa'),
+    'json': ('.json', 'application/json')
+}
+
+EXTENSIONS = {
+    '.srt': 'srt',
+    '.vtt': 'vtt',
+    '.webvtt': 'vtt',
+    '.ass': 'ass',
+    '.ssa': 'ass',
+    '.json': 'json'
+}
+
+# Timing line of SRT and WebVTT cues, one group per field; hours are
+# optional in WebVTT and sloppy files use '->' or leave out milliseconds
+TIME_PATTERN = r'(?:(\d+):)?(\d{1,2}):(\d{1,2})(?:[.,](\d{1,3}))?'
+TIMING_PATTERN = re.compile(rf'^\s*{TIME_PATTERN}\s*-+>\s*{TIME_PATTERN}(?:\s.*)?$')
+
+# WebVTT blocks that are not cues
+VTT_SKIPPED_BLOCKS = ('WEBVTT', 'NOTE', 'STYLE', 'REGION')
+
+# WebVTT voice/class spans and karaoke timestamps; <i>, <b> and <u> are
+# kept since SRT uses the same tags
+VTT_TAG_PATTERN = re.compile(r'</?(?:v|c|lang|ruby|rt)(?:[.\s][^>]*)?>|<\d[\d:.]*>')
+VTT_ENTITIES = (('&lt;', '<'), ('&gt;', '>'), ('&nbsp;', ' '), ('&lrm;', ''), ('&rlm;', ''), ('&amp;', '&'))
+
+# Override blocks ({\b1}, {\pos(10,20)}...) and hard line breaks in ASS text
+ASS_OVERRIDE_PATTERN = re.compile(r'\{[^}]*\}')
+ASS_BREAK_PATTERN = re.compile(r'\\[Nnh]')
+ASS_DEFAULT_FIELDS = ['layer', 'start', 'end', 'style', 'name', 'marginl', 'marginr', 'marginv', 'effect', 'text']
+
+
+def parse_timestamp(value):
+    """
+    Parse an SRT, WebVTT or ASS timestamp to integer milliseconds
+
+    Args:
+        value (str): Time such as 00:01:02,345, 01:02.345 or 0:01:02.34
+
+    Returns:
+        int: Milliseconds
+    """
+    clock, _, fraction = value.strip().replace(',', '.').partition('.')
+    parts = [int(part) for part in clock.split(':')]
+    if len(parts) == 2:
+        parts.insert(0, 0)
+    if len(parts) != 3:
+        raise ValueError(f"Invalid timestamp: {value}")
+    hours, minutes, seconds = parts
+    milliseconds = int((fraction + '000')[:3]) if fraction else 0
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds
+
+
+def format_timestamp(milliseconds):
+    """Format milliseconds as an SRT time code (HH:MM:SS,mmm)"""
+    milliseconds = max(0, int(milliseconds))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+
+def _to_ms(value):
+    """Milliseconds from a time code or a number of seconds"""
+    if isinstance(value, str):
+        return parse_timestamp(value)
+    return int(round(float(value) * 1000))
+
+
+def _clean_lines(lines):
+    """Strip line endings and a leading BOM from a line iterator"""
+    first = True
+    for line in lines:
+        # Universal newlines turn CRLF into '\n', but files read in binary
+        # or with newline='' still carry the '\r'
+        line = line.rstrip('\r\n')
+        if first:
+            line = line.lstrip('\ufeff')
+            first = False
+        yield line
+
+
+def _fields_to_ms(hours, minutes, seconds, fraction):
+    """Milliseconds from the fields of one TIME_PATTERN match"""
+    milliseconds = int((fraction + '00')[:3]) if fraction else 0
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + milliseconds
+
+
+def _iter_timed_text(lines, webvtt=False):
+    """
+    Shared SRT/WebVTT reader
+
+    Works line by line and holds at most one cue, so memory does not grow
+    with the file. A cue opens on its timing line and stays open until the
+    next one: text found after a stray blank line is appended to it (a
+    blank line inside the text), while a block starting with a number that
+    never reaches a valid timing line is dropped as malformed.
+
+    Yields:
+        tuple: (start_ms, end_ms, text)
+    """
+    cue = None         # [start_ms, end_ms, text lines] of the open cue
+    closed = True      # A blank line ended the open cue's text
+    held = []          # Lines seen since that blank line
+    skipping = False   # Inside a WebVTT header, NOTE, STYLE or REGION block
+    malformed = 0
+
+    def finish(cue, stray):
+        # Lines between two cues: text continuing the previous cue, unless
+        # they look like the start of a broken block
+        nonlocal malformed
+        if stray:
+            if webvtt or stray[0].strip().isdigit():
+                malformed += 1
+            else:
+                cue[2].extend(stray)
+        if len(cue[2]) == 1:
+            text = cue[2][0].strip()
+        else:
+            text = ' '.join(line.strip() for line in cue[2] if line.strip())
+        if webvtt:
+            text = VTT_TAG_PATTERN.sub('', text)
+            for entity, char in VTT_ENTITIES:
+                text = text.replace(entity, char)
+            text = ' '.join(text.split())
+        return cue[0], cue[1], text
+
+    for line in _clean_lines(lines):
+        stripped = line.strip()
+
+        if not stripped:
+            closed = True
+            skipping = False
+            continue
+
+        if skipping:
+            continue
+
+        # Most lines are text; only lines with an arrow go through the regex
+        match = TIMING_PATTERN.match(line) if '>' in line else None
+
+        if not match:
+            if closed and webvtt and not held and stripped.split(' ', 1)[0] in VTT_SKIPPED_BLOCKS:
+                skipping = True
+            elif closed or cue is None:
+                held.append(line)
+            else:
+                cue[2].append(line)
+            continue
+
+        # The line before a timing line is the cue number (SRT) or
+        # identifier (WebVTT); with no blank line in between it was taken
+        # for text of the previous cue
+        if held and (webvtt or held[-1].strip().isdigit()):
+            held.pop()
+        elif not held and cue is not None and cue[2] and cue[2][-1].strip().isdigit():
+            cue[2].pop()
+
+        if cue is not None:
+            yield finish(cue, held)
+        elif held:
+            malformed += 1
+
+        fields = match.groups()
+        cue = [_fields_to_ms(*fields[:4]), _fields_to_ms(*fields[4:]), []]
+        closed = False
+        held = []
+
+    if cue is not None:
+        yield finish(cue, held)
+
+    if malformed:
+        logger.warning(f"Skipped {malformed} malformed subtitle blocks")
+
+
+def iter_srt(lines):
+    """Read SRT cues from an iterable of lines (see _iter_timed_text)"""
+    return _iter_timed_text(lines, webvtt=False)
+
+
+def iter_vtt(lines):
+    """Read WebVTT cues from an iterable of lines (see _iter_timed_text)"""
+    return _iter_timed_text(lines, webvtt=True)
+
+
+def iter_ass(lines):
+    """
+    Read the Dialogue events of an ASS/SSA script
+
+    Override blocks are removed and hard line breaks
+    become spaces. Comments and other sections are skipped.
+
+    Args:
+        lines (iterable): Lines of the script
+
+    Yields:
+        tuple: (start_ms, end_ms, text)
+    """
+    in_events = False
+    fields = ASS_DEFAULT_FIELDS
+    malformed = 0
+
+    for line in _clean_lines(lines):
+        line = line.strip()
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+
+        key, separator, value = line.partition(':')
+        if not separator:
+            continue
+        key = key.strip().lower()
+
+        if key == 'format':
+            fields = [field.strip().lower() for field in value.split(',')]
+        elif key == 'dialogue':
+            values = value.lstrip().split(',', len(fields) - 1)
+            event = dict(zip(fields, values))
+            try:
+                start, end = parse_timestamp(event['start']), parse_timestamp(event['end'])
+            except (KeyError, ValueError):
+                malformed += 1
+                continue
+
+            text = ASS_OVERRIDE_PATTERN.sub('', event.get('text', ''))
+            yield start, end, ' '.join(ASS_BREAK_PATTERN.sub(' ', text).split())
+
+    if malformed:
+        logger.warning(f"Skipped {malformed} malformed ASS events")
+
+
+def iter_json(f, read_size=READ_SIZE):
+    """
+    Read cues from a JSON array of objects without loading the whole file
+
+    Objects are decoded one at a time from a sliding buffer. Each needs
+    'start' and 'end' (time codes or seconds) and 'text'.
+
+    Args:
+        f: Text file object
+        read_size (int): Characters read at a time
+
+    Yields:
+        tuple: (start_ms, end_ms, text)
+    """
+    decoder = json.JSONDecoder()
+    buffer = f.read(read_size).lstrip('\ufeff').lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("JSON subtitles must be an array of cues")
+
+    position = 1
+    eof = False
+    malformed = 0
+
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+
+        if position < len(buffer) and buffer[position] == ']':
+            break
+
+        try:
+            if position >= len(buffer):
+                raise ValueError("Buffer exhausted")
+            item, position = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                if buffer[position:].strip():
+                    malformed += 1
+                break
+            # The next object is cut by the end of the buffer
+            more = f.read(read_size)
+            eof = not more
+            buffer = buffer[position:] + more
+            position = 0
+            continue
+
+        try:
+            yield _to_ms(item['start']), _to_ms(item['end']), ' '.join(str(item.get('text', '')).split())
+        except (TypeError, KeyError, ValueError):
+            malformed += 1
+
+    if malformed:
+        logger.warning(f"Skipped {malformed} malformed JSON cues")
+
+
+READERS = {
+    'srt': iter_srt,
+    'vtt': iter_vtt,
+    'ass': iter_ass,
+    'json': iter_json
+}
+
+
+def detect_format(filename=None, first_line=None):
+    """
+    Work out a subtitle format from a file name or the file's first line
+
+    Args:
+        filename (str): Name of the file, used if its extension is known
+        first_line (str): First line of the file, used otherwise
+
+    Returns:
+        str: Format key of FORMATS (SRT when nothing else matches)
+    """
+    if filename:
+        fmt = EXTENSIONS.get(os.path.splitext(filename)[1].lower())
+        if fmt:
+            return fmt
+
+    head = (first_line or '').lstrip('\ufeff').strip()
+    if head.startswith('WEBVTT'):
+        return 'vtt'
+    if head.lower() == '[script info]':
+        return 'ass'
+    if head.startswith('['):
+        return 'json'
+    return 'srt'
+
+
+def open_text(stream):
+    """
+    Wrap a binary stream (an upload, an open file) for the readers
+
+    UTF-8 with or without a BOM is decoded; undecodable bytes from legacy
+    encodings are replaced rather than failing the whole file. A codecs
+    reader is used because it only needs read(), which upload spools
+    provide on every Python version.
+    """
+    return codecs.getreader('utf-8-sig')(stream, errors='replace')
+
+
+def iter_cues(f, fmt):
+    """
+    Read cues from an open text file
+
+    Args:
+        f: Text file object
+        fmt (str): Format key of FORMATS
+
+    Yields:
+        tuple: (start_ms, end_ms, text) for every cue with text
+    """
+    if fmt not in READERS:
+        raise ValueError(f"Unsupported subtitle format: {fmt}")
+    for start, end, text in READERS[fmt](f):
+        if text:
+            yield start, end, text
+
+
+def iter_subtitles(f, fmt):
+    """
+    Read subtitle dictionaries from an open text file
+
+    Args:
+        f: Text file object
+        fmt (str): Format key of FORMATS
+
+    Yields:
+        dict: 'index' (numbered from 1), 'start' and 'end' as SRT time codes, and 'text'
+    """
+    for index, (start, end, text) in enumerate(iter_cues(f, fmt), 1):
+        yield {
+            'index': index,
+            'start': format_timestamp(start),
+            'end': format_timestamp(end),
+            'text': text
+        }
+
+
+def read_subtitles(path, fmt=None):
+    """
+    Read subtitle dictionaries from a file, one cue at a time
+
+    Args:
+        path (str): Path of the subtitle file
+        fmt (str): Format key of FORMATS (detected from the name by default)
+
+    Yields:
+        dict: Subtitle dictionaries (see iter_subtitles)
+    """
+    with open(path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        if fmt is None:
+            fmt = detect_format(path, f.readline())
+            f.seek(0)
+        yield from iter_subtitles(f, fmt)
+
+
+def stream_srt(subtitles, f):
+    """
+    Write SRT to an open text file, numbering the cues from 1
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start' and 'end' (SRT time
+            codes or seconds) and 'text'
+        f: Text file object
+
+    Returns:
+        int: Number of cues written
+    """
+    count = 0
+    for subtitle in subtitles:
+        count += 1
+        start, end = subtitle['start'], subtitle['end']
+        if not isinstance(start, str):
+            start = format_timestamp(_to_ms(start))
+        if not isinstance(end, str):
+            end = format_timestamp(_to_ms(end))
+        # A line break in the text would end the cue
+        text = (subtitle.get('text') or '').replace('\n', ' ').replace('\r', '')
+        f.write(f"{count}\n{start.strip()} --> {end.strip()}\n{text}\n\n")
+    return count
+
+
+def stream_json(subtitles, f):
+    """
+    Write subtitles to an open text file as a JSON array, one cue per line
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start', 'end' and 'text'
+        f: Text file object
+
+    Returns:
+        int: Number of cues written
+    """
+    count = 0
+    f.write('[')
+    for subtitle in subtitles:
+        start, end = subtitle['start'], subtitle['end']
+        cue = {
+            'index': count + 1,
+            'start': start if isinstance(start, str) else format_timestamp(_to_ms(start)),
+            'end': end if isinstance(end, str) else format_timestamp(_to_ms(end)),
+            'text': subtitle.get('text') or ''
+        }
+        f.write(('\n' if count == 0 else ',\n') + json.dumps(cue, ensure_ascii=False))
+        count += 1
+    f.write('\n]\n')
+    return count
+
+
+def write_subtitles(subtitles, f, fmt, style=None):
+    """
+    Write subtitles to an open text file in any supported format
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start', 'end' and 'text';
+            a generator (e.g. read_subtitles) is consumed lazily
+        f: Text file object
+        fmt (str): Format key of FORMATS
+        style (dict): Style options accepted by embed_subtitles, used for
+            WebVTT cue positions and the ASS style
+
+    Returns:
+        int: Number of cues written
+    """
+    if fmt == 'srt':
+        return stream_srt(subtitles, f)
+    if fmt == 'vtt':
+        return stream_webvtt(subtitles, f, style)
+    if fmt == 'ass':
+        return stream_ass(subtitles, f, **(style or {}))
+    if fmt == 'json':
+        return stream_json(subtitles, f)
+    raise ValueError(f"Unsupported subtitle format: {fmt}")
+
+
+def save_subtitles(subtitles, path, fmt=None, style=None):
+    """
+    Write subtitles to a file
+
+    The file is written under a temporary name and moved into place, so
+    readers never see a partial file and converting a file onto itself
+    (read_subtitles into the same path) is safe.
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start', 'end' and 'text'
+        path (str): Path of the subtitle file
+        fmt (str): Format key of FORMATS (from the extension by default)
+        style (dict): Style options (see write_subtitles)
+
+    Returns:
+        int: Number of cues written
+    """
+    fmt = fmt or detect_format(path)
+    temp_path = f"{path}.tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            count = write_subtitles(subtitles, f, fmt, style)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return count
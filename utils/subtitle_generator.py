@@ -4,121 +4,77 @@ from pydub import AudioSegment
 from pydub.silence import split_on_silence
 import tempfile
 import langdetect
-from deep_translator import GoogleTranslator
-from faster_whisper import WhisperModel
 import speech_recognition as sr
+from utils.model_registry import get_whisper_model
+from utils.video_processor import write_wav
+from utils.parallel_transcriber import should_parallelize, transcribe_parallel
+from utils.translation import translate_texts
+from utils.subtitle_formats import read_subtitles, save_subtitles
+from utils.segmenter import segments_to_cues, MAX_CHARS
+from utils.transcription_settings import get_transcription_settings, model_options, decode_options
 
 logger = logging.getLogger(__name__)
 
-def generate_subtitles(audio_path, output_srt_path, min_silence_len=500, silence_thresh=-40, keep_silence=300, use_whisper=True, whisper_model="base"):
+def generate_subtitles(audio_path, output_srt_path, min_silence_len=500, silence_thresh=-40, keep_silence=300, use_whisper=True, whisper_model="base", progress_callback=None):
     """
     Generate SRT subtitles from an audio file
     
     Args:
-        audio_path (str): Path to the audio file
+        audio_path (str or numpy.ndarray): Path to the audio file, or 16 kHz mono
+            float32 samples decoded in memory
         output_srt_path (str): Path where the SRT file will be saved
         min_silence_len (int): Minimum length of silence (in ms) to split on
         silence_thresh (int): Silence threshold (in dB)
         keep_silence (int): Amount of silence to keep (in ms)
         use_whisper (bool): Whether to use Whisper for transcription (preferred for accuracy)
         whisper_model (str): Whisper model to use ("tiny", "base", "small", "medium")
+        progress_callback (callable): Called with the transcribed fraction (0.0 to 1.0)
     """
     try:
-        logger.info(f"Generating subtitles for {audio_path}")
+        if isinstance(audio_path, str):
+            logger.info(f"Generating subtitles for {audio_path}")
+        else:
+            logger.info("Generating subtitles for in-memory audio")
         
         if use_whisper:
-            return generate_whisper_subtitles(audio_path, output_srt_path, model_name=whisper_model)
+            return generate_whisper_subtitles(audio_path, output_srt_path, model_name=whisper_model,
+                                              progress_callback=progress_callback)
         else:
+            audio_path = ensure_audio_file(audio_path, output_srt_path)
             return generate_google_subtitles(audio_path, output_srt_path, min_silence_len, silence_thresh, keep_silence)
     
     except Exception as e:
         logger.error(f"Error generating subtitles: {str(e)}")
         raise
 
-def generate_whisper_subtitles(audio_path, output_srt_path, model_name="base"):
+def generate_whisper_subtitles(audio_path, output_srt_path, model_name="base", progress_callback=None,
+                               parallel=None, chunk_seconds=None, max_workers=None):
     """
     Generate subtitles using Whisper model locally
     
     Args:
-        audio_path (str): Path to the audio file
+        audio_path (str or numpy.ndarray): Path to the audio file, or 16 kHz mono
+            float32 samples decoded in memory
         output_srt_path (str): Path where the SRT file will be saved
         model_name (str): Whisper model to use ("tiny", "base", "small", "medium")
+        progress_callback (callable): Called with the transcribed fraction (0.0 to 1.0)
+        parallel (bool): Transcribe chunks in parallel worker processes. None
+            decides automatically from the audio duration.
+        chunk_seconds (float): Target chunk length for parallel transcription
+        max_workers (int): Number of worker processes for parallel transcription
     """
     try:
-        logger.info(f"Loading Whisper model: {model_name}")
-        # Load the Whisper model
-        model = WhisperModel(model_name, device="cpu", compute_type="int8")
-        
-        logger.info("Transcribing audio with Whisper...")
-        # Transcribe audio
-        segments, info = model.transcribe(audio_path, beam_size=5, language=None)
-        
-        logger.info(f"Detected language: {info.language} with probability {info.language_probability:.2f}")
+        segments, info = transcribe_audio(
+            audio_path,
+            model_name=model_name,
+            progress_callback=progress_callback,
+            parallel=parallel,
+            chunk_seconds=chunk_seconds,
+            max_workers=max_workers
+        )
         
         # Process segments and generate subtitles
-        subtitles = []
-        
-        subtitle_index = 1
-        for segment in segments:
-            # Extract timing information
-            start_time = segment.start
-            end_time = segment.end
-            text = segment.text.strip()
-            
-            if text:
-                # Remove any existing line breaks
-                text = text.replace('\n', ' ').replace('\r', '')
-                
-                # Check if the text is too long (more than 35 characters)
-                # If so, split it into multiple subtitles
-                max_chars = 35
-                
-                if len(text) <= max_chars:
-                    # Short enough for a single subtitle
-                    subtitles.append({
-                        "index": subtitle_index,
-                        "start": format_time(start_time),
-                        "end": format_time(end_time),
-                        "text": text
-                    })
-                    subtitle_index += 1
-                else:
-                    # Split into multiple subtitles
-                    words = text.split()
-                    current_line = ""
-                    lines = []
-                    
-                    # Group words into lines with max_chars limit
-                    for word in words:
-                        if len(current_line + " " + word) <= max_chars or current_line == "":
-                            if current_line:
-                                current_line += " " + word
-                            else:
-                                current_line = word
-                        else:
-                            lines.append(current_line)
-                            current_line = word
-                    
-                    # Add the last line if it's not empty
-                    if current_line:
-                        lines.append(current_line)
-                    
-                    # Calculate time for each split subtitle
-                    duration = end_time - start_time
-                    time_per_line = duration / len(lines)
-                    
-                    # Create a subtitle entry for each line
-                    for i, line in enumerate(lines):
-                        line_start = start_time + (i * time_per_line)
-                        line_end = line_start + time_per_line
-                        
-                        subtitles.append({
-                            "index": subtitle_index,
-                            "start": format_time(line_start),
-                            "end": format_time(line_end),
-                            "text": line
-                        })
-                        subtitle_index += 1
+        subtitles = segments_to_subtitles(segments)
         
         # Write SRT file
         write_srt(subtitles, output_srt_path)
@@ -129,8 +85,115 @@ def generate_whisper_subtitles(audio_path, output_srt_path, model_name="base"):
     except Exception as e:
         logger.error(f"Error generating Whisper subtitles: {str(e)}")
         logger.warning("Falling back to Google Speech Recognition")
+        audio_path = ensure_audio_file(audio_path, output_srt_path)
         return generate_google_subtitles(audio_path, output_srt_path)
 
+def transcribe_audio(audio, model_name="base", progress_callback=None, parallel=None,
+                     chunk_seconds=None, max_workers=None, settings=None):
+    """
+    Transcribe audio with Whisper and return the raw segments
+    
+    Args:
+        audio (str or numpy.ndarray): Path to the audio file, or 16 kHz mono float32 samples
+        model_name (str): Whisper model to use ("tiny", "base", "small", "medium")
+        progress_callback (callable): Called with the transcribed fraction (0.0 to 1.0)
+        parallel (bool): Transcribe chunks in parallel worker processes. None
+            decides automatically from the audio duration.
+        chunk_seconds (float): Target chunk length for parallel transcription
+        max_workers (int): Number of worker processes for parallel transcription
+        settings (dict): Beam size, compute type, VAD and thread settings; by
+            default the calibrated profile of this host or the defaults (see
+            utils.transcription_settings)
+        
+    Returns:
+        tuple: (segments, info) where segments is a list of dicts with 'start',
+            'end' (seconds), 'text' and 'words' ([start, end, word] lists), and
+            info is a dict with 'language', 'language_probability' and 'duration'
+    """
+    if settings is None:
+        settings = get_transcription_settings(model_name)
+    
+    if parallel is None:
+        parallel = should_parallelize(audio, chunk_seconds)
+    
+    if parallel:
+        try:
+            return transcribe_parallel(
+                audio,
+                model_name=model_name,
+                chunk_seconds=chunk_seconds,
+                max_workers=max_workers,
+                progress_callback=progress_callback,
+                settings=settings
+            )
+        except Exception as e:
+            logger.error(f"Error in parallel transcription: {str(e)}")
+            logger.warning("Falling back to single-process transcription")
+    
+    # Get the shared Whisper model (loaded once per worker process)
+    model = get_whisper_model(model_name, device="cpu", **model_options(settings))
+    
+    logger.info(f"Transcribing audio with Whisper ({settings})...")
+    # Word timings let the segmenter split cues where the words are spoken
+    segments, info = model.transcribe(audio, language=None, word_timestamps=True, **decode_options(settings))
+    
+    logger.info(f"Detected language: {info.language} with probability {info.language_probability:.2f}")
+    
+    raw_segments = []
+    for segment in segments:
+        raw_segments.append({
+            "start": segment.start,
+            "end": segment.end,
+            "text": segment.text,
+            "words": [[word.start, word.end, word.word] for word in (segment.words or [])]
+        })
+        
+        # Segments are decoded lazily, so report progress as they arrive
+        if progress_callback and info.duration:
+            progress_callback(segment.end / info.duration)
+    
+    return raw_segments, {
+        "language": info.language,
+        "language_probability": info.language_probability,
+        "duration": info.duration
+    }
+
+def segments_to_subtitles(segments, max_chars=MAX_CHARS):
+    """
+    Convert raw transcription segments into single-line subtitles
+    
+    Cues are split at word timestamps where the segments have them (see
+    utils.segmenter.segment_words).
+    
+    Args:
+        segments (list): List of dicts with 'start', 'end' (seconds), 'text'
+            and optionally 'words'
+        max_chars (int): Maximum number of characters per subtitle
+        
+    Returns:
+        list: List of subtitle dictionaries
+    """
+    return segments_to_cues(segments, max_chars=max_chars)
+
+def ensure_audio_file(audio, output_srt_path):
+    """
+    Return a path to a WAV file for the audio, writing one if it is in memory
+    
+    Args:
+        audio (str or numpy.ndarray): Path to the audio file, or 16 kHz mono float32 samples
+        output_srt_path (str): Path of the SRT file; the WAV is written next to it
+        
+    Returns:
+        str: Path to the audio file
+    """
+    if isinstance(audio, str):
+        return audio
+    
+    audio_path = os.path.join(os.path.dirname(output_srt_path), 'audio.wav')
+    write_wav(audio, audio_path)
+    logger.info(f"Wrote in-memory audio to {audio_path} for file-based transcription")
+    return audio_path
+
 def generate_google_subtitles(audio_path, output_srt_path, min_silence_len=500, silence_thresh=-40, keep_silence=300):
     """
     Generate subtitles using Google Speech Recognition
@@ -157,8 +220,8 @@ def generate_google_subtitles(audio_path, output_srt_path, min_silence_len=500,
         # Initialize speech recognizer
         recognizer = sr.Recognizer()
         
-        # Process chunks and generate subtitles
-        subtitles = []
+        # Recognized text of each chunk, split into cues at the end
+        segments = []
         current_time = 0
         
         # Create a temporary directory for audio chunks
@@ -180,56 +243,7 @@ def generate_google_subtitles(audio_path, output_srt_path, min_silence_len=500,
                 try:
                     text = recognizer.recognize_google(audio_data)
                     if text:
-                        # Remove any line breaks
-                        text = text.replace('\n', ' ').replace('\r', '')
-                        
-                        # Check if the text is too long (more than 35 characters to ensure single line)
-                        max_chars = 35
-                        
-                        if len(text) <= max_chars:
-                            # Short enough for a single subtitle
-                            subtitles.append({
-                                "index": len(subtitles) + 1,
-                                "start": format_time(start_time),
-                                "end": format_time(end_time),
-                                "text": text
-                            })
-                        else:
-                            # Split into multiple subtitles
-                            words = text.split()
-                            current_line = ""
-                            lines = []
-                            
-                            # Group words into lines with max_chars limit
-                            for word in words:
-                                if len(current_line + " " + word) <= max_chars or current_line == "":
-                                    if current_line:
-                                        current_line += " " + word
-                                    else:
-                                        current_line = word
-                                else:
-                                    lines.append(current_line)
-                                    current_line = word
-                            
-                            # Add the last line if it's not empty
-                            if current_line:
-                                lines.append(current_line)
-                            
-                            # Calculate time for each split subtitle
-                            duration = end_time - start_time
-                            time_per_line = duration / len(lines)
-                            
-                            # Create a subtitle entry for each line
-                            for j, line in enumerate(lines):
-                                line_start = start_time + (j * time_per_line)
-                                line_end = line_start + time_per_line
-                                
-                                subtitles.append({
-                                    "index": len(subtitles) + 1,
-                                    "start": format_time(line_start),
-                                    "end": format_time(line_end),
-                                    "text": line
-                                })
+                        segments.append({"start": start_time, "end": end_time, "text": text})
                         logger.debug(f"Recognized: {text}")
                 except sr.UnknownValueError:
                     logger.debug(f"Speech recognition could not understand audio chunk {i}")
@@ -246,7 +260,7 @@ def generate_google_subtitles(audio_path, output_srt_path, min_silence_len=500,
             current_time = end_time
         
         # Write SRT file
-        write_srt(subtitles, output_srt_path)
+        write_srt(segments_to_subtitles(segments), output_srt_path)
         logger.info(f"Generated subtitles saved to {output_srt_path}")
         
         return True
@@ -260,38 +274,22 @@ def write_srt(subtitles, output_path):
     Write subtitles to SRT file
     
     Args:
-        subtitles (list): List of subtitle dictionaries
+        subtitles (iterable): Subtitle dictionaries; cues are numbered in order
         output_path (str): Path where to save the SRT file
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for i, subtitle in enumerate(subtitles):
-            f.write(f"{subtitle['index']}\n")
-            f.write(f"{subtitle['start']} --> {subtitle['end']}\n")
-            f.write(f"{subtitle['text']}\n\n")
-
-def format_time(seconds):
-    """
-    Format time in SRT format (HH:MM:SS,mmm)
-    
-    Args:
-        seconds (float): Time in seconds
-        
-    Returns:
-        str: Formatted time string
-    """
-    hours = int(seconds // 3600)
-    seconds %= 3600
-    minutes = int(seconds // 60)
-    seconds %= 60
-    milliseconds = int((seconds - int(seconds)) * 1000)
-    seconds = int(seconds)
-    
-    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+    try:
+        save_subtitles(subtitles, output_path, 'srt')
+    except Exception as e:
+        logger.error(f"Error writing SRT file: {str(e)}")
+        raise
 
 def srt_to_dict(srt_path):
     """
     Parse SRT file to a list of dictionaries
     
+    Cues are returned as stored; splitting happens once, when the
+    subtitles are generated (see segments_to_subtitles).
+    
     Args:
         srt_path (str): Path to the SRT file
         
@@ -299,109 +297,11 @@ def srt_to_dict(srt_path):
         list: List of subtitle dictionaries
     """
     try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-        
-        blocks = content.split('\n\n')
-        subtitles = []
-        
-        for block in blocks:
-            lines = block.split('\n')
-            if len(lines) >= 3:
-                # Get index
-                index = int(lines[0])
-                
-                # Parse time codes
-                time_codes = lines[1].split(' --> ')
-                start_time = time_codes[0]
-                end_time = time_codes[1]
-                
-                # Join the text lines and remove any line breaks
-                text = ' '.join(lines[2:]).replace('\n', ' ').replace('\r', '')
-                
-                # Check if the text is too long (more than 35 characters to ensure single line)
-                max_chars = 35
-                
-                if len(text) <= max_chars:
-                    # Short enough for a single subtitle
-                    subtitles.append({
-                        "index": index,
-                        "start": start_time,
-                        "end": end_time,
-                        "text": text
-                    })
-                else:
-                    # If the text is too long, split it into multiple subtitles with reindexing
-                    words = text.split()
-                    current_line = ""
-                    split_lines = []
-                    
-                    # Group words into lines with max_chars limit
-                    for word in words:
-                        if len(current_line + " " + word) <= max_chars or current_line == "":
-                            if current_line:
-                                current_line += " " + word
-                            else:
-                                current_line = word
-                        else:
-                            split_lines.append(current_line)
-                            current_line = word
-                    
-                    # Add the last line if it's not empty
-                    if current_line:
-                        split_lines.append(current_line)
-                    
-                    # Add the divided subtitles
-                    for line in split_lines:
-                        subtitles.append({
-                            "index": len(subtitles) + 1,
-                            "start": start_time,
-                            "end": end_time,
-                            "text": line
-                        })
-        
-        return subtitles
-    
+        return list(read_subtitles(srt_path, 'srt'))
     except Exception as e:
         logger.error(f"Error parsing SRT file: {str(e)}")
         return []
 
-def dict_to_srt(subtitles, output_path):
-    """
-    Convert list of subtitle dictionaries to SRT file
-    
-    Args:
-        subtitles (list): List of subtitle dictionaries
-        output_path (str): Path where to save the SRT file
-    """
-    try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for subtitle in subtitles:
-                # Ensure index is an integer
-                index = subtitle['index']
-                if isinstance(index, str):
-                    try:
-                        index = int(index)
-                    except:
-                        # Use position in list if conversion fails
-                        pass
-                
-                # Write index
-                f.write(f"{index}\n")
-                
-                # Write timing information
-                f.write(f"{subtitle['start']} --> {subtitle['end']}\n")
-                
-                # Ensure the text has no line breaks and is properly formatted
-                text = subtitle.get('text', '').replace('\n', ' ').replace('\r', '')
-                
-                # Write text
-                f.write(f"{text}\n\n")
-    
-    except Exception as e:
-        logger.error(f"Error writing SRT file: {str(e)}")
-        raise
-
 def detect_language(text):
     """
     Detect the language of the text
@@ -436,13 +336,14 @@ def detect_subtitle_language(subtitles):
     
     return detect_language(all_text)
 
-def translate_subtitles(subtitles, target_language='en'):
+def translate_subtitles(subtitles, target_language='en', provider=None):
     """
     Translate subtitles to the target language
     
     Args:
         subtitles (list): List of subtitle dictionaries
         target_language (str): Target language code (e.g., 'en', 'fr', 'es', etc.)
+        provider: Translation provider (defaults to the one selected by TRANSLATION_PROVIDER)
         
     Returns:
         list: Translated subtitle dictionaries
@@ -470,45 +371,22 @@ def translate_subtitles(subtitles, target_language='en'):
         if source_language == 'pt-br':
             source_language = 'pt'
             
-        translator = GoogleTranslator(source=source_language, target=target_language)
+        # Translate all cues with batched, concurrent requests
+        translated_texts = translate_texts(
+            [subtitle.get('text', '') for subtitle in subtitles],
+            source_language,
+            target_language,
+            provider=provider
+        )
         
-        # Translate each subtitle
         translated_subtitles = []
         
-        for subtitle in subtitles:
+        for subtitle, translated_text in zip(subtitles, translated_texts):
             # Create a copy of the subtitle
             translated_subtitle = subtitle.copy()
             
-            # Translate the text
             if subtitle.get('text'):
-                # Split text into smaller chunks if too long (to avoid API limits)
-                text = subtitle['text']
-                translated_text = ""
-                
-                # Remove any existing line breaks
-                text = text.replace('\n', ' ').replace('\r', '')
-                
-                # Translate text
-                translated_text = translator.translate(text)
-                
-                # Ensure translated text has no line breaks
-                translated_text = translated_text.replace('\n', ' ').replace('\r', '')
-                
-                # Check if translated text is too long for a single line (more than 35 characters)
-                max_chars = 35
-                
-                if len(translated_text) <= max_chars:
-                    # Short enough for a single subtitle
-                    translated_subtitle['text'] = translated_text
-                else:
-                    # If it's too long, we'll create multiple subtitle entries for this text
-                    # First add this one with the original timing
-                    translated_subtitle['text'] = translated_text
-                    
-                    # Add a note for debug that this subtitle may need splitting
-                    logger.info(f"Translated text is longer than {max_chars} characters: {translated_text}")
-                    
-                    # Later, the subtitle will be split when it's written to the SRT file
+                translated_subtitle['text'] = translated_text
             
             translated_subtitles.append(translated_subtitle)
         
@@ -0,0 +1,198 @@
+import os
+import time
+import wave
+import hashlib
+import logging
+import threading
+import numpy as np
+from utils.json_store import JsonFileStore, CACHE_ROOT
+from utils.transcription_settings import get_transcription_settings, settings_digest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get('TRANSCRIPT_CACHE_DIR', os.path.join(CACHE_ROOT, 'transcripts'))
+DEFAULT_MAX_BYTES = int(os.environ.get('TRANSCRIPT_CACHE_MAX_MB', '512')) * 1024 * 1024
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(path):
+    """
+    Compute the SHA-256 of a file's contents
+
+    Args:
+        path (str): Path to the file
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def audio_fingerprint(audio):
+    """
+    Fingerprint decoded audio so remuxed copies of a video share a cache entry
+
+    The fingerprint is the SHA-256 of the 16-bit PCM samples, which is the
+    same whether the audio was decoded into memory or written to a WAV file.
+
+    Args:
+        audio (str or numpy.ndarray): Path to a 16-bit WAV file, or float32
+            samples in the range [-1.0, 1.0]
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+
+    if isinstance(audio, str):
+        with wave.open(audio, 'rb') as wav_file:
+            frames_per_block = HASH_BLOCK_SIZE // max(1, wav_file.getsampwidth() * wav_file.getnchannels())
+            for block in iter(lambda: wav_file.readframes(frames_per_block), b''):
+                digest.update(block)
+    else:
+        # Undo the int16 -> float32 conversion done at extraction time
+        pcm = np.round(audio * 32768.0).clip(-32768, 32767).astype('<i2')
+        digest.update(pcm.tobytes())
+
+    return digest.hexdigest()
+
+
+class TranscriptCache:
+    """
+    Content-addressed cache of Whisper transcripts
+
+    Entries are keyed by an audio fingerprint, the Whisper model and the
+    transcription settings that change the transcript (beam size, compute
+    type, VAD), and hold the raw segments, the detected language and the
+    video info. File hashes are stored as small aliases pointing at the audio
+    fingerprint, so an identical upload hits the cache before any audio is
+    decoded; the alias of a remuxed copy also holds that copy's own video
+    info. Least recently used entries are evicted once the cache grows beyond
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache entries
+            max_bytes (int): Maximum total size of the cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._store = JsonFileStore(cache_dir, max_bytes, 'transcript cache')
+
+    def _entry_name(self, fingerprint, model_name, settings):
+        if settings is None:
+            settings = get_transcription_settings(model_name)
+        return f"audio-{fingerprint}-{model_name}-{settings_digest(settings)}.json"
+
+    def _alias_name(self, content_hash):
+        return f"file-{content_hash}.json"
+
+    def get(self, fingerprint, model_name, settings=None):
+        """
+        Look up a transcript by audio fingerprint
+
+        Args:
+            fingerprint (str): Audio fingerprint
+            model_name (str): Whisper model the transcript was made with
+            settings (dict): Transcription settings it was made with (the
+                current settings of model_name by default)
+
+        Returns:
+            dict or None: Cached entry with 'segments', 'language' and 'video_info'
+        """
+        return self._store.read(self._entry_name(fingerprint, model_name, settings))
+
+    def get_by_file(self, content_hash, model_name, settings=None):
+        """
+        Look up a transcript by the hash of the uploaded file
+
+        Args:
+            content_hash (str): SHA-256 of the uploaded file
+            model_name (str): Whisper model the transcript was made with
+            settings (dict): Transcription settings it was made with (see get)
+
+        Returns:
+            dict or None: Cached entry with 'segments', 'language' and 'video_info'
+        """
+        alias = self._store.read(self._alias_name(content_hash))
+        if not alias:
+            return None
+        entry = self.get(alias['fingerprint'], model_name, settings)
+        if entry is not None and alias.get('video_info'):
+            entry['video_info'] = alias['video_info']
+        return entry
+
+    def put(self, fingerprint, model_name, segments, language, video_info, content_hash=None, settings=None):
+        """
+        Store a transcript
+
+        Args:
+            fingerprint (str): Audio fingerprint
+            model_name (str): Whisper model the transcript was made with
+            segments (list): Raw Whisper segments
+            language (str): Detected language code
+            video_info (dict): Output of get_video_info
+            content_hash (str): SHA-256 of the uploaded file, stored as an alias
+            settings (dict): Transcription settings it was made with (see get)
+        """
+        self._store.write(self._entry_name(fingerprint, model_name, settings), {
+            'segments': segments,
+            'language': language,
+            'video_info': video_info,
+            'created_at': time.time()
+        })
+
+        if content_hash:
+            self.add_alias(content_hash, fingerprint)
+
+        self.evict()
+
+    def add_alias(self, content_hash, fingerprint, video_info=None):
+        """
+        Point a file hash at an existing audio fingerprint
+
+        Args:
+            content_hash (str): SHA-256 of the uploaded file
+            fingerprint (str): Audio fingerprint
+            video_info (dict): Output of get_video_info for this file, when it
+                is not the file the transcript was made from
+        """
+        alias = {'fingerprint': fingerprint}
+        if video_info:
+            alias['video_info'] = video_info
+        self._store.write(self._alias_name(content_hash), alias)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        # Aliases whose entry was evicted simply miss on the next lookup
+        self._store.evict()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_transcript_cache():
+    """
+    Return the shared transcript cache, or None if disabled with TRANSCRIPT_CACHE=0
+    """
+    global _default_cache
+
+    if os.environ.get('TRANSCRIPT_CACHE', '1') == '0':
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = TranscriptCache()
+            except Exception as e:
+                logger.error(f"Error opening transcript cache: {str(e)}")
+                return None
+        return _default_cache
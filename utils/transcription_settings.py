@@ -0,0 +1,180 @@
+import os
+import json
+import hashlib
+import time
+import socket
+import logging
+from utils.json_store import CACHE_ROOT
+from utils.job_queue import DEFAULT_MAX_WORKERS as JOB_WORKERS
+
+logger = logging.getLogger(__name__)
+
+# Calibrated profiles of every host, written by benchmarks/calibrate_transcription.py
+PROFILE_PATH = os.environ.get('TRANSCRIPTION_PROFILE_PATH', os.path.join(CACHE_ROOT, 'transcription-profiles.json'))
+
+# Set to 0 to ignore calibrated profiles
+USE_PROFILE = os.environ.get('TRANSCRIPTION_PROFILE', '1') != '0'
+
+COMPUTE_TYPES = ('int8', 'int8_float32', 'int16', 'float32')
+
+# Settings that change the transcript itself; the thread settings only
+# change how fast it is made
+TRANSCRIPT_SETTINGS = ('beam_size', 'compute_type', 'vad_filter', 'vad_min_silence_ms')
+
+# Environment variable overriding each setting, and how to parse it
+ENV_SETTINGS = {
+    'beam_size': ('WHISPER_BEAM_SIZE', int),
+    'compute_type': ('WHISPER_COMPUTE_TYPE', str),
+    'vad_filter': ('WHISPER_VAD', lambda value: value.lower() in ('1', 'true', 'yes')),
+    'vad_min_silence_ms': ('WHISPER_VAD_MIN_SILENCE_MS', int),
+    'cpu_threads': ('WHISPER_CPU_THREADS', int),
+    'num_workers': ('WHISPER_NUM_WORKERS', int)
+}
+
+
+def default_settings():
+    """
+    Return the settings used when nothing is configured or calibrated
+
+    Each of the JOB_WORKERS concurrent jobs of a process gets its own
+    decoder and an equal share of the CPU cores, so concurrent
+    transcriptions neither queue behind one decoder nor oversubscribe the
+    cores.
+
+    Returns:
+        dict: Transcription settings
+    """
+    num_workers = max(1, JOB_WORKERS)
+    return {
+        'beam_size': 5,
+        'compute_type': 'int8',
+        'vad_filter': False,
+        'vad_min_silence_ms': 500,
+        'cpu_threads': max(1, (os.cpu_count() or 1) // num_workers),
+        'num_workers': num_workers
+    }
+
+
+def host_key():
+    """Identify this host in the profile file (profiles do not carry over to other hardware)"""
+    return f"{socket.gethostname()}-{os.cpu_count() or 1}cpu"
+
+
+def _read_profiles(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (ValueError, OSError) as e:
+        logger.warning(f"Ignoring unreadable transcription profiles {path}: {str(e)}")
+        return {}
+
+
+def load_profile(model_name, path=PROFILE_PATH):
+    """
+    Return the calibrated profile of a model on this host
+
+    Args:
+        model_name (str): Whisper model name
+        path (str): Profile file
+
+    Returns:
+        dict or None: Profile with 'settings', 'rtf', 'wer' and 'calibrated_at'
+    """
+    return _read_profiles(path).get(host_key(), {}).get(model_name)
+
+
+def save_profile(model_name, settings, metrics, path=PROFILE_PATH):
+    """
+    Store the calibrated settings of a model for this host
+
+    Args:
+        model_name (str): Whisper model name
+        settings (dict): Transcription settings
+        metrics (dict): Measurements to keep with them (e.g. 'rtf', 'wer')
+        path (str): Profile file
+    """
+    profiles = _read_profiles(path)
+    profiles.setdefault(host_key(), {})[model_name] = dict(
+        metrics, settings=settings, calibrated_at=time.strftime('%Y-%m-%dT%H:%M:%S')
+    )
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(profiles, f, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+    logger.info(f"Saved transcription profile for {model_name} on {host_key()} to {path}")
+
+
+def get_transcription_settings(model_name='base', path=PROFILE_PATH):
+    """
+    Resolve the transcription settings for a model
+
+    The defaults are overridden by the calibrated profile of this host, if
+    any, and then by the WHISPER_* environment variables.
+
+    Args:
+        model_name (str): Whisper model name
+        path (str): Profile file
+
+    Returns:
+        dict: Transcription settings
+    """
+    settings = default_settings()
+
+    if USE_PROFILE:
+        profile = load_profile(model_name, path)
+        if profile:
+            settings.update({key: value for key, value in profile.get('settings', {}).items() if key in settings})
+
+    for key, (variable, parse) in ENV_SETTINGS.items():
+        value = os.environ.get(variable)
+        if value:
+            try:
+                settings[key] = parse(value)
+            except ValueError:
+                logger.warning(f"Ignoring invalid {variable}={value}")
+
+    if settings['compute_type'] not in COMPUTE_TYPES:
+        logger.warning(f"Unknown compute type {settings['compute_type']}, using int8")
+        settings['compute_type'] = 'int8'
+
+    return settings
+
+
+def model_options(settings):
+    """Arguments of get_whisper_model for a set of settings"""
+    return {
+        'compute_type': settings['compute_type'],
+        'cpu_threads': int(settings['cpu_threads']),
+        'num_workers': int(settings['num_workers'])
+    }
+
+
+def decode_options(settings):
+    """Arguments of WhisperModel.transcribe for a set of settings"""
+    options = {'beam_size': int(settings['beam_size'])}
+    if settings['vad_filter']:
+        # Silence and music without speech are skipped instead of decoded
+        options['vad_filter'] = True
+        options['vad_parameters'] = {'min_silence_duration_ms': int(settings['vad_min_silence_ms'])}
+    return options
+
+
+def settings_digest(settings):
+    """
+    Identify the settings a transcript was made with, for cache keys
+
+    Args:
+        settings (dict): Transcription settings
+
+    Returns:
+        str: Short hex digest of the settings in TRANSCRIPT_SETTINGS
+    """
+    relevant = {key: settings[key] for key in TRANSCRIPT_SETTINGS}
+    if not relevant['vad_filter']:
+        # Unused without VAD
+        del relevant['vad_min_silence_ms']
+    return hashlib.sha256(json.dumps(relevant, sort_keys=True).encode('utf-8')).hexdigest()[:16]
@@ -0,0 +1,274 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from utils.translation_cache import get_translation_cache, normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Cues never contain line breaks, so a newline safely separates them in a batch
+BATCH_DELIMITER = '\n'
+
+# Limits for a single provider request
+MAX_BATCH_CHARS = 4500
+MAX_BATCH_SIZE = 50
+
+# Number of batches translated concurrently
+DEFAULT_MAX_WORKERS = int(os.environ.get('TRANSLATION_WORKERS', '4'))
+
+# Public endpoint used by Google's web clients; override to point at a stand-in server
+GOOGLE_TRANSLATE_URL = 'https://translate.googleapis.com/translate_a/single'
+
+
+class BatchMismatchError(Exception):
+    """Raised when a translated batch cannot be split back into its cues"""
+
+
+class GoogleTranslateProvider:
+    """
+    Google Translate client that reuses one HTTP session across requests
+    """
+
+    def __init__(self, base_url=None, timeout=15, max_retries=3, backoff=0.5, pool_size=DEFAULT_MAX_WORKERS):
+        """
+        Args:
+            base_url (str): Translation endpoint (defaults to TRANSLATION_BASE_URL or Google's)
+            timeout (float): Request timeout in seconds
+            max_retries (int): Retries for failed or rate-limited requests
+            backoff (float): Base delay in seconds for exponential backoff
+            pool_size (int): Number of pooled HTTP connections
+        """
+        self.base_url = base_url or os.environ.get('TRANSLATION_BASE_URL', GOOGLE_TRANSLATE_URL)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, pool_size))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def _request(self, text, source, target):
+        params = {'client': 'gtx', 'sl': source, 'tl': target, 'dt': 't'}
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                # POST keeps long batches out of the URL
+                response = self.session.post(self.base_url, params=params, data={'q': text}, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                response.raise_for_status()
+                return response.json()
+            except (requests.RequestException, ValueError) as e:
+                if attempt == self.max_retries:
+                    raise RuntimeError(f"Translation request failed after {attempt + 1} attempts: {str(e)}")
+                delay = self.backoff * (2 ** attempt) * (1 + random.random())
+                logger.warning(f"Translation request failed ({str(e)}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def translate(self, text, source, target):
+        """
+        Translate a single text
+
+        Args:
+            text (str): Text to translate
+            source (str): Source language code (or 'auto')
+            target (str): Target language code
+
+        Returns:
+            str: Translated text
+        """
+        data = self._request(text, source, target)
+        # The response is a nested list whose first item holds the translated sentences
+        return ''.join(part[0] for part in data[0] if part and part[0])
+
+    def translate_batch(self, texts, source, target):
+        """
+        Translate several texts in one request
+
+        Args:
+            texts (list): Texts without line breaks
+            source (str): Source language code (or 'auto')
+            target (str): Target language code
+
+        Returns:
+            list: Translated texts, one per input text
+        """
+        translated = self.translate(BATCH_DELIMITER.join(texts), source, target)
+        parts = [part.strip() for part in translated.split(BATCH_DELIMITER)]
+        if len(parts) != len(texts):
+            raise BatchMismatchError(f"Expected {len(texts)} translations, got {len(parts)}")
+        return parts
+
+
+class DeepTranslatorProvider:
+    """
+    Provider backed by deep_translator's GoogleTranslator
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def _translator(self, source, target):
+        from deep_translator import GoogleTranslator
+
+        # GoogleTranslator instances are bound to a language pair and are not
+        # shared between threads
+        cache = getattr(self._local, 'translators', None)
+        if cache is None:
+            cache = self._local.translators = {}
+        if (source, target) not in cache:
+            cache[(source, target)] = GoogleTranslator(source=source, target=target)
+        return cache[(source, target)]
+
+    def translate(self, text, source, target):
+        return self._translator(source, target).translate(text)
+
+    def translate_batch(self, texts, source, target):
+        translated = self.translate(BATCH_DELIMITER.join(texts), source, target) or ''
+        parts = [part.strip() for part in translated.split(BATCH_DELIMITER)]
+        if len(parts) != len(texts):
+            raise BatchMismatchError(f"Expected {len(texts)} translations, got {len(parts)}")
+        return parts
+
+
+PROVIDERS = {
+    'google': GoogleTranslateProvider,
+    'deep_translator': DeepTranslatorProvider,
+}
+
+_default_provider = None
+_default_provider_lock = threading.Lock()
+
+
+def get_translation_provider():
+    """
+    Return the shared provider selected by TRANSLATION_PROVIDER ('google' or 'deep_translator')
+    """
+    global _default_provider
+
+    with _default_provider_lock:
+        if _default_provider is None:
+            name = os.environ.get('TRANSLATION_PROVIDER', 'google')
+            provider_class = PROVIDERS.get(name)
+            if provider_class is None:
+                logger.warning(f"Unknown translation provider '{name}', using 'google'")
+                provider_class = GoogleTranslateProvider
+            _default_provider = provider_class()
+        return _default_provider
+
+
+def make_batches(texts, max_chars=MAX_BATCH_CHARS, max_size=MAX_BATCH_SIZE):
+    """
+    Group text indices into batches that fit in one request
+
+    Args:
+        texts (list): Texts to translate
+        max_chars (int): Maximum characters per batch, including delimiters
+        max_size (int): Maximum texts per batch
+
+    Returns:
+        list: Lists of indices into texts
+    """
+    batches = []
+    current = []
+    current_chars = 0
+
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+
+        length = len(text) + len(BATCH_DELIMITER)
+        if current and (current_chars + length > max_chars or len(current) >= max_size):
+            batches.append(current)
+            current = []
+            current_chars = 0
+
+        current.append(i)
+        current_chars += length
+
+    if current:
+        batches.append(current)
+
+    return batches
+
+
+def _translate_batch(provider, texts, source, target):
+    """Translate a batch, splitting it in half when the reply cannot be aligned"""
+    if len(texts) == 1:
+        return [provider.translate(texts[0], source, target)]
+
+    try:
+        return provider.translate_batch(texts, source, target)
+    except BatchMismatchError as e:
+        logger.warning(f"{str(e)}; splitting batch of {len(texts)}")
+        middle = len(texts) // 2
+        return (_translate_batch(provider, texts[:middle], source, target) +
+                _translate_batch(provider, texts[middle:], source, target))
+
+
+def translate_texts(texts, source, target, provider=None, max_workers=DEFAULT_MAX_WORKERS,
+                    max_chars=MAX_BATCH_CHARS, max_size=MAX_BATCH_SIZE, cache=None):
+    """
+    Translate many texts using the translation cache and batched, concurrent
+    provider requests for the rest
+
+    Args:
+        texts (list): Texts to translate (line breaks are replaced by spaces)
+        source (str): Source language code (or 'auto')
+        target (str): Target language code
+        provider: Object with translate() and translate_batch() methods
+            (defaults to get_translation_provider())
+        max_workers (int): Number of batches translated concurrently
+        max_chars (int): Maximum characters per batch
+        max_size (int): Maximum texts per batch
+        cache (TranslationCache): Translation memory (defaults to get_translation_cache())
+
+    Returns:
+        list: Translated texts, in the same order (empty texts stay empty)
+    """
+    provider = provider or get_translation_provider()
+    if cache is None:
+        cache = get_translation_cache()
+
+    keys = [normalize_text(text) for text in texts]
+    translations = {}
+    if cache:
+        try:
+            translations = cache.get_many(keys, source, target)
+        except Exception as e:
+            # A locked or damaged translation memory only costs the cache hits
+            logger.error(f"Error reading translations from cache: {str(e)}")
+
+    # Only unique texts missing from the cache go to the provider
+    missing = [key for key in dict.fromkeys(keys) if key and key not in translations]
+    if cache:
+        logger.info(f"Translation cache: {len(translations)} hits, {len(missing)} misses")
+
+    batches = make_batches(missing, max_chars=max_chars, max_size=max_size)
+    if batches:
+        logger.info(f"Translating {len(missing)} texts in {len(batches)} batches")
+
+        translated_missing = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+            futures = [
+                (batch, executor.submit(_translate_batch, provider, [missing[i] for i in batch], source, target))
+                for batch in batches
+            ]
+            for batch, future in futures:
+                for i, translated in zip(batch, future.result()):
+                    # Ensure translated text has no line breaks
+                    translated_missing[missing[i]] = (translated or '').replace('\n', ' ').replace('\r', '')
+
+        if cache:
+            try:
+                cache.put_many(translated_missing, source, target)
+            except Exception as e:
+                logger.error(f"Error storing translations in cache: {str(e)}")
+        translations.update(translated_missing)
+
+    return [translations.get(key, '') if key else '' for key in keys]
@@ -0,0 +1,238 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+import unicodedata
+from utils.json_store import CACHE_ROOT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.environ.get('TRANSLATION_CACHE_PATH', os.path.join(CACHE_ROOT, 'translations.sqlite3'))
+DEFAULT_MAX_ENTRIES = int(os.environ.get('TRANSLATION_CACHE_MAX_ENTRIES', '200000'))
+DEFAULT_TTL_SECONDS = int(os.environ.get('TRANSLATION_CACHE_TTL_DAYS', '30')) * 86400
+
+# Prune expired and excess entries after this many writes
+PRUNE_INTERVAL = 1000
+
+# SQLite limits the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+
+
+def normalize_text(text):
+    """
+    Normalize text for use as a cache key
+
+    Args:
+        text (str): Source text
+
+    Returns:
+        str: NFC-normalized text with collapsed whitespace
+    """
+    return re.sub(r'\s+', ' ', unicodedata.normalize('NFC', text or '')).strip()
+
+
+class TranslationCache:
+    """
+    Persistent translation memory stored in SQLite
+
+    Entries are keyed by (source language, target language, normalized text),
+    expire after a TTL and are evicted least recently used beyond max_entries.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        """
+        Args:
+            path (str): Path to the SQLite database file
+            max_entries (int): Maximum number of cached translations
+            ttl_seconds (int): Age after which a translation is considered stale
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS translations (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (source, target, key)
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('INSERT OR IGNORE INTO stats (id, hits, misses) VALUES (1, 0, 0)')
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are not shared across threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, texts, source, target):
+        """
+        Look up cached translations
+
+        Args:
+            texts (list): Source texts
+            source (str): Source language code
+            target (str): Target language code
+
+        Returns:
+            dict: Normalized source text -> translation, for cache hits only
+        """
+        keys = list({normalize_text(text) for text in texts if normalize_text(text)})
+        if not keys:
+            return {}
+
+        now = time.time()
+        found = {}
+        conn = self._connect()
+
+        with conn:
+            for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+                chunk = keys[i:i + QUERY_CHUNK_SIZE]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT key, translation FROM translations '
+                    f'WHERE source = ? AND target = ? AND created_at >= ? AND key IN ({placeholders})',
+                    [source, target, now - self.ttl_seconds] + chunk
+                ).fetchall()
+                found.update(rows)
+
+            if found:
+                hit_keys = list(found)
+                for i in range(0, len(hit_keys), QUERY_CHUNK_SIZE):
+                    chunk = hit_keys[i:i + QUERY_CHUNK_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    conn.execute(
+                        f'UPDATE translations SET last_used = ? '
+                        f'WHERE source = ? AND target = ? AND key IN ({placeholders})',
+                        [now, source, target] + chunk
+                    )
+
+            hits = len(found)
+            misses = len(keys) - hits
+            conn.execute('UPDATE stats SET hits = hits + ?, misses = misses + ? WHERE id = 1', (hits, misses))
+
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+        return found
+
+    def put_many(self, translations, source, target):
+        """
+        Store translations
+
+        Args:
+            translations (dict): Source text -> translated text
+            source (str): Source language code
+            target (str): Target language code
+        """
+        now = time.time()
+        rows = [
+            (source, target, normalize_text(text), translated, now, now)
+            for text, translated in translations.items()
+            if normalize_text(text) and translated
+        ]
+        if not rows:
+            return
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO translations (source, target, key, translation, created_at, last_used) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                rows
+            )
+
+        with self._lock:
+            self._writes += len(rows)
+            should_prune = self._writes >= PRUNE_INTERVAL
+            if should_prune:
+                self._writes = 0
+
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries and evict the least recently used beyond max_entries"""
+        conn = self._connect()
+        with conn:
+            expired = conn.execute(
+                'DELETE FROM translations WHERE created_at < ?', (time.time() - self.ttl_seconds,)
+            ).rowcount
+            count = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+            evicted = 0
+            if count > self.max_entries:
+                evicted = conn.execute(
+                    'DELETE FROM translations WHERE rowid IN '
+                    '(SELECT rowid FROM translations ORDER BY last_used ASC LIMIT ?)',
+                    (count - self.max_entries,)
+                ).rowcount
+
+        if expired or evicted:
+            logger.info(f"Translation cache pruned {expired} expired and {evicted} least recently used entries")
+
+    def stats(self):
+        """
+        Return cache counters
+
+        Returns:
+            dict: Entry count, hits and misses of this process and of all processes
+        """
+        conn = self._connect()
+        entries = conn.execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+        total_hits, total_misses = conn.execute('SELECT hits, misses FROM stats WHERE id = 1').fetchone()
+        return {
+            'entries': entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'total_hits': total_hits,
+            'total_misses': total_misses
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_translation_cache():
+    """
+    Return the shared translation cache, or None if disabled with TRANSLATION_CACHE=0
+    """
+    global _default_cache
+
+    if os.environ.get('TRANSLATION_CACHE', '1') == '0':
+        return None
+
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = TranslationCache()
+            except Exception as e:
+                logger.error(f"Error opening translation cache: {str(e)}")
+                return None
+        return _default_cache
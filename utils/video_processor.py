@@ -1,11 +1,29 @@
 import os
 import subprocess
-import json
 import logging
 import shlex
+import threading
+import wave
+import numpy as np
+from utils.ass_writer import write_ass, DEFAULT_FONT
+from utils.media_index import media_info
+from utils.subtitle_formats import iter_cues
 
 logger = logging.getLogger(__name__)
 
+# Length of the HLS segments written by embed_subtitles_hls
+HLS_SEGMENT_SECONDS = float(os.environ.get('HLS_SEGMENT_SECONDS', '4'))
+
+def require_audio(video_path):
+    """
+    Fail early, before FFmpeg runs, if the media index shows no audio stream
+
+    Args:
+        video_path (str): Path to the input video file
+    """
+    if media_info(video_path).get('audio') is None:
+        raise RuntimeError(f"Failed to extract audio: {os.path.basename(video_path)} has no audio track")
+
 def extract_audio(video_path, output_audio_path):
     """
     Extract audio from a video file using FFmpeg
@@ -15,6 +33,7 @@ def extract_audio(video_path, output_audio_path):
         output_audio_path (str): Path where the extracted audio will be saved
     """
     try:
+        require_audio(video_path)
         command = [
             'ffmpeg', '-i', video_path, 
             '-vn', '-acodec', 'pcm_s16le', 
@@ -33,9 +52,101 @@ def extract_audio(video_path, output_audio_path):
         logger.error(f"Error extracting audio: {str(e)}")
         raise
 
+def extract_audio_array(video_path, sample_rate=16000, chunk_size=1024 * 1024):
+    """
+    Decode the audio of a video file straight into memory using FFmpeg
+
+    FFmpeg writes raw 16-bit mono PCM to stdout, which is read incrementally
+    and converted to the float32 format expected by faster-whisper, so no
+    intermediate WAV file is written.
+
+    Args:
+        video_path (str): Path to the input video file
+        sample_rate (int): Output sample rate in Hz
+        chunk_size (int): Number of bytes read from FFmpeg at a time
+
+    Returns:
+        numpy.ndarray: Mono float32 samples in the range [-1.0, 1.0]
+    """
+    command = [
+        'ffmpeg', '-nostdin', '-i', video_path,
+        '-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ar', str(sample_rate), '-ac', '1',
+        'pipe:1'
+    ]
+
+    try:
+        require_audio(video_path)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        # Drain stderr in the background so FFmpeg never blocks on a full pipe
+        stderr_chunks = []
+        stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_thread.start()
+
+        pcm = bytearray()
+        while True:
+            data = process.stdout.read(chunk_size)
+            if not data:
+                break
+            pcm.extend(data)
+
+        return_code = process.wait()
+        stderr_thread.join()
+
+        if return_code != 0:
+            error_output = b''.join(stderr_chunks).decode(errors='replace')
+            logger.error(f"FFmpeg error: {error_output}")
+            raise RuntimeError(f"Failed to extract audio: {error_output}")
+
+        audio = pcm_to_float(pcm)
+        logger.info(f"Decoded {len(audio) / sample_rate:.1f}s of audio from {video_path} in memory")
+
+        return audio
+    except RuntimeError:
+        raise
+    except Exception as e:
+        logger.error(f"Error extracting audio: {str(e)}")
+        raise
+
+def pcm_to_float(pcm):
+    """
+    Convert 16-bit little-endian PCM bytes to float32 samples
+
+    Args:
+        pcm (bytes or bytearray): Raw samples as written by FFmpeg's s16le format
+
+    Returns:
+        numpy.ndarray: Samples in the range [-1.0, 1.0]
+    """
+    # Drop a trailing odd byte, if any, before reinterpreting as int16
+    if len(pcm) % 2:
+        pcm = pcm[:-1]
+
+    return np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+
+def write_wav(audio, output_audio_path, sample_rate=16000):
+    """
+    Write float32 samples to a 16-bit mono WAV file
+
+    Args:
+        audio (numpy.ndarray): Mono float32 samples in the range [-1.0, 1.0]
+        output_audio_path (str): Path where the WAV file will be saved
+        sample_rate (int): Sample rate in Hz
+    """
+    samples = np.clip(np.round(audio * 32768.0), -32768, 32767).astype(np.int16)
+    with wave.open(output_audio_path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(samples.tobytes())
+
 def get_video_info(video_path):
     """
-    Get information about a video file using FFprobe
+    Get information about a video file from the media index
+
+    The file is probed with FFprobe the first time only; later calls, from
+    any stage, read the stored result.
     
     Args:
         video_path (str): Path to the video file
@@ -44,28 +155,27 @@ def get_video_info(video_path):
         dict: Information about the video file
     """
     try:
-        command = [
-            'ffprobe', '-v', 'quiet', '-print_format', 'json', 
-            '-show_format', '-show_streams', video_path
-        ]
-        
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        video_info = json.loads(result.stdout)
+        entry = media_info(video_path)
         
         # Extract relevant information
         info = {
-            'format': video_info.get('format', {}).get('format_name', 'unknown'),
-            'duration': float(video_info.get('format', {}).get('duration', 0)),
-            'size': int(video_info.get('format', {}).get('size', 0))
+            'format': entry['format']['format_name'],
+            'duration': entry['format']['duration'],
+            'size': entry['format']['size']
         }
         
-        # Get video stream information
-        for stream in video_info.get('streams', []):
-            if stream.get('codec_type') == 'video':
-                info['width'] = stream.get('width', 0)
-                info['height'] = stream.get('height', 0)
-                info['codec'] = stream.get('codec_name', 'unknown')
-                break
+        video = entry.get('video')
+        if video:
+            info['width'] = video.get('width', 0)
+            info['height'] = video.get('height', 0)
+            info['codec'] = video.get('codec', 'unknown')
+            info['frame_rate'] = video.get('frame_rate', 0.0)
+        
+        audio = entry.get('audio')
+        if audio:
+            info['audio_codec'] = audio.get('codec', 'unknown')
+            info['sample_rate'] = audio.get('sample_rate', 0)
+            info['channels'] = audio.get('channels', 0)
         
         return info
     except subprocess.CalledProcessError as e:
@@ -75,13 +185,83 @@ def get_video_info(video_path):
         logger.error(f"Error getting video info: {str(e)}")
         raise
 
+def ass_filter(ass_path, font=DEFAULT_FONT):
+    """
+    Build the FFmpeg filter that burns in an ASS file
+    
+    Args:
+        ass_path (str): Path to the ASS file
+        font (str): Font file; its folder is searched for the style's font
+        
+    Returns:
+        str: Filter for -vf
+    """
+    # Escape characters that are special inside a filter graph
+    def escape(value):
+        return value.replace('\\', '/').replace(':', '\\:').replace("'", "\\'")
+    
+    video_filter = f"ass={escape(ass_path)}"
+    
+    fonts_dir = os.path.dirname(font or '')
+    if fonts_dir and os.path.isdir(fonts_dir):
+        video_filter += f":fontsdir={escape(fonts_dir)}"
+    return video_filter
+
+def preflight_filter(video_path, video_filter, start=0):
+    """
+    Run the filter graph over a single frame to catch errors before a full encode
+    
+    Args:
+        video_path (str): Path to the input video file
+        video_filter (str): Filter for -vf
+        start (float): Time of the frame to test, in seconds
+        
+    Raises:
+        RuntimeError: If FFmpeg rejects the filter graph
+    """
+    command = [
+        'ffmpeg', '-v', 'error',
+        '-ss', f"{start:.3f}", '-i', video_path,
+        '-vf', video_filter,
+        '-frames:v', '1', '-an',
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(command, capture_output=True)
+    if result.returncode != 0:
+        error = result.stderr.decode(errors='replace') if result.stderr else 'Unknown error'
+        logger.error(f"Subtitle filter preflight failed: {error}")
+        raise RuntimeError(f"Invalid subtitle filter: {error}")
+
+def prepare_burn_filter(video_path, subtitles_path, **style):
+    """
+    Write the styled ASS file next to the SRT file and check its filter graph
+
+    Args:
+        video_path (str): Path to the input video file
+        subtitles_path (str): Path to the SRT subtitles file
+        **style: Style options accepted by embed_subtitles
+
+    Returns:
+        str: FFmpeg video filter that burns the subtitles in
+    """
+    logger.info(f"Subtitle style: {style}")
+    
+    ass_path = os.path.splitext(subtitles_path)[0] + '.ass'
+    write_ass(read_srt_cues(subtitles_path), ass_path, **style)
+    video_filter = ass_filter(ass_path, style.get('font', DEFAULT_FONT))
+    preflight_filter(video_path, video_filter)
+    return video_filter
+
 def embed_subtitles(video_path, subtitles_path, output_path, 
                     font_size=24, font_color='white', bg_color='black', position='bottom', 
                     custom_position=False, custom_pos_x=50, custom_pos_y=90, subtitle_width=80,
-                    font='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'):
+                    font=DEFAULT_FONT):
     """
     Embed subtitles into a video using FFmpeg directly
     
+    The SRT file is converted to an ASS file carrying the style, the filter
+    graph is checked on one frame, and the video is encoded once.
+    
     Args:
         video_path (str): Path to the input video file
         subtitles_path (str): Path to the SRT subtitles file
@@ -89,354 +269,230 @@ def embed_subtitles(video_path, subtitles_path, output_path,
         font_size (int): Font size for subtitles
         font_color (str): Font color for subtitles
         bg_color (str): Background color for subtitles
-        position (str): Position of subtitles ('bottom', 'top', 'center')
+        position (str): Position of subtitles ('bottom', 'top', 'center', 'custom')
+        custom_position (bool): Place subtitles at custom_pos_x/custom_pos_y
+        custom_pos_x (int): Horizontal position in percent (with position='custom')
+        custom_pos_y (int): Vertical position in percent (with position='custom')
+        subtitle_width (int): Width of the subtitle area in percent
         font (str): Path to font file for subtitles
     """
+    video_filter = prepare_burn_filter(
+        video_path, subtitles_path,
+        font_size=font_size, font_color=font_color, bg_color=bg_color, position=position,
+        custom_position=custom_position, custom_pos_x=custom_pos_x, custom_pos_y=custom_pos_y,
+        subtitle_width=subtitle_width, font=font
+    )
+    
+    command = [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-vf', video_filter,
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-preset', 'medium',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    
+    # Run FFmpeg
+    cmd_str = ' '.join(command)
+    logger.info(f"Running FFmpeg command to embed subtitles: {cmd_str}")
     try:
-        # Determine vertical position (default to bottom)
-        vertical_position = position.lower()
-        if vertical_position not in ['bottom', 'top', 'center', 'custom']:
-            vertical_position = 'bottom'
-            
-        # Subtitle width adjustment (calculate MarginL and MarginR)
-        # For a width of 80%, we would have 10% margin on each side (for center alignment)
-        margin_percent = int((100 - subtitle_width) / 2)
-        margin_l = margin_percent
-        margin_r = margin_percent
-            
-        # Handle custom positioning
-        if custom_position and vertical_position == 'custom':
-            logger.info(f"Using custom subtitle position: x={custom_pos_x}%, y={custom_pos_y}%")
-            # Calculate alignment based on custom position
-            # We'll use 2 (bottom center) as default
-            alignment = '2'
-            
-            # Update the position and alignment based on the custom position
-            if custom_pos_y < 33:  # Top third of the screen
-                alignment = '6'  # Top center
-            elif custom_pos_y < 66:  # Middle third
-                alignment = '10'  # Middle center
-            else:  # Bottom third
-                alignment = '2'  # Bottom center
-        else:
-            # Default positions
-            # Convert position to ffmpeg subtitle style parameters
-            position_map = {
-                'bottom': '(main_w-text_w)/2:main_h-(text_h*2)',
-                'top': '(main_w-text_w)/2:text_h',
-                'center': '(main_w-text_w)/2:(main_h-text_h)/2'
-            }
-            
-            # Determine the alignment value based on position
-            alignment_map = {
-                'bottom': '2',  # Bottom center
-                'top': '6',     # Top center
-                'center': '10'  # Middle center
-            }
-            alignment = alignment_map.get(position, '2')
-        
-        # Create ffmpeg command with proper escaping of the subtitle path
-        escaped_subtitles_path = subtitles_path.replace("'", "'\\''")
-        
-        
-        # Additional style options to enforce single-line subtitles
-        # BorderStyle=4 adds an opaque box background, 1 for outline only (transparent bg)
-        # MarginV adds vertical margin to prevent overlap
-        # LineSpacing=0 ensures no additional line spacing
-        # Bold=1 makes text bold for better readability
-        # WrapStyle=0 forces one line per subtitle (crucial)
-        # PrimaryColour sets text color - uses FFmpeg ASS format (ABGR)
-        # BackColour sets background color - uses FFmpeg ASS format (ABGR)
-        
-        # Handle transparent background
-        if bg_color.lower() == 'transparent':
-            border_style = "1"  # Outline only
-            outline_color = "&H000000&"  # Black outline for better visibility
-            outline_size = "2"  # Thicker outline for better visibility with transparent bg
-        else:
-            border_style = "4"  # Opaque box
-            outline_color = "&H000000&"  # Default black outline
-            outline_size = "1"  # Standard outline size
-        
-        # Map common color names to ASS hex format (ABGR)
-        color_map = {
-            'white': '&HFFFFFF&',
-            'black': '&H000000&',
-            'yellow': '&H00FFFF&',  # ABGR format
-            'lime': '&H00FF00&',
-            'cyan': '&HFFFF00&',
-            'magenta': '&HFF00FF&',
-            'red': '&H0000FF&',
-            'orange': '&H0080FF&',
-            'aliceblue': '&HFFF8F0&',
-            'pink': '&HC0C0FF&',
-            'navy': '&H800000&',
-            'darkred': '&H000080&',
-            'darkgreen': '&H008000&',
-            'purple': '&H800080&',
-            'gray': '&H808080&',
-            'brown': '&H2A2AA5&',
-            'transparent': '&H00FFFFFF&'  # Fully transparent
-        }
-        
-        # Get color codes or use defaults
-        primary_color = color_map.get(font_color.lower(), '&HFFFFFF&')  # Default white
-        back_color = color_map.get(bg_color.lower(), '&H000000&')  # Default black
-        
-        logger.info(f"Using font color: {font_color} ({primary_color}), bg color: {bg_color} ({back_color})")
-        logger.info(f"Font size setting: {font_size}px")
-        
-        # Implementation for actually using correct font size
-        # For some reason, the ASS subtitle format in FFmpeg needs special handling for small font sizes
-        # The strategy: we use the requested font size and adjust everything else to make it work
-        
-        # For small sizes (16-20px), we need to increase the base resolution while keeping the font size
-        if int(font_size) <= 20:
-            # Use higher resolution with same font size for small font settings
-            play_res_x = 1920  # Higher resolution
-            play_res_y = 1080  # Higher resolution
-            shadow_size = 0    # Disable shadow for small fonts
-            outline_size = 1   # Minimal outline for small fonts
-            font_scale = 1.0   # Normal scale
-        else:
-            # For larger fonts, use standard resolution
-            play_res_x = 1280
-            play_res_y = 720
-            shadow_size = 0    # Disable shadow
-            outline_size = outline_size  # Use calculated outline size
-            font_scale = 1.0   # Normal scale
-            
-        logger.info(f"Using font size: {font_size}px with resolution {play_res_x}x{play_res_y}")
-            
-        style_opts = (
-            f"FontName=DejaVuSans,"
-            f"FontSize={font_size},"
-            f"PlayResX={play_res_x},"
-            f"PlayResY={play_res_y},"
-            f"ScaledBorderAndShadow=yes,"
-            f"Shadow={shadow_size},"
-            f"Alignment={alignment},"
-            f"MarginV=35,"
-            f"MarginL={margin_l},"
-            f"MarginR={margin_r},"
-            f"BorderStyle={border_style},"
-            f"OutlineColour={outline_color},"
-            f"Outline={outline_size},"
-            f"PrimaryColour={primary_color},"
-            f"BackColour={back_color},"
-            f"LineSpacing=0,"
-            f"Bold=1,"
-            f"WrapStyle=0,"
-            f"MaxLines=1"
-        )
-        
-        # Modified approach without using fontsizes parameter since it's not supported
-        command = [
-            'ffmpeg',
-            '-i', video_path,
-            '-vf', f"subtitles={subtitles_path}:force_style='{style_opts}'",
-            '-c:v', 'libx264',
-            '-c:a', 'aac',
-            '-preset', 'medium',
-            '-movflags', '+faststart',
-            output_path
-        ]
-        
-        # Run FFmpeg
-        cmd_str = ' '.join(command)
-        logger.info(f"Running FFmpeg command to embed subtitles: {cmd_str}")
-        try:
-            result = subprocess.run(command, check=True, capture_output=True)
-            logger.info(f"Successfully embedded subtitles in {output_path}")
-            return True
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg command failed: {cmd_str}")
-            logger.error(f"Error output: {e.stderr.decode() if e.stderr else 'No error output'}")
-            logger.error(f"Return code: {e.returncode}")
-            raise
+        subprocess.run(command, check=True, capture_output=True)
+        logger.info(f"Successfully embedded subtitles in {output_path}")
+        return True
+    except subprocess.CalledProcessError as e:
+        error = e.stderr.decode(errors='replace') if e.stderr else 'No error output'
+        logger.error(f"FFmpeg command failed: {cmd_str}")
+        logger.error(f"Error output: {error}")
+        raise RuntimeError(f"Failed to embed subtitles: {error}")
+
+def embed_subtitles_hls(video_path, subtitles_path, playlist_path, segment_seconds=HLS_SEGMENT_SECONDS,
+                        progress_callback=None, **style):
+    """
+    Burn subtitles in while writing fragmented-MP4 HLS segments
+
+    FFmpeg adds each segment to an EVENT playlist as soon as it is complete,
+    so players can start on the first segments while later ones are still
+    being encoded. Keyframes are forced at every segment boundary, so the
+    segments have the requested length.
+
+    Args:
+        video_path (str): Path to the input video file
+        subtitles_path (str): Path to the SRT subtitles file
+        playlist_path (str): Path of the playlist; segments are written next to it
+        segment_seconds (float): Target segment length
+        progress_callback (callable): Called with the encoded fraction (0.0 to 1.0)
+        **style: Style options accepted by embed_subtitles
+    """
+    video_filter = prepare_burn_filter(video_path, subtitles_path, **style)
+    duration = get_video_info(video_path)['duration']
+    stream_dir = os.path.dirname(playlist_path)
+    
+    command = [
+        'ffmpeg', '-y', '-v', 'error', '-nostats', '-progress', 'pipe:1',
+        '-i', video_path,
+        '-vf', video_filter,
+        '-c:v', 'libx264',
+        '-c:a', 'aac',
+        '-preset', 'medium',
+        '-force_key_frames', f"expr:gte(t,n_forced*{segment_seconds})",
+        '-f', 'hls',
+        '-hls_time', str(segment_seconds),
+        '-hls_playlist_type', 'event',
+        '-hls_segment_type', 'fmp4',
+        '-hls_fmp4_init_filename', 'init.mp4',
+        # Segments are renamed into place, so a player never reads a partial one
+        '-hls_flags', 'independent_segments+temp_file',
+        '-hls_segment_filename', os.path.join(stream_dir, 'segment_%05d.m4s'),
+        playlist_path
+    ]
     
+    logger.info(f"Running FFmpeg command to stream subtitled segments: {' '.join(command)}")
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    
+    # Drain stderr in the background so FFmpeg never blocks on a full pipe
+    stderr_chunks = []
+    stderr_thread = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+    stderr_thread.start()
+    
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if key == 'out_time_us' and progress_callback and duration and value.isdigit():
+            progress_callback(min(int(value) / 1e6 / duration, 1.0))
+    
+    return_code = process.wait()
+    stderr_thread.join()
+    if return_code != 0:
+        error = ''.join(stderr_chunks) or 'No error output'
+        logger.error(f"FFmpeg error: {error}")
+        raise RuntimeError(f"Failed to embed subtitles: {error}")
+    
+    logger.info(f"Successfully streamed subtitled segments to {playlist_path}")
+    return True
+
+def remux_hls(playlist_path, output_path):
+    """
+    Join HLS segments into a single MP4 without re-encoding
+
+    Args:
+        playlist_path (str): Path of the finished playlist
+        output_path (str): Path of the MP4 file
+    """
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', playlist_path,
+        '-map', '0', '-c', 'copy',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+        logger.info(f"Remuxed {playlist_path} to {output_path}")
+        return True
     except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg error: {e.stderr.decode() if e.stderr else 'Unknown error'}")
-        
-        # Fall back to a simpler approach with modified subtitle file
-        try:
-            logger.info("Falling back to alternative subtitle embedding approach")
-            
-            # Create a temporary ASS subtitle file with specific styling to ensure single line
-            temp_ass_path = subtitles_path + '.ass'
-            
-            # Get the position type again for the fallback method
-            fallback_vertical_position = position.lower()
-            if fallback_vertical_position not in ['bottom', 'top', 'center', 'custom']:
-                fallback_vertical_position = 'bottom'
-                
-            # Handle custom positioning for fallback method
-            if custom_position and fallback_vertical_position == 'custom':
-                # Calculate fallback alignment based on custom position
-                if custom_pos_y < 33:  # Top third of the screen
-                    fallback_alignment = '6'  # Top center
-                elif custom_pos_y < 66:  # Middle third
-                    fallback_alignment = '10'  # Middle center
-                else:  # Bottom third
-                    fallback_alignment = '2'  # Bottom center
-            else:
-                # Define alignment map for the fallback approach
-                fallback_alignment_map = {
-                    'bottom': '2',  # Bottom center
-                    'top': '6',     # Top center
-                    'center': '10'  # Middle center
-                }
-                
-                # Use the position to determine the alignment value
-                fallback_alignment = fallback_alignment_map.get(position, '2')
-            
-            # Calculate margin percentages for fallback method
-            # Recalculate to avoid using potentially unbound variables
-            fallback_margin_percent = int((100 - subtitle_width) / 2)
-            fallback_margin_l = fallback_margin_percent
-            fallback_margin_r = fallback_margin_percent
-            
-            # Reuse the same color handling from the main method
-            # Handle transparent background for fallback method
-            if bg_color.lower() == 'transparent':
-                fallback_border_style = "1"  # Outline only
-                fallback_outline_color = "&H000000&"  # Black outline
-                fallback_outline_size = "2"  # Thicker outline
-            else:
-                fallback_border_style = "4"  # Opaque box
-                fallback_outline_color = "&H000000&"  # Black outline
-                fallback_outline_size = "1"  # Standard outline
-               
-            # Define fallback color map (same as the one above)
-            fallback_color_map = {
-                'white': '&HFFFFFF&',
-                'black': '&H000000&',
-                'yellow': '&H00FFFF&',  # ABGR format
-                'lime': '&H00FF00&',
-                'cyan': '&HFFFF00&',
-                'magenta': '&HFF00FF&',
-                'red': '&H0000FF&',
-                'orange': '&H0080FF&',
-                'aliceblue': '&HFFF8F0&',
-                'pink': '&HC0C0FF&',
-                'navy': '&H800000&',
-                'darkred': '&H000080&',
-                'darkgreen': '&H008000&',
-                'purple': '&H800080&',
-                'gray': '&H808080&',
-                'brown': '&H2A2AA5&',
-                'transparent': '&H00FFFFFF&'  # Fully transparent
-            }
-                
-            # Use our fallback color map
-            fallback_primary_color = fallback_color_map.get(font_color.lower(), '&HFFFFFF&')  # Default white
-            fallback_back_color = fallback_color_map.get(bg_color.lower(), '&H000000&')  # Default black
-            
-            logger.info(f"Fallback using font color: {font_color} ({fallback_primary_color}), bg color: {bg_color} ({fallback_back_color})")
-            
-            # Convert SRT to ASS with custom style
-            style_options = (
-                f"Style='FontSize={font_size},"
-                f"Bold=1,"
-                f"Alignment={fallback_alignment},"
-                f"MarginL={fallback_margin_l},"
-                f"MarginR={fallback_margin_r},"
-                f"BorderStyle={fallback_border_style},"
-                f"OutlineColour={fallback_outline_color},"
-                f"Outline={fallback_outline_size},"
-                f"PrimaryColour={fallback_primary_color},"
-                f"BackColour={fallback_back_color},"
-                f"WrapStyle=0,"
-                f"MaxLines=1'"
-            )
-            
-            convert_cmd = [
-                'ffmpeg',
-                '-i', subtitles_path,
-                '-c:s', 'ass',
-                '-map_metadata', '-1',
-                '-metadata:s:s:0', style_options,
-                temp_ass_path
-            ]
-            
-            # Log the conversion command
-            convert_cmd_str = ' '.join(convert_cmd)
-            logger.info(f"Converting SRT to ASS with command: {convert_cmd_str}")
-            
-            try:
-                result = subprocess.run(convert_cmd, check=True, capture_output=True)
-                logger.info(f"Converted SRT to ASS format: {temp_ass_path}")
-                
-                # Use the ASS file with specific style settings
-                # Add custom ASS style filter to ensure single line display
-                logger.info(f"Fallback style using font size: {font_size}px")
-                
-                # Similar font size adjustment for fallback method
-                # For small sizes, we use higher resolution
-                if int(font_size) <= 20:
-                    fallback_play_res_x = 1920  # Higher resolution
-                    fallback_play_res_y = 1080  # Higher resolution
-                    fallback_shadow_size = 0    # No shadow
-                    fallback_font_size = font_size
-                else:
-                    fallback_play_res_x = 1280  # Standard resolution
-                    fallback_play_res_y = 720   # Standard resolution
-                    fallback_shadow_size = 0    # No shadow
-                    fallback_font_size = font_size
-                    
-                logger.info(f"Fallback font size: {fallback_font_size}px with resolution {fallback_play_res_x}x{fallback_play_res_y}")
-                
-                custom_ass_style = (
-                    f"FontName=DejaVuSans,"  # Explicit font name
-                    f"FontSize={fallback_font_size},"  # Font size
-                    f"PlayResX={fallback_play_res_x},"  # Resolution width
-                    f"PlayResY={fallback_play_res_y},"  # Resolution height
-                    f"ScaledBorderAndShadow=yes,"  # Scale borders with font
-                    f"Shadow={fallback_shadow_size},"  # Shadow size
-                    f"Alignment={fallback_alignment},"
-                    f"MarginV=35,"
-                    f"MarginL={fallback_margin_l},"
-                    f"MarginR={fallback_margin_r},"
-                    f"BorderStyle={fallback_border_style},"
-                    f"OutlineColour={fallback_outline_color},"
-                    f"Outline={fallback_outline_size},"
-                    f"PrimaryColour={fallback_primary_color},"
-                    f"BackColour={fallback_back_color},"
-                    f"LineSpacing=0,"
-                    f"Bold=1,"
-                    f"WrapStyle=0,"
-                    f"MaxLines=1"
-                )
-                
-                # Modified fallback approach without using fontsizes parameter
-                command = [
-                    'ffmpeg',
-                    '-i', video_path,
-                    '-vf', f"ass={temp_ass_path}:fontsdir=/usr/share/fonts/truetype/dejavu:force_style='{custom_ass_style}'",
-                    '-c:v', 'libx264',
-                    '-c:a', 'aac',
-                    '-preset', 'medium',
-                    '-movflags', '+faststart',
-                    output_path
-                ]
-                
-                fallback_cmd_str = ' '.join(command)
-                logger.info(f"Embedding subtitles with fallback method: {fallback_cmd_str}")
-                
-                result2 = subprocess.run(command, check=True, capture_output=True)
-                logger.info(f"Successfully embedded subtitles using fallback method in {output_path}")
-                return True
-            except subprocess.CalledProcessError as conv_err:
-                logger.error(f"SRT to ASS conversion failed: {conv_err.stderr.decode() if conv_err.stderr else 'No error output'}")
-                logger.error(f"Return code: {conv_err.returncode}")
-                raise
-            
-        except subprocess.CalledProcessError as e2:
-            logger.error(f"FFmpeg fallback error: {e2.stderr.decode() if e2.stderr else 'Unknown error'}")
-            raise RuntimeError(f"Failed to embed subtitles: {e.stderr.decode() if e.stderr else 'Unknown error'}")
+        error = e.stderr.decode(errors='replace') if e.stderr else 'No error output'
+        logger.error(f"FFmpeg error: {error}")
+        raise RuntimeError(f"Failed to remux segments: {error}")
+
+def render_preview_clip(video_path, subtitles_path, output_path, start, end, height=360, **style):
+    """
+    Render a short, low-resolution clip of [start, end] with burned-in subtitles
     
-    except Exception as e:
-        logger.error(f"Error embedding subtitles: {str(e)}")
+    The input is seeked before decoding and the subtitles are shifted to the
+    window, so the cost depends on the clip length rather than on the video.
+    Meant for checking styling, not for final output.
+    
+    Args:
+        video_path (str): Path to the input video file
+        subtitles_path (str): Path to the SRT subtitles file
+        output_path (str): Path of the clip (MP4)
+        start (float): Window start in seconds
+        end (float): Window end in seconds
+        height (int): Height of the clip in pixels
+        **style: Style options accepted by embed_subtitles
+    """
+    shifted_path = os.path.splitext(output_path)[0] + '.ass'
+    write_ass(shift_cues(read_srt_cues(subtitles_path), start, end), shifted_path, **style)
+    
+    # Scale first so the subtitles are rendered at the clip's resolution
+    video_filter = f"scale=-2:{int(height)},{ass_filter(shifted_path, style.get('font', DEFAULT_FONT))}"
+    
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-ss', f"{start:.3f}", '-i', video_path,
+        '-t', f"{end - start:.3f}",
+        '-vf', video_filter,
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '30',
+        '-c:a', 'aac', '-b:a', '64k',
+        '-movflags', '+faststart',
+        output_path
+    ]
+    
+    logger.info(f"Rendering preview clip {start:.2f}-{end:.2f}s to {output_path}")
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg error rendering preview clip: {e.stderr.decode() if e.stderr else 'Unknown error'}")
+        raise
+    finally:
+        if os.path.exists(shifted_path):
+            os.remove(shifted_path)
+
+# Subtitle codec used for soft subtitle tracks in each output container
+SOFT_SUBTITLE_CODECS = {
+    '.mp4': 'mov_text',
+    '.m4v': 'mov_text',
+    '.mov': 'mov_text',
+    '.mkv': 'srt'
+}
+
+def mux_subtitles(video_path, subtitles_path, output_path):
+    """
+    Add subtitles to a video as a selectable track, without re-encoding
+    
+    Video and audio are stream-copied, so this is limited by disk I/O rather
+    than CPU. MP4 outputs get a mov_text track; MKV outputs keep the subtitles
+    as SRT (or ASS, if subtitles_path is an .ass file).
+    
+    Args:
+        video_path (str): Path to the input video file
+        subtitles_path (str): Path to the SRT or ASS subtitles file
+        output_path (str): Path of the output video; its extension picks the container
+    """
+    extension = os.path.splitext(output_path)[1].lower()
+    if extension not in SOFT_SUBTITLE_CODECS:
+        raise ValueError(f"Soft subtitles are not supported for '{extension}' outputs")
+    
+    subtitle_codec = SOFT_SUBTITLE_CODECS[extension]
+    if subtitle_codec == 'srt' and subtitles_path.lower().endswith('.ass'):
+        subtitle_codec = 'ass'
+    
+    command = [
+        'ffmpeg', '-y',
+        '-i', video_path,
+        '-i', subtitles_path,
+        '-map', '0:v', '-map', '0:a?', '-map', '1:0',
+        '-c:v', 'copy',
+        '-c:a', 'copy',
+        '-c:s', subtitle_codec,
+        # Players show the track without the viewer having to enable it
+        '-disposition:s:0', 'default'
+    ]
+    if subtitle_codec == 'mov_text':
+        command += ['-movflags', '+faststart']
+    command.append(output_path)
+    
+    cmd_str = ' '.join(command)
+    logger.info(f"Running FFmpeg command to mux subtitles: {cmd_str}")
+    try:
+        subprocess.run(command, check=True, capture_output=True)
+        logger.info(f"Successfully muxed subtitles into {output_path}")
+        return True
+    except subprocess.CalledProcessError as e:
+        logger.error(f"FFmpeg command failed: {cmd_str}")
+        logger.error(f"Error output: {e.stderr.decode() if e.stderr else 'No error output'}")
         raise
 
 def parse_time_code(time_code):
@@ -456,3 +512,59 @@ def parse_time_code(time_code):
     milliseconds = int(parts[3])
     
     return hours * 3600 + minutes * 60 + seconds + milliseconds / 1000.0
+
+def format_time_code(seconds):
+    """
+    Format seconds as an SRT time code
+    
+    Args:
+        seconds (float): Time in seconds
+        
+    Returns:
+        str: Time code in format HH:MM:SS,mmm
+    """
+    milliseconds = max(0, int(round(seconds * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{milliseconds:03d}"
+
+def read_srt_cues(subtitles_path):
+    """
+    Read the cues of an SRT file
+    
+    Args:
+        subtitles_path (str): Path to the SRT file
+        
+    Returns:
+        list: Dictionaries with 'start' and 'end' in seconds and 'text'
+    """
+    with open(subtitles_path, 'r', encoding='utf-8-sig', errors='replace') as f:
+        return [{'start': start / 1000.0, 'end': end / 1000.0, 'text': text}
+                for start, end, text in iter_cues(f, 'srt')]
+
+def shift_cues(cues, start, end=None):
+    """
+    Keep the cues overlapping [start, end) and move them so that start
+    becomes time zero
+    
+    Used to render part of a video that was cut at start. Cues crossing the
+    window edges are clipped to it.
+    
+    Args:
+        cues (list): Dictionaries with 'start' and 'end' in seconds and 'text'
+        start (float): Window start in seconds
+        end (float): Window end in seconds (None for the end of the video)
+        
+    Returns:
+        list: Shifted cues
+    """
+    shifted = []
+    for cue in cues:
+        if cue['end'] <= start or (end is not None and cue['start'] >= end):
+            continue
+        cue_end = min(cue['end'], end) if end is not None else cue['end']
+        shifted.append(dict(cue, start=max(cue['start'], start) - start, end=cue_end - start))
+    
+    return shifted
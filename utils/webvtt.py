@@ -0,0 +1,141 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Vertical cue position (percent of the video height) for each position preset
+LINE_POSITIONS = {
+    'bottom': 90,
+    'top': 10,
+    'center': 50
+}
+
+
+def css_color(value, default):
+    """Return value if it is a plain CSS color name or hex code, otherwise default"""
+    return value if re.fullmatch(r'#?[A-Za-z0-9]{1,20}', value or '') else default
+
+
+def vtt_time(value):
+    """
+    Format a time for WebVTT cues (HH:MM:SS.mmm)
+
+    Args:
+        value (float or str): Seconds, or an SRT time code (HH:MM:SS,mmm)
+
+    Returns:
+        str: WebVTT time code
+    """
+    if isinstance(value, str):
+        return value.strip().replace(',', '.')
+
+    milliseconds = max(0, int(round(value * 1000)))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+
+def escape_cue_text(text):
+    """Escape the characters WebVTT cue text reserves for tags and entities"""
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def cue_settings(position='bottom', custom_position=False, custom_pos_x=50, custom_pos_y=90,
+                 subtitle_width=80, **_):
+    """
+    Build WebVTT cue settings matching the position options of embed_subtitles
+
+    Args:
+        position (str): Position preset ('bottom', 'top', 'center', 'custom')
+        custom_position (bool): Use custom_pos_x/custom_pos_y
+        custom_pos_x (int): Left edge of the subtitles in percent
+        custom_pos_y (int): Vertical position of the subtitles in percent
+        subtitle_width (int): Width of the subtitle box in percent
+
+    Returns:
+        str: Cue settings appended to each timing line
+    """
+    if custom_position and position == 'custom':
+        line = int(custom_pos_y)
+        # Center of the box, as in the burned-in subtitles
+        horizontal = int(min(100, int(custom_pos_x) + int(subtitle_width) / 2))
+    else:
+        line = LINE_POSITIONS.get(position, LINE_POSITIONS['bottom'])
+        horizontal = 50
+
+    return f"line:{line}% position:{horizontal}% size:{int(subtitle_width)}% align:center"
+
+
+def stream_webvtt(subtitles, f, style=None):
+    """
+    Write a WebVTT file to an open text file, one cue at a time
+
+    Args:
+        subtitles (iterable): Dictionaries with 'start' and 'end' (seconds or
+            SRT time codes) and 'text'; a generator is consumed lazily
+        f: Text file object
+        style (dict): Style options accepted by embed_subtitles; only the
+            position and width are used here (see cue_css for the rest)
+
+    Returns:
+        int: Number of cues written
+    """
+    settings = cue_settings(**(style or {}))
+
+    f.write("WEBVTT\n\n")
+    count = 0
+    for subtitle in subtitles:
+        count += 1
+        text = (subtitle.get('text') or '').replace('\n', ' ').replace('\r', '')
+        # A raw '<' would start a tag and '-->' would end the cue text early
+        text = escape_cue_text(text)
+        f.write(f"{count}\n")
+        f.write(f"{vtt_time(subtitle['start'])} --> {vtt_time(subtitle['end'])} {settings}\n")
+        f.write(f"{text}\n\n")
+    return count
+
+
+def write_webvtt(subtitles, output_path, style=None):
+    """
+    Write subtitle dictionaries to a WebVTT file
+
+    Args:
+        subtitles (iterable): Subtitle dictionaries with 'start', 'end' and 'text'
+        output_path (str): Path of the WebVTT file
+        style (dict): Style options accepted by embed_subtitles (see stream_webvtt)
+
+    Returns:
+        int: Number of cues written
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        return stream_webvtt(subtitles, f, style)
+
+
+def cue_css(font_size=24, font_color='white', bg_color='black', **_):
+    """
+    Build a ::cue stylesheet matching the look options of embed_subtitles
+
+    Args:
+        font_size (int): Font size in pixels
+        font_color (str): CSS color name of the text
+        bg_color (str): CSS color name of the background, or 'transparent'
+
+    Returns:
+        str: CSS rules
+    """
+    rules = [
+        "font-family: 'DejaVu Sans', sans-serif;",
+        f"font-size: {int(font_size)}px;",
+        f"color: {css_color(font_color, 'white')};",
+        "font-weight: bold;",
+        "white-space: nowrap;"
+    ]
+    if bg_color.lower() == 'transparent':
+        # Outline only, like BorderStyle=1 in the burned-in subtitles
+        rules.append("background-color: transparent;")
+        rules.append("text-shadow: -2px -2px 0 #000, 2px -2px 0 #000, -2px 2px 0 #000, 2px 2px 0 #000;")
+    else:
+        rules.append(f"background-color: {css_color(bg_color, 'black')};")
+
+    return "video::cue {\n    " + "\n    ".join(rules) + "\n}\n"